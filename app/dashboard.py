@@ -1,6 +1,6 @@
 import os
 import sys
-import time
+import requests
 import streamlit as st
 
 
@@ -12,23 +12,58 @@ st.set_page_config(
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
 with st.spinner("Carregando componentes do sistema..."):
-    from src.search.semantic_search import search, load_embeddings
-    from src.visualization.cluster_viz import plot_clean_embeddings, plot_grouped_embeddings
+    from src.search.semantic_search import (search, load_embeddings, load_passage_index, embeddings_version,
+                                            cache_stats, encode_query, best_passage)
+    from src.visualization.document_view import (PAGE_SIZE, page_count, read_page, highlight_pattern, first_match,
+                                                 render_page)
+    from src.search.lexical_index import load_lexical_index
+    from src.visualization.cluster_viz import (plot_clean_embeddings, plot_grouped_embeddings, plot_document_map,
+                                               INTERACTIVE_AVAILABLE)
+    from src.visualization.reducer import REDUCER_METHODS
+    from src.models.model_registry import preload_model, is_loaded
+    from src.search.client import SEARCH_SERVER_URL, remote_search, server_health
+    from src.processing.dedup import copies_of
 
 # Caminhos dos arquivos
 PROCESSED_DOCS_FOLDER = "data/processed/"
+# Por quanto tempo o resultado do /health do servidor de busca é reaproveitado entre as execuções do script
+HEALTH_CACHE_SECONDS = 30
 
 
-def display_document_content(doc_name):
-    """Exibe o conteúdo de um documento de forma formatada"""
+@st.cache_data(ttl=HEALTH_CACHE_SECONDS, show_spinner=False)
+def cached_server_health():
+    """server_health() com cache: evita uma requisição (e, no coordenador, uma por shard) a cada interação"""
+    return server_health()
+
+
+def display_document_content(doc_name, passage_index=None):
+    """Exibe o documento paginado, a partir da página do trecho mais relevante para a busca
+
+    Só a página visível é lida do arquivo; os termos da busca são destacados em um
+    único passe e o trecho mais relevante (índice de trechos, ou a primeira
+    ocorrência de um termo) fica marcado.
+    """
     doc_path = os.path.join(PROCESSED_DOCS_FOLDER, doc_name)
 
     if not os.path.exists(doc_path):
         st.error(f"❌ O arquivo {doc_name} não foi encontrado.")
         return
 
-    with open(doc_path, "r", encoding="utf-8") as f:
-        content = f.read()
+    query = st.session_state.query
+    passage = None
+    if query and passage_index is not None:
+        passage = best_passage(query, doc_name, passage_index)
+    if passage is None and query:
+        start = first_match(doc_path, query)
+        passage = (start, start) if start is not None else None
+
+    n_pages = page_count(doc_path)
+    best_page = passage[0] // PAGE_SIZE + 1 if passage else 1
+
+    # Novo documento ou nova busca: abre na página do trecho mais relevante
+    if st.session_state.get("viewer_target") != (doc_name, query):
+        st.session_state.viewer_target = (doc_name, query)
+        st.session_state.doc_page = best_page
 
     doc_container = st.container()
 
@@ -36,6 +71,11 @@ def display_document_content(doc_name):
         clean_doc_name = doc_name.replace('.txt', '').replace('_', ' ').title()
         st.markdown(f"### 📄 {clean_doc_name}")
 
+        # Cópias quase idênticas ficam fora dos índices: o documento original as representa nos resultados
+        copies = copies_of(doc_name)
+        if copies:
+            st.caption("🪞 Cópias quase idênticas: " + ", ".join(f"{name} ({score:.0%})" for name, score in copies))
+
         themes = {
             "Escuro": {"bg": "#1E1E1E", "text": "#FFFFFF", "highlight": "#FFD700", "border": "#444444"},
             "Claro": {"bg": "#FFFFFF", "text": "#333333", "highlight": "#4B0082", "border": "#DDDDDD"},
@@ -83,6 +123,10 @@ def display_document_content(doc_name):
             border-radius: 3px;
             font-weight: bold;
         }}
+        .best-passage {{
+            border-left: 3px solid {theme["highlight"]};
+            background-color: rgba(127, 127, 127, 0.15);
+        }}
         .document-card p {{
             margin-bottom: 12px;
         }}
@@ -92,17 +136,26 @@ def display_document_content(doc_name):
         highlight = st.checkbox("Destacar termos da busca", value=st.session_state.highlight, key="highlight_terms_doc")
         st.session_state.highlight = highlight
 
-        if st.session_state.query and st.session_state.highlight:
-            highlighted_content = content
-            for term in st.session_state.query.split():
-                if len(term) > 2:
-                    highlighted_content = highlighted_content.replace(
-                        term,
-                        f'<span style="background-color: {theme["highlight"]};">{term}</span>'
-                    )
-                    st.markdown(f'<div class="document-card">{highlighted_content}</div>', unsafe_allow_html=True)
-        else:
-            st.markdown(f'<div class="document-card">{content}</div>', unsafe_allow_html=True)
+        def change_page(page):
+            st.session_state.doc_page = min(max(page, 1), n_pages)
+
+        # Os botões alteram a página em callbacks, antes de o campo "Página" ser desenhado
+        col_prev, col_page, col_next, col_best = st.columns([1, 2, 1, 2])
+        col_prev.button("◀ Anterior", key="prev_page", disabled=st.session_state.doc_page <= 1,
+                        on_click=change_page, args=(st.session_state.doc_page - 1,))
+        col_page.number_input(f"Página (de {n_pages})", min_value=1, max_value=n_pages, step=1, key="doc_page",
+                              label_visibility="collapsed")
+        col_next.button("Próxima ▶", key="next_page", disabled=st.session_state.doc_page >= n_pages,
+                        on_click=change_page, args=(st.session_state.doc_page + 1,))
+        col_best.button("🎯 Trecho mais relevante", key="best_page", disabled=passage is None,
+                        on_click=change_page, args=(best_page,))
+
+        text, offset = read_page(doc_path, st.session_state.doc_page)
+        pattern = highlight_pattern(query) if query and highlight else None
+        st.markdown(f'<div class="document-card">{render_page(text, offset, pattern, passage)}</div>',
+                    unsafe_allow_html=True)
+        st.caption(f"Página {st.session_state.doc_page} de {n_pages}"
+                   + (f" · trecho mais relevante na página {best_page}" if passage else ""))
 
 
 def run_dashboard():
@@ -124,6 +177,9 @@ def run_dashboard():
 
     with st.spinner("🧠 Carregando embeddings... Isso pode levar alguns segundos."):
         doc_names, doc_embeddings = load_embeddings()
+        index_version = embeddings_version()
+        passage_index = load_passage_index()
+        lexical_index = load_lexical_index()
 
     if doc_names is None or doc_embeddings is None:
         st.error("⚠ Erro ao carregar embeddings. Execute `generate_embeddings.py` primeiro.")
@@ -131,14 +187,45 @@ def run_dashboard():
     else:
         st.success(f"✅ {len(doc_names)} documentos carregados com sucesso!")
 
+    # Com o servidor de busca (SEARCH_SERVER_URL) ativo, o modelo não é carregado neste processo
+    use_server = bool(SEARCH_SERVER_URL) and cached_server_health() is not None
+    if use_server:
+        st.caption(f"🌐 Buscas atendidas pelo servidor {SEARCH_SERVER_URL}")
+    elif not is_loaded():
+        # Carrega o modelo em segundo plano enquanto o usuário digita a primeira busca
+        preload_model()
+
+    # Modos de busca: só semântica ou híbrida com o índice BM25 (se ele existir)
+    search_modes = {"Semântica": None}
+    if lexical_index is not None and not use_server:
+        search_modes["Híbrida (BM25 + semântica)"] = "rrf"
+        search_modes["Termos exatos + reordenação semântica"] = "shortlist"
+    search_mode = search_modes[st.sidebar.radio("Modo de busca", list(search_modes), key="search_mode")]
+
     tab1, tab2 = st.tabs(["🔍 Busca Semântica", "📊 Visualização dos Clusters"])
 
     with tab1:
         def update_search():
-            st.session_state.results = search(st.session_state.query, doc_names, doc_embeddings)
+            results = None
+            if use_server:
+                try:
+                    results = remote_search(st.session_state.query)
+                except requests.RequestException as e:
+                    # Servidor fora do ar ou com erro: busca localmente e volta a consultar o /health
+                    cached_server_health.clear()
+                    st.error(f"❌ Erro no servidor de busca ({e}). Buscando localmente.")
+            if results is not None:
+                st.session_state.results = results
+            else:
+                st.session_state.results = search(st.session_state.query, doc_names, doc_embeddings,
+                                                  passage_index=passage_index, index_version=index_version,
+                                                  lexical_index=lexical_index if search_mode else None,
+                                                  hybrid=search_mode or "rrf")
             if st.session_state.results:
+                # No modo híbrido "rrf" a pontuação é a soma dos ranks recíprocos (~0.01-0.03), não similaridade
+                score_label = "Pontuação RRF" if search_mode == "rrf" else "Similaridade"
                 st.session_state.doc_options = {
-                    f"{doc} (Similaridade: {score:.4f})": doc
+                    f"{doc} ({score_label}: {score:.4f})": doc
                     for doc, score in st.session_state.results
                 }
 
@@ -156,6 +243,11 @@ def run_dashboard():
             else:
                 st.warning("⚠ Por favor, digite uma consulta válida.")
 
+        with st.sidebar.expander("⚡ Cache de consultas"):
+            for name, stats in cache_stats().items():
+                st.caption(f"{name}: {stats['hits']} acertos / {stats['misses']} erros "
+                           f"({stats['hit_rate']:.0%}) · {stats['saved_ms']:.0f} ms economizados")
+
         if st.session_state.results:
             st.write("**📌 Resultados mais relevantes:**")
             selected_doc = st.selectbox(
@@ -165,7 +257,7 @@ def run_dashboard():
             )
             if selected_doc:
                 st.session_state.current_doc = st.session_state.doc_options[selected_doc]
-                display_document_content(st.session_state.current_doc)
+                display_document_content(st.session_state.current_doc, passage_index if not use_server else None)
         elif st.session_state.query and st.session_state.results == []:
             st.warning("⚠ Nenhum documento relevante encontrado.")
 
@@ -181,16 +273,33 @@ def run_dashboard():
         st.subheader("📊 Visualização dos Clusters")
 
         visualization_type = st.radio("Escolha o tipo de visualização:",
-                                      ["Visualização Simples", "Visualização por Clusters"],
+                                      ["Visualização Simples", "Visualização por Clusters", "Mapa Persistido"],
                                       horizontal=True,
                                       key="viz_type")
 
+        # O mapa persistido projeta documentos novos e consultas com transform: só UMAP e PCA
+        methods = REDUCER_METHODS if visualization_type == "Mapa Persistido" else ["tsne", "umap", "pca"]
         st.write("Escolha o método de redução de dimensionalidade:")
-        reduction_method = st.selectbox("", ["- Selecione -", "tsne", "umap", "pca"], key="reduction_method")
+        reduction_method = st.selectbox("", ["- Selecione -"] + methods, key="reduction_method")
 
         n_clusters = None
         if visualization_type == "Visualização por Clusters":
-            n_clusters = st.slider("Número de clusters", min_value=2, max_value=15, value=6, key="n_clusters")
+            if not st.checkbox("Escolher o número de clusters automaticamente", key="auto_k"):
+                n_clusters = st.slider("Número de clusters", min_value=2, max_value=15, value=6, key="n_clusters")
+
+        keywords_from_content = interactive = False
+        if visualization_type == "Visualização por Clusters":
+            keywords_from_content = st.checkbox("Rótulos pelo conteúdo dos documentos (TF-IDF)", key="tfidf_keywords")
+            # Gráfico WebGL: zoom e nome do documento ao passar o mouse, fluido mesmo com 100 mil pontos
+            interactive = st.checkbox("Gráfico interativo", key="interactive_viz", disabled=not INTERACTIVE_AVAILABLE,
+                                      help=None if INTERACTIVE_AVAILABLE else "Requer o pacote plotly")
+
+        show_query = refit_map = False
+        if visualization_type == "Mapa Persistido":
+            # Com o servidor de busca o modelo não está neste processo para codificar a consulta
+            show_query = st.checkbox("Mostrar a posição da última busca", key="show_query",
+                                     disabled=use_server or not st.session_state.query)
+            refit_map = st.checkbox("Reajustar o mapa (todas as posições mudam)", key="refit_map")
 
         btn_gerar = st.button("Gerar Visualização", key="generate_viz")
 
@@ -201,14 +310,23 @@ def run_dashboard():
                 with st.spinner(
                         f"Gerando visualização usando {reduction_method.upper()}... (pode levar alguns segundos)"):
                     if visualization_type == "Visualização Simples":
-                        fig = plot_clean_embeddings(doc_embeddings, reduction_method)
+                        fig = plot_clean_embeddings(doc_embeddings, reduction_method, index_version)
+                    elif visualization_type == "Mapa Persistido":
+                        query_embedding = encode_query(st.session_state.query) if show_query else None
+                        results = st.session_state.results if show_query else None
+                        fig = plot_document_map(doc_names, doc_embeddings, reduction_method, query_embedding,
+                                                st.session_state.query, [doc for doc, _ in results or []],
+                                                refit=refit_map)
                     else:
-                        fig = plot_grouped_embeddings(doc_names, doc_embeddings, reduction_method, n_clusters)
+                        fig = plot_grouped_embeddings(doc_names, doc_embeddings, reduction_method, n_clusters,
+                                                      index_version, keywords_from_content, interactive)
 
                     if fig:
                         st.success("✅ Visualização gerada com sucesso!")
-                        time.sleep(1)
-                        st.pyplot(fig)
+                        if interactive:
+                            st.plotly_chart(fig, use_container_width=True)
+                        else:
+                            st.pyplot(fig)
                     else:
                         st.error("❌ Não foi possível gerar a visualização.")
 
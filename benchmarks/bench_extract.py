@@ -0,0 +1,89 @@
+import os
+import sys
+import time
+import argparse
+import tracemalloc
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.scraping.html_extract import extract_text, available_extractors, CHUNK_SIZE
+from src.scraping.download_docs import clean_text
+
+GITHUB_CHROME = (
+    '<header class="HeaderMktg"><h2 class="sr-only">Navigation Menu</h2>'
+    '<nav><ul>' + "".join(f'<li><a href="/features/{i}">Feature {i}</a></li>' for i in range(40)) +
+    '</ul><a href="/features">Explore All features</a></nav></header>'
+)
+
+
+def synthetic_page(kb, seed=0):
+    """Gera uma página parecida com um README do GitHub com aproximadamente `kb` KB"""
+    items = []
+    size = 0
+    i = seed
+    while size < kb * 1024:
+        item = (f'<li><a href="https://example.com/project-{i}">Project {i}</a> - '
+                f'A <strong>fast</strong> library for task {i} &amp; friends.</li>\n')
+        items.append(item)
+        size += len(item)
+        i += 1
+    return (
+        "<!DOCTYPE html><html><head><title>awesome</title>"
+        "<script>window.__data = {\"x\": 1};</script><style>body { color: red }</style></head><body>"
+        f"{GITHUB_CHROME}<article class=\"markdown-body\"><h1>Awesome list</h1><ul>{''.join(items)}</ul>"
+        "</article><footer>© GitHub, Inc. Terms Privacy</footer></body></html>"
+    )
+
+
+def chunked(data, chunk_size=CHUNK_SIZE):
+    """Simula response.iter_content: entrega o HTML em blocos de bytes"""
+    for start in range(0, len(data), chunk_size):
+        yield data[start:start + chunk_size]
+
+
+def run(pages, extractor):
+    """Extrai todas as páginas e retorna (segundos, pico de memória em MB de uma página)"""
+    start = time.perf_counter()
+    for page in pages:
+        extract_text(chunked(page), extractor)
+    seconds = time.perf_counter() - start
+
+    # Memória medida à parte: o tracemalloc deixa a extração bem mais lenta
+    peak = 0
+    for page in pages[:3]:
+        tracemalloc.start()
+        extract_text(chunked(page), extractor)
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    return seconds, peak / 1e6
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compara os extratores de texto do HTML (páginas/s e memória)")
+    parser.add_argument("files", nargs="*", help="Arquivos HTML (padrão: páginas sintéticas estilo GitHub)")
+    parser.add_argument("--pages", type=int, default=50, help="Número de páginas sintéticas")
+    parser.add_argument("--kb", type=int, default=500, help="Tamanho de cada página sintética (KB)")
+    args = parser.parse_args()
+
+    if args.files:
+        pages = []
+        for path in args.files:
+            with open(path, "rb") as f:
+                pages.append(f.read())
+    else:
+        pages = [synthetic_page(args.kb, seed=i * 100000).encode("utf-8") for i in range(args.pages)]
+
+    total_mb = sum(len(page) for page in pages) / 1e6
+    print(f"{len(pages)} páginas, {total_mb:.1f} MB de HTML\n")
+    print(f"{'extrator':>12} | {'páginas/s':>9} | {'MB/s':>6} | {'ganho':>6} | {'pico (MB)':>9} | "
+          f"{'chars após limpeza':>18}")
+
+    # O caminho antigo (BeautifulSoup) roda primeiro e serve de referência para o ganho
+    baseline = None
+    for name in sorted(available_extractors(), key=lambda name: name != "bs4"):
+        seconds, peak_mb = run(pages, name)
+        chars = len(clean_text(extract_text(chunked(pages[0]), name)[0]))
+        rate = len(pages) / seconds
+        baseline = baseline or rate
+        print(f"{name:>12} | {rate:9.1f} | {total_mb / seconds:6.1f} | {rate / baseline:5.1f}x | "
+              f"{peak_mb:9.1f} | {chars:18}")
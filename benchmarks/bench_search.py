@@ -0,0 +1,71 @@
+import os
+import sys
+import time
+import argparse
+import numpy as np
+from sklearn.metrics.pairwise import cosine_similarity
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.search.semantic_search import rank_documents
+
+DIMENSION = 768
+TOP_N = 5
+
+
+def legacy_rank(query_embedding, doc_embeddings, top_n=TOP_N):
+    """Versão anterior do search: cosine_similarity + argsort completo"""
+    similarities = cosine_similarity([query_embedding], doc_embeddings)[0]
+    return similarities.argsort()[-top_n:][::-1]
+
+
+def random_matrix(n, dimension=DIMENSION, seed=0, block_rows=65536):
+    """Gera uma matriz normalizada aleatória em blocos (evita cópias em float64)"""
+    rng = np.random.default_rng(seed)
+    matrix = np.empty((n, dimension), dtype=np.float32)
+    for start in range(0, n, block_rows):
+        block = rng.standard_normal((min(block_rows, n - start), dimension), dtype=np.float32)
+        block /= np.linalg.norm(block, axis=1, keepdims=True)
+        matrix[start:start + len(block)] = block
+    return matrix
+
+
+def timeit(fn, repeat):
+    """Executa fn `repeat` vezes e retorna a mediana em ms"""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - start) * 1000)
+    return float(np.median(times))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compara o search antigo com o caminho normalizado + argpartition")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[600, 60000, 1000000])
+    parser.add_argument("--queries", type=int, default=64, help="Consultas do teste em lote (search_many)")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--legacy-max", type=int, default=200000,
+                        help="Maior N para o caminho antigo (cosine_similarity copia e normaliza a matriz inteira)")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(1)
+    queries = rng.standard_normal((args.queries, DIMENSION), dtype=np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+
+    print(f"{'N':>9} | {'antigo (ms)':>11} | {'novo (ms)':>9} | {'ganho':>6} | {'lote/consulta (ms)':>18}")
+    for n in args.sizes:
+        matrix = random_matrix(n)
+
+        new_ms = timeit(lambda: rank_documents(queries[0], matrix, TOP_N), args.repeat)
+        batch_ms = timeit(lambda: rank_documents(queries, matrix, TOP_N), args.repeat) / len(queries)
+
+        if n <= args.legacy_max:
+            legacy_ms = timeit(lambda: legacy_rank(queries[0], matrix, TOP_N), args.repeat)
+            assert set(legacy_rank(queries[0], matrix)) == set(rank_documents(queries[0], matrix)[0][0])
+            legacy, speedup = f"{legacy_ms:11.2f}", f"{legacy_ms / new_ms:5.1f}x"
+        else:
+            legacy, speedup = f"{'pulado':>11}", f"{'-':>6}"
+
+        print(f"{n:>9} | {legacy} | {new_ms:9.2f} | {speedup} | {batch_ms:18.3f}")
+        del matrix
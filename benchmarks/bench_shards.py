@@ -0,0 +1,70 @@
+import os
+import sys
+import time
+import tempfile
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from benchmarks.synthetic import write_vector_store, topic_vectors
+from src.search.sharding import build_shards, start_local_shards, stop_shards, ShardCoordinator, SHARD_PORT
+
+TOP_N = 10
+
+
+def run_load(coordinator, queries, clients, batch_size):
+    """Envia as consultas em lotes a partir de `clients` threads
+
+    Returns:
+        (consultas/s, latências de cada lote em ms, lotes parciais)
+    """
+    batches = [queries[start:start + batch_size] for start in range(0, len(queries), batch_size)]
+
+    def send(batch):
+        start = time.perf_counter()
+        _, missing = coordinator.search_embeddings(batch, TOP_N)
+        return (time.perf_counter() - start) * 1000, bool(missing)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        outcomes = list(pool.map(send, batches))
+    elapsed = time.perf_counter() - start
+    return len(queries) / elapsed, [ms for ms, _ in outcomes], sum(partial for _, partial in outcomes)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Vazão da busca com o índice dividido em shards locais")
+    parser.add_argument("--docs", type=int, default=200000, help="Documentos no armazenamento sintético")
+    parser.add_argument("--shards", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--queries", type=int, default=256)
+    parser.add_argument("--clients", type=int, default=8, help="Threads enviando lotes ao mesmo tempo")
+    parser.add_argument("--batch", type=int, default=8, help="Consultas por lote")
+    parser.add_argument("--timeout", type=float, default=30.0, help="Espera máxima por shard (s)")
+    args = parser.parse_args()
+
+    queries = topic_vectors(args.queries, seed=1)
+    print(f"💻 {os.cpu_count()} núcleo(s): o ganho com N shards é limitado a min(N, núcleos)")
+
+    with tempfile.TemporaryDirectory() as workdir:
+        store = os.path.join(workdir, "documents")
+        folder = os.path.join(workdir, "shards")
+        write_vector_store(store, args.docs, dtype="float32")
+
+        print(f"{'shards':>6} | {'consultas/s':>11} | {'ganho':>6} | {'p50 lote (ms)':>13} | {'p95 lote (ms)':>13} | "
+              f"{'parciais':>8}")
+        baseline = None
+        for n_shards in args.shards:
+            build_shards(n_shards, source=store, folder=folder)
+            processes, endpoints = start_local_shards(n_shards, folder, port=SHARD_PORT + 100)
+            try:
+                coordinator = ShardCoordinator(endpoints, args.timeout)
+                run_load(coordinator, queries[:args.batch * 2], 1, args.batch)  # Aquecimento (page cache)
+                qps, latencies, partial = run_load(coordinator, queries, args.clients, args.batch)
+            finally:
+                stop_shards(processes)
+
+            baseline = baseline or qps
+            print(f"{n_shards:>6} | {qps:11.1f} | {qps / baseline:5.2f}x | {np.percentile(latencies, 50):13.1f} | "
+                  f"{np.percentile(latencies, 95):13.1f} | {partial:>8}")
@@ -0,0 +1,113 @@
+import os
+import io
+import sys
+import time
+import argparse
+import numpy as np
+
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.visualization.cluster_viz import cluster_keywords, render_grouped, STOP_WORDS
+
+WORDS = ["python", "react", "docker", "kubernetes", "rust", "learning", "machine", "awesome", "guide",
+         "tutorial", "api", "web", "data", "security", "testing", "cloud", "mobile", "design", "go", "java"]
+
+
+def synthetic_map(n, n_clusters, seed=0):
+    """Projeção 2D com clusters gaussianos e nomes de arquivo parecidos com os do corpus"""
+    rng = np.random.default_rng(seed)
+    centers = rng.uniform(-20, 20, (n_clusters, 2))
+    labels = rng.integers(0, n_clusters, n)
+    points = (centers[labels] + rng.standard_normal((n, 2)) * 2).astype(np.float32)
+    words = rng.integers(0, len(WORDS), (n, 3))
+    words[:, 0] = labels % len(WORDS)  # Palavra dominante por cluster
+    names = [f"{WORDS[a]}_{WORDS[b]}_and_{WORDS[c]}_{i}.txt" for i, (a, b, c) in enumerate(words)]
+    return names, points, labels
+
+
+def legacy_render(doc_names, reduced_embeddings, cluster_labels, n_clusters):
+    """Versão anterior do plot_grouped_embeddings (listas por cluster, um plt.fill por aresta do hull)"""
+    from scipy.spatial import ConvexHull
+
+    cluster_keywords = {}
+    for cluster_id in range(n_clusters):
+        docs_in_cluster = [doc_names[i] for i in range(len(doc_names)) if cluster_labels[i] == cluster_id]
+        all_words = []
+        for doc in docs_in_cluster:
+            all_words.extend(doc.replace('.txt', '').replace('_', ' ').split())
+        word_freq = {}
+        for word in all_words:
+            if word.lower() not in STOP_WORDS and len(word) > 2:
+                word_freq[word.lower()] = word_freq.get(word.lower(), 0) + 1
+        top_words = sorted(word_freq.items(), key=lambda x: x[1], reverse=True)[:3]
+        cluster_keywords[cluster_id] = ", ".join(word for word, _ in top_words) or f"Cluster {cluster_id+1}"
+
+    fig, ax = plt.subplots(figsize=(18, 14))
+    colors = plt.cm.tab20(np.linspace(0, 1, n_clusters))
+    centroids = [np.mean(reduced_embeddings[cluster_labels == i], axis=0) for i in range(n_clusters)]
+    for i in range(n_clusters):
+        cluster_points = reduced_embeddings[cluster_labels == i]
+        hull = ConvexHull(cluster_points)
+        for simplex in hull.simplices:
+            hull_points = cluster_points[simplex]
+            plt.fill(hull_points[:, 0], hull_points[:, 1], alpha=0.25, color=colors[i], edgecolor=colors[i],
+                     linewidth=2)
+    ax.scatter(reduced_embeddings[:, 0], reduced_embeddings[:, 1],
+               c=[colors[label % len(colors)] for label in cluster_labels], s=60, alpha=0.8,
+               edgecolors='black', linewidths=0.5)
+    for i in range(n_clusters):
+        ax.annotate(cluster_keywords[i], (centroids[i][0], centroids[i][1]), ha='center', va='center',
+                    weight='bold', bbox=dict(boxstyle="round,pad=0.5", fc="white", ec=colors[i], lw=2))
+    plt.axis('off')
+    plt.tight_layout()
+    return fig, list(cluster_keywords.values())
+
+
+def time_to_figure(render):
+    """Tempo (s) até a figura estar desenhada em PNG, como no st.pyplot"""
+    start = time.perf_counter()
+    fig = render()
+    fig = fig[0] if isinstance(fig, tuple) else fig
+    fig.savefig(io.BytesIO(), format="png")
+    seconds = time.perf_counter() - start
+    plt.close(fig)
+    return seconds
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mede o tempo até a figura do gráfico por clusters")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000, 1000000])
+    parser.add_argument("--clusters", type=int, default=8)
+    parser.add_argument("--legacy-max", type=int, default=100000,
+                        help="Maior N para o caminho antigo (um artista por ponto e por aresta)")
+    args = parser.parse_args()
+
+    # Aquecimento: imports (scipy, sklearn) e cache de fontes do matplotlib fora da medição
+    names, points, labels = synthetic_map(500, args.clusters)
+    time_to_figure(lambda: render_grouped(names, points, labels, cluster_keywords(names, labels, args.clusters),
+                                          "umap"))
+    time_to_figure(lambda: legacy_render(names, points, labels, args.clusters))
+
+    print(f"{'N':>9} | {'antigo (s)':>10} | {'novo (s)':>8} | {'rótulos (ms)':>12} | {'ganho':>6}")
+    for n in args.sizes:
+        names, points, labels = synthetic_map(n, args.clusters)
+
+        start = time.perf_counter()
+        keywords = cluster_keywords(names, labels, args.clusters)
+        keywords_ms = (time.perf_counter() - start) * 1000
+        # O tempo do caminho novo inclui os rótulos, como no antigo
+        new_s = time_to_figure(lambda: render_grouped(names, points, labels, keywords, "umap")) + keywords_ms / 1000
+
+        if n <= args.legacy_max:
+            legacy_s = time_to_figure(lambda: legacy_render(names, points, labels, args.clusters))
+            assert legacy_render(names, points, labels, args.clusters)[1] == keywords
+            plt.close("all")
+            legacy, speedup = f"{legacy_s:10.2f}", f"{legacy_s / new_s:5.1f}x"
+        else:
+            legacy, speedup = f"{'pulado':>10}", f"{'-':>6}"
+
+        print(f"{n:>9} | {legacy} | {new_s:8.2f} | {keywords_ms:12.1f} | {speedup}")
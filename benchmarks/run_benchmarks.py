@@ -0,0 +1,296 @@
+import os
+import io
+import sys
+import json
+import time
+import shutil
+import argparse
+import queue as queue_module
+import platform
+import resource
+import tempfile
+import subprocess
+import multiprocessing
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from benchmarks.synthetic import generate_documents, write_documents, write_vector_store, topic_vectors, StubEncoder
+
+# Resultados em JSON (um arquivo por execução) e a referência usada na comparação
+RESULTS_FOLDER = "benchmarks/results/"
+BASELINE_FILE = os.path.join(RESULTS_FOLDER, "baseline.json")
+LATEST_FILE = os.path.join(RESULTS_FOLDER, "latest.json")
+
+STAGES = ["clean", "embed", "search", "viz"]
+DEFAULT_SIZES = [600, 10000]
+# Variação acima da qual uma métrica conta como regressão (vazão menor, latência p95 ou memória maiores)
+REGRESSION_THRESHOLD = 0.10
+# O gráfico por clusters acima disso leva minutos (projeção + figura): tamanhos maiores são pulados
+VIZ_MAX_SIZE = 100000
+SEARCH_QUERIES = 200
+
+
+def percentiles(seconds):
+    """Latências p50/p95/p99 em ms"""
+    if len(seconds) == 0:
+        return None
+    p50, p95, p99 = np.percentile(np.asarray(seconds) * 1000, [50, 95, 99])
+    return {"p50": round(float(p50), 4), "p95": round(float(p95), 4), "p99": round(float(p99), 4)}
+
+
+def reset_peak_rss():
+    """Zera o pico de memória do processo (Linux); o pico passa a contar a partir daqui"""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def peak_rss_mb():
+    """Pico de memória residente do processo (VmHWM no Linux, ru_maxrss nos demais)"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+
+
+def bench_clean(size, options):
+    """clean_text em documentos brutos sintéticos (gerados em memória, fora da medição)"""
+    from src.processing.text_cleaning import clean_text
+
+    latencies = np.empty(size)
+    total_bytes = 0
+    reset_peak_rss()
+    elapsed = 0.0
+    for i, (_, text) in enumerate(generate_documents(size, options["doc_kb"], raw=True)):
+        start = time.perf_counter()
+        clean_text(text)
+        latencies[i] = time.perf_counter() - start
+        elapsed += latencies[i]
+        total_bytes += len(text)
+    return {"items": size, "seconds": elapsed, "unit": "docs/s", "latencies": latencies,
+            "extra": {"mb_per_s": round(total_bytes / 1e6 / max(elapsed, 1e-9), 2)}}
+
+
+def bench_embed(size, options):
+    """generate_embeddings completo (hash, ordenação por tokens, lotes, armazenamento) com o codificador sintético"""
+    from src.models.model_registry import register_model
+    from src.processing.generate_embeddings import generate_embeddings, PROCESSED_DOCS_FOLDER, EMBEDDINGS_STORE
+    from src.search.embedding_store import matrix_path, load_store_metadata
+
+    write_documents(PROCESSED_DOCS_FOLDER, size, options["doc_kb"])
+    encoder = StubEncoder()
+    register_model(encoder)
+    import torch  # Import feito uma vez por processo no encode_documents: fora da medição
+
+    reset_peak_rss()
+    start = time.perf_counter()
+    generate_embeddings()
+    elapsed = time.perf_counter() - start
+    store_meta = load_store_metadata(EMBEDDINGS_STORE)
+    return {"items": size, "seconds": elapsed, "unit": "docs/s", "latencies": encoder.batch_seconds,
+            "extra": {"store_mb": round(os.path.getsize(matrix_path(EMBEDDINGS_STORE, store_meta)) / 1e6, 1)}}
+
+
+def bench_search(size, options):
+    """semantic_search.search (sem cache de resultados) sobre um armazenamento sintético de `size` vetores"""
+    from src.models.model_registry import register_model
+    from src.search.semantic_search import search, load_embeddings, EMBEDDINGS_STORE
+
+    write_vector_store(EMBEDDINGS_STORE, size, dtype=options["search_dtype"])
+    register_model(StubEncoder())
+    doc_names, doc_embeddings = load_embeddings()
+    queries = [" ".join(words.split()[:6]) for _, words in generate_documents(options["queries"], 0.1, seed=1)]
+    for query in queries[:5]:  # Aquecimento
+        search(query, doc_names, doc_embeddings)
+
+    latencies = []
+    reset_peak_rss()
+    for query in queries:
+        start = time.perf_counter()
+        search(query, doc_names, doc_embeddings)
+        latencies.append(time.perf_counter() - start)
+    return {"items": len(queries), "seconds": float(np.sum(latencies)), "unit": "queries/s", "latencies": latencies,
+            "extra": {"dtype": options["search_dtype"]}}
+
+
+def bench_viz(size, options):
+    """plot_grouped_embeddings (PCA, k fixo, sem cache) até a figura renderizada em PNG"""
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    from src.visualization.cluster_viz import plot_grouped_embeddings
+
+    embeddings = topic_vectors(size)
+    names = [name for name, _ in generate_documents(size, 0.05)]
+    # Aquecimento com poucos pontos: imports (sklearn, scipy) e cache de fontes fora da medição
+    plt.close(plot_grouped_embeddings(names[:100], embeddings[:100], "pca", n_clusters=8))
+
+    reset_peak_rss()
+    start = time.perf_counter()
+    fig = plot_grouped_embeddings(names, embeddings, "pca", n_clusters=8)
+    fig.savefig(io.BytesIO(), format="png")
+    elapsed = time.perf_counter() - start
+    plt.close(fig)
+    return {"items": size, "seconds": elapsed, "unit": "docs/s", "latencies": [elapsed], "extra": {}}
+
+
+BENCHMARKS = {"clean": bench_clean, "embed": bench_embed, "search": bench_search, "viz": bench_viz}
+
+
+def run_child(stage, size, options, queue):
+    """Executa uma etapa em um processo novo, dentro de uma pasta temporária (data/, embeddings/)"""
+    workdir = tempfile.mkdtemp(prefix=f"bench_{stage}_{size}_")
+    os.chdir(workdir)
+    sys.stdout = io.StringIO()  # Silencia as mensagens de progresso das etapas
+    try:
+        result = BENCHMARKS[stage](size, options)
+        queue.put({"stage": stage, "size": size, "items": result["items"],
+                   "seconds": round(result["seconds"], 4),
+                   "throughput": round(result["items"] / max(result["seconds"], 1e-9), 2),
+                   "unit": result["unit"], "latency_ms": percentiles(result["latencies"]),
+                   "peak_rss_mb": round(peak_rss_mb(), 1), "extra": result["extra"]})
+    except Exception as error:
+        queue.put({"stage": stage, "size": size, "error": f"{type(error).__name__}: {error}"})
+    finally:
+        os.chdir(tempfile.gettempdir())
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def run_stage(stage, size, options):
+    """Roda a etapa em um processo isolado (spawn): a memória e os caches não vazam entre medições"""
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    process = context.Process(target=run_child, args=(stage, size, options, queue))
+    process.start()
+    while True:
+        try:
+            result = queue.get(timeout=1)
+            break
+        except queue_module.Empty:
+            # Processo encerrado sem resultado (ex.: morto por falta de memória)
+            if not process.is_alive():
+                result = {"stage": stage, "size": size, "error": f"processo encerrado (código {process.exitcode})"}
+                break
+    process.join()
+    return result
+
+
+def environment():
+    """Metadados da máquina e do código, para saber o que está sendo comparado"""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {"commit": commit, "python": platform.python_version(), "numpy": np.__version__,
+            "platform": platform.platform(), "cpus": os.cpu_count(), "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S")}
+
+
+def compare(results, baseline, threshold=REGRESSION_THRESHOLD):
+    """Compara com a execução de referência
+
+    Returns:
+        Lista de (etapa, tamanho, métrica, valor de referência, valor atual, variação relativa)
+        das métricas que pioraram mais que `threshold`
+    """
+    reference = {(r["stage"], r["size"]): r for r in baseline.get("results", []) if "error" not in r}
+    regressions = []
+    for result in results:
+        old = reference.get((result["stage"], result["size"]))
+        if old is None or "error" in result:
+            continue
+
+        # (métrica, valor antigo, valor novo, maior é melhor?)
+        metrics = [("throughput", old["throughput"], result["throughput"], True),
+                   ("peak_rss_mb", old["peak_rss_mb"], result["peak_rss_mb"], False)]
+        if old.get("latency_ms") and result.get("latency_ms"):
+            metrics.append(("latency_p95_ms", old["latency_ms"]["p95"], result["latency_ms"]["p95"], False))
+
+        for name, before, after, higher_is_better in metrics:
+            if not before:
+                continue
+            change = (after - before) / before
+            if (-change if higher_is_better else change) > threshold:
+                regressions.append((result["stage"], result["size"], name, before, after, change))
+    return regressions
+
+
+def print_results(results, baseline=None):
+    reference = {(r["stage"], r["size"]): r for r in (baseline or {}).get("results", []) if "error" not in r}
+    print(f"\n{'etapa':<7} | {'N':>8} | {'vazão':>18} | {'p50 (ms)':>9} | {'p95 (ms)':>9} | {'p99 (ms)':>9} | "
+          f"{'pico RSS':>9} | {'vs. referência':>14}")
+    for r in results:
+        if "error" in r:
+            print(f"{r['stage']:<7} | {r['size']:>8} | ❌ {r['error']}")
+            continue
+        latency = r["latency_ms"] or {"p50": float("nan"), "p95": float("nan"), "p99": float("nan")}
+        old = reference.get((r["stage"], r["size"]))
+        delta = f"{(r['throughput'] / old['throughput'] - 1):+.1%}" if old else "-"
+        print(f"{r['stage']:<7} | {r['size']:>8} | {r['throughput']:>8.1f} {r['unit']:<9} | {latency['p50']:>9.3f} | "
+              f"{latency['p95']:>9.3f} | {latency['p99']:>9.3f} | {r['peak_rss_mb']:>6.0f} MB | {delta:>14}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks de ponta a ponta com corpus e codificador sintéticos")
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=STAGES)
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES,
+                        help="Documentos (clean, embed, viz) ou vetores (search) por execução")
+    parser.add_argument("--doc-kb", type=float, default=4, help="Tamanho médio dos documentos sintéticos")
+    parser.add_argument("--search-dtype", choices=["float32", "float16"], default="float32")
+    parser.add_argument("--queries", type=int, default=SEARCH_QUERIES, help="Consultas medidas na etapa search")
+    parser.add_argument("--output", default=None, help="Arquivo JSON dos resultados (padrão: results/<data>.json)")
+    parser.add_argument("--baseline", default=BASELINE_FILE, help="Execução de referência para a comparação")
+    parser.add_argument("--save-baseline", action="store_true", help="Salva esta execução como referência")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD)
+    args = parser.parse_args()
+
+    options = {"doc_kb": args.doc_kb, "search_dtype": args.search_dtype, "queries": args.queries}
+    root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+    results_folder = os.path.join(root, RESULTS_FOLDER)
+    os.makedirs(results_folder, exist_ok=True)
+
+    results = []
+    for stage in args.stages:
+        for size in args.sizes:
+            if stage == "viz" and size > VIZ_MAX_SIZE:
+                print(f"⏭ viz com {size} documentos pulado (máximo {VIZ_MAX_SIZE})")
+                continue
+            print(f"⏱ {stage} com {size} itens...")
+            results.append(run_stage(stage, size, options))
+
+    run = {"environment": environment(), "options": options, "results": results}
+    output = args.output or os.path.join(results_folder, f"{time.strftime('%Y%m%d-%H%M%S')}.json")
+    for path in (output, os.path.join(root, LATEST_FILE)):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(run, f, indent=2)
+
+    baseline_path = os.path.join(root, args.baseline) if not os.path.isabs(args.baseline) else args.baseline
+    baseline = None
+    if os.path.exists(baseline_path) and not args.save_baseline:
+        with open(baseline_path, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    print_results(results, baseline)
+    print(f"\n💾 Resultados salvos em {output}")
+
+    if args.save_baseline:
+        shutil.copyfile(output, baseline_path)
+        print(f"📌 Referência atualizada: {baseline_path}")
+    elif baseline is not None:
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n⚠ {len(regressions)} regressão(ões) acima de {args.threshold:.0%} "
+                  f"(referência: commit {baseline['environment'].get('commit')}):")
+            for stage, size, name, before, after, change in regressions:
+                print(f"   {stage} N={size} {name}: {before} → {after} ({change:+.1%})")
+            sys.exit(1)
+        print(f"\n✅ Nenhuma regressão acima de {args.threshold:.0%}")
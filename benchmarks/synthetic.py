@@ -0,0 +1,165 @@
+import os
+import json
+import time
+import types
+import numpy as np
+
+# Corpus sintético: palavras inventadas com frequência Zipf, cada documento com um tópico
+# (o tópico desloca a distribuição, então documentos do mesmo tópico compartilham palavras)
+VOCABULARY_SIZE = 20000
+N_TOPICS = 20
+ZIPF_EXPONENT = 1.2
+WORDS_PER_LINE = 14
+DIMENSION = 768
+
+SYLLABLES = ["ka", "lo", "mi", "ne", "ru", "ta", "vo", "xi", "be", "do", "fu", "ga", "hi", "jo", "pe", "si",
+             "da", "te", "co", "py", "js", "re", "ac", "ts", "go", "ml", "ai", "db", "os", "ui"]
+
+# Trechos típicos das páginas baixadas do GitHub, que a limpeza precisa tratar
+GITHUB_CHROME = ("Navigation Menu Toggle navigation Sign in Product GitHub Copilot Write better code with AI "
+                 "Security Find and fix vulnerabilities Actions Automate any workflow Codespaces Instant dev "
+                 "environments Explore All features Search or jump to...")
+NON_ASCII = ["café", "naïve", "→", "✓", "—", "中文", "😀"]
+
+
+def make_vocabulary(size=VOCABULARY_SIZE, seed=0):
+    """Palavras inventadas (2 a 4 sílabas), determinísticas para a semente"""
+    rng = np.random.default_rng(seed)
+    lengths = rng.integers(2, 5, size)
+    picks = rng.integers(0, len(SYLLABLES), (size, 4))
+    words = dict.fromkeys("".join(SYLLABLES[j] for j in row[:n]) for row, n in zip(picks, lengths))
+    words = list(words)
+    i = 0
+    while len(words) < size:  # Completa as colisões com sufixos numéricos
+        words.append(f"{words[i]}{i}")
+        i += 1
+    return np.array(words[:size], dtype=object)
+
+
+def generate_documents(n_docs, avg_kb=4, seed=0, raw=False, vocabulary_size=VOCABULARY_SIZE):
+    """Gera (nome, texto) de documentos sintéticos, um por vez
+
+    Args:
+        avg_kb: Tamanho médio de cada documento (log-normal em torno dele)
+        raw: Inclui o menu do GitHub, espaços repetidos e caracteres não ASCII, como
+            nas páginas ainda não limpas (data/raw)
+    """
+    rng = np.random.default_rng(seed)
+    vocabulary = make_vocabulary(vocabulary_size, seed)
+    shifts = rng.integers(0, vocabulary_size, N_TOPICS)
+    mean_words = avg_kb * 1024 / 7  # ~7 bytes por palavra com o espaço
+
+    for i in range(n_docs):
+        topic = i % N_TOPICS
+        n_words = max(8, int(rng.lognormal(np.log(mean_words), 0.6)))
+        ranks = np.minimum(rng.zipf(ZIPF_EXPONENT, n_words), vocabulary_size) - 1
+        words = vocabulary[(ranks + shifts[topic]) % vocabulary_size]
+        lines = [" ".join(words[start:start + WORDS_PER_LINE]) for start in range(0, n_words, WORDS_PER_LINE)]
+
+        if raw:
+            for j in rng.integers(0, len(lines), max(1, len(lines) // 10)):
+                lines[j] += f"  {NON_ASCII[j % len(NON_ASCII)]}   "
+            text = f"{GITHUB_CHROME}\n\n" + "\n".join(lines)
+        else:
+            text = "\n".join(lines)
+        yield f"{vocabulary[shifts[topic]]}_{i}.txt", text
+
+
+def write_documents(folder, n_docs, avg_kb=4, seed=0, raw=False):
+    """Grava o corpus sintético em arquivos .txt. Retorna o total de bytes escritos"""
+    os.makedirs(folder, exist_ok=True)
+    total = 0
+    for name, text in generate_documents(n_docs, avg_kb, seed, raw):
+        with open(os.path.join(folder, name), "w", encoding="utf-8") as f:
+            total += f.write(text)
+    return total
+
+
+def topic_vectors(n, dimension=DIMENSION, n_topics=N_TOPICS, seed=0, out=None, block_rows=65536):
+    """Vetores normalizados agrupados em tópicos, gerados em blocos
+
+    Args:
+        out: Matriz de destino (ex.: np.lib.format.open_memmap) para não manter tudo na memória
+    """
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((n_topics, dimension), dtype=np.float32)
+    matrix = np.empty((n, dimension), dtype=np.float32) if out is None else out
+    for start in range(0, n, block_rows):
+        rows = min(block_rows, n - start)
+        block = centers[np.arange(start, start + rows) % n_topics] + rng.standard_normal((rows, dimension),
+                                                                                        dtype=np.float32)
+        block /= np.linalg.norm(block, axis=1, keepdims=True)
+        matrix[start:start + rows] = block
+    return matrix
+
+
+def write_vector_store(prefix, n, dimension=DIMENSION, dtype="float32", seed=0):
+    """Grava um armazenamento de embeddings bloco a bloco (<prefixo>.npy sem a versão no nome, que open_store também lê)
+
+    O save_store normaliza a matriz inteira na memória; aqui os vetores já saem
+    normalizados e vão direto para o .npy mapeado, o que permite milhões de linhas.
+    """
+    os.makedirs(os.path.dirname(prefix) or ".", exist_ok=True)
+    matrix = np.lib.format.open_memmap(f"{prefix}.npy", mode="w+", dtype=dtype, shape=(n, dimension))
+    topic_vectors(n, dimension, seed=seed, out=matrix)
+    matrix.flush()
+    del matrix
+
+    ids = [f"doc_{i}.txt" for i in range(n)]
+    with open(f"{prefix}.json", "w", encoding="utf-8") as f:
+        json.dump({"ids": ids, "dtype": dtype, "count": n, "dimension": dimension,
+                   "version": f"synthetic-{n}-{dimension}-{dtype}-{seed}"}, f)
+    return ids
+
+
+class StubEncoder:
+    """Codificador determinístico no lugar do SentenceTransformer (roda sem baixar o modelo)
+
+    Os vetores vêm do hashing das palavras, então textos com palavras em comum ficam
+    próximos. Implementa o que o projeto usa do modelo: encode, tokenizer (com
+    offsets, para os trechos), max_seq_length, parameters e to. O tempo de cada
+    chamada ao encode por lote fica em batch_seconds.
+    """
+
+    max_seq_length = 384
+
+    def __init__(self, dimension=DIMENSION):
+        from sklearn.feature_extraction.text import HashingVectorizer
+
+        self.dimension = dimension
+        self.vectorizer = HashingVectorizer(n_features=dimension, alternate_sign=True, norm=None)
+        self.batch_seconds = []
+
+    def encode(self, sentences, batch_size=32, convert_to_numpy=True, normalize_embeddings=False, **kwargs):
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        embeddings = np.zeros((len(texts), self.dimension), dtype=np.float32)
+
+        for start in range(0, len(texts), batch_size):
+            began = time.perf_counter()
+            block = self.vectorizer.transform(texts[start:start + batch_size]).toarray().astype(np.float32)
+            if normalize_embeddings:
+                block /= np.maximum(np.linalg.norm(block, axis=1, keepdims=True), 1e-12)
+            embeddings[start:start + len(block)] = block
+            self.batch_seconds.append(time.perf_counter() - began)
+
+        return embeddings[0] if single else embeddings
+
+    def tokenizer(self, texts, add_special_tokens=True, return_offsets_mapping=False, truncation=False,
+                  max_length=None, verbose=True):
+        """Tokens = palavras separadas por espaço (com os offsets de cada uma, se pedido)"""
+        if isinstance(texts, str):
+            import re
+            spans = [match.span() for match in re.finditer(r"\S+", texts)]
+            return {"input_ids": spans, "offset_mapping": spans}
+        limit = max_length if truncation and max_length else None
+        return {"input_ids": [text.split(maxsplit=limit)[:limit] if limit else text.split() for text in texts]}
+
+    def get_sentence_embedding_dimension(self):
+        return self.dimension
+
+    def parameters(self):
+        return iter([types.SimpleNamespace(dtype="float32")])
+
+    def to(self, *args, **kwargs):
+        return self
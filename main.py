@@ -1,58 +1,182 @@
+import time
+
+STARTUP = time.perf_counter()
+
 import os
 import sys
-import time
+import json
+import argparse
 import subprocess
-from src.scraping.extract_links import extract_links, save_links
-from src.scraping.download_docs import download_documentation
-from src.processing.text_cleaning import process_documents
-from src.processing.generate_embeddings import generate_embeddings
+
+from src.pipeline.engine import Pipeline, Stage
+from src.monitoring import metrics
 
 LINKS_FILE = "data/raw/awesome_links.json"
 RAW_DOCS_FOLDER = "data/raw/docs/"
 PROCESSED_DOCS_FOLDER = "data/processed/"
-EMBEDDINGS_FILE = "embeddings/document_embeddings.pkl"
+DUPLICATES_FILE = "data/duplicates.json"
+# Os armazenamentos e o índice BM25 são identificados pelo JSON (os arrays têm a versão no nome)
+EMBEDDINGS_FILES = ["embeddings/document_embeddings.json"]
+PASSAGE_FILES = ["embeddings/passage_embeddings.json", "embeddings/passage_chunks.npz"]
+LEXICAL_FILES = ["embeddings/bm25.json"]
+STAGES = ["links", "download", "limpeza", "dedup", "embeddings", "trechos", "lexico"]
 
-def run_pipeline():
-    """Executa as etapas do pipeline antes de iniciar o dashboard"""
-    print("\n🚀 Iniciando o pipeline de processamento de documentação técnica...\n")
 
-    if not os.path.exists(LINKS_FILE):
-        print("🔗 Extraindo links das documentações...")
-        links = extract_links()
-        if links:
-            save_links(links)
-            print(f"✅ {len(links)} links extraídos com sucesso!")
-        else:
-            print("⚠ Nenhum link foi extraído.")
-            return
-    else:
-        print("✅ Links já extraídos. Pulando esta etapa.")
+def extract_links_stage(inbox, emit):
+    """Extrai a lista de links (só roda quando o arquivo de links não existe)"""
+    from src.scraping.extract_links import extract_links, save_links
 
-    time.sleep(1)
+    print("🔗 Extraindo links das documentações...")
+    links = extract_links()
+    if not links:
+        raise RuntimeError("Nenhum link foi extraído.")
+    save_links(links, LINKS_FILE)
+    print(f"✅ {len(links)} links extraídos com sucesso!")
+    for link in links:
+        emit(link)
+
+
+def download_stage(inbox, emit):
+    """Baixa as páginas (GET condicional), repassando cada página atualizada assim que é salva"""
+    from src.scraping.download_docs import download_documentation
+
+    print("\n📥 Baixando documentações (apenas páginas novas ou alteradas)...")
+    download_documentation(on_page=emit)
 
-    if not os.listdir(RAW_DOCS_FOLDER):
-        print("\n📥 Baixando documentações...")
-        download_documentation()
-    else:
-        print("✅ Documentações já baixadas. Pulando esta etapa.")
 
-    time.sleep(1)
+def clean_stage(inbox, emit):
+    """Limpa os documentos à medida que chegam do download"""
+    from src.processing.text_cleaning import process_documents
 
-    if not os.listdir(PROCESSED_DOCS_FOLDER):
+    received = False
+    for batch in inbox.batches():
+        received = True
+        process_documents(only=batch, on_document=emit)
+
+    if not received:
+        # Sem itens do download (ex.: documentos brutos editados): verifica todos
         print("\n🧹 Limpando e estruturando os textos...")
-        process_documents()
-    else:
-        print("✅ Textos já processados. Pulando esta etapa.")
+        process_documents(on_document=emit)
 
-    time.sleep(1)
 
-    if not os.path.exists(EMBEDDINGS_FILE):
-        print("\n🧠 Gerando embeddings para os documentos...")
-        generate_embeddings()
-    else:
-        print("✅ Embeddings já gerados. Pulando esta etapa.")
+def dedup_stage(inbox, emit):
+    """Repassa os documentos limpos que não são cópias de um documento já indexado e atualiza as quase duplicatas"""
+    from src.processing.dedup import DocumentDeduplicator, find_duplicates
+
+    deduplicator = DocumentDeduplicator()
+    skipped = 0
+    for batch in inbox.batches():
+        for filename in batch:
+            if deduplicator.check(filename) is None:
+                emit(filename)
+            else:
+                skipped += 1
+    if skipped:
+        print(f"🪞 {skipped} documentos novos são cópias de documentos já indexados (não codificados)")
+
+    # Grupos definitivos com todos os documentos limpos (usados pelos índices seguintes)
+    print("\n🪞 Procurando documentos quase duplicados...")
+    find_duplicates()
+
+
+def embeddings_stage(inbox, emit):
+    """Codifica os documentos limpos em lotes enquanto o download continua e salva o armazenamento"""
+    from src.processing.generate_embeddings import (
+        generate_embeddings, encode_documents, load_embedding_store, content_hash, BATCH_SIZE
+    )
+
+    _, stored_hashes = load_embedding_store()
+    known = set(stored_hashes.values())
+    precomputed = {}
+
+    for batch in inbox.batches(BATCH_SIZE):
+        contents = {}
+        for filename in batch:
+            with open(os.path.join(PROCESSED_DOCS_FOLDER, filename), "r", encoding="utf-8") as f:
+                content = f.read()
+            digest = content_hash(content)
+            if digest not in known and digest not in precomputed:
+                contents[digest] = content
+        if contents:
+            precomputed.update(zip(contents, encode_documents(list(contents.values()))))
+
+    # Incremental: só documentos novos ou alterados (e ainda não codificados acima) são codificados
+    print("\n🧠 Atualizando embeddings dos documentos...")
+    generate_embeddings(precomputed=precomputed)
 
-    print("\n✅ Pipeline concluído com sucesso!")
+
+def passages_stage(inbox, emit):
+    """Atualiza o índice de trechos depois que todos os documentos alterados foram limpos"""
+    from src.processing.generate_embeddings import generate_passage_embeddings
+
+    for _ in inbox:
+        pass
+    print("\n🧩 Atualizando embeddings dos trechos...")
+    generate_passage_embeddings()
+
+
+def lexical_stage(inbox, emit):
+    """Atualiza o índice BM25 depois que todos os documentos alterados foram limpos"""
+    from src.search.lexical_index import build_lexical_index
+
+    for _ in inbox:
+        pass
+    print("\n🔤 Atualizando o índice BM25...")
+    build_lexical_index()
+
+
+def embeddings_adoptable():
+    """O armazenamento sem registro do pipeline só é adotado se tiver o hash de cada documento
+
+    O convertido do antigo pickle não tem hashes: a primeira execução o recodifica uma vez.
+    """
+    with open(EMBEDDINGS_FILES[0], "r", encoding="utf-8") as f:
+        meta = json.load(f)
+    hashes = meta.get("hashes") or []
+    return len(hashes) == meta.get("count") and all(hashes)
+
+
+def build_pipeline():
+    """Monta o DAG de etapas: links -> download -> limpeza -> dedup -> (embeddings, trechos, lexico)"""
+    return Pipeline([
+        Stage("links", extract_links_stage, outputs=[LINKS_FILE]),
+        Stage("download", download_stage, deps=["links"], inputs=[LINKS_FILE], outputs=[RAW_DOCS_FOLDER]),
+        Stage("limpeza", clean_stage, deps=["download"], inputs=[RAW_DOCS_FOLDER], outputs=[PROCESSED_DOCS_FOLDER]),
+        Stage("dedup", dedup_stage, deps=["limpeza"], inputs=[PROCESSED_DOCS_FOLDER], outputs=[DUPLICATES_FILE]),
+        Stage("embeddings", embeddings_stage, deps=["dedup"], inputs=[PROCESSED_DOCS_FOLDER, DUPLICATES_FILE],
+              outputs=EMBEDDINGS_FILES, adoptable=embeddings_adoptable),
+        Stage("trechos", passages_stage, deps=["dedup"], inputs=[PROCESSED_DOCS_FOLDER, DUPLICATES_FILE],
+              outputs=PASSAGE_FILES),
+        Stage("lexico", lexical_stage, deps=["dedup"], inputs=[PROCESSED_DOCS_FOLDER, DUPLICATES_FILE],
+              outputs=LEXICAL_FILES),
+    ])
+
+
+def run_pipeline(refresh=False, force=()):
+    """Executa as etapas do pipeline antes de iniciar o dashboard
+
+    As etapas rodam em paralelo e passam itens adiante assim que ficam prontos (um
+    documento pode ser limpo e codificado enquanto outros ainda são baixados). Etapas
+    sem itens novos, com outputs presentes e inputs inalterados são puladas, e cada
+    etapa importa seus módulos só quando precisa rodar.
+
+    Args:
+        refresh: Se True, refaz o crawl com GET condicional (ETag/Last-Modified)
+            e reprocessa apenas as páginas que mudaram
+        force: Nomes de etapas a executar mesmo sem alterações
+    """
+    print("\n🚀 Iniciando o pipeline de processamento de documentação técnica...\n")
+
+    force = set(force) | ({"download"} if refresh else set())
+    pipeline = build_pipeline()
+    summary = pipeline.run(force=force)
+    pipeline.print_summary()
+
+    if any(info["status"] == "falhou" for info in summary.values()):
+        print("\n⚠ Pipeline concluído com erros.")
+    else:
+        print("\n✅ Pipeline concluído com sucesso!")
+    return summary
 
 def start_dashboard():
     """Inicia o dashboard do Streamlit corretamente"""
@@ -60,5 +184,21 @@ def start_dashboard():
     subprocess.run([sys.executable, "-m", "streamlit", "run", "app/dashboard.py", "--server.fileWatcherType", "none"])
 
 if __name__ == "__main__":
-    run_pipeline()
+    parser = argparse.ArgumentParser(description="Pipeline de documentação técnica + dashboard")
+    parser.add_argument("--refresh", action="store_true",
+                        help="Refaz o crawl com GET condicional, reescrevendo só as páginas alteradas")
+    parser.add_argument("--force", action="append", default=[], choices=STAGES,
+                        help="Executa a etapa mesmo sem alterações (pode ser repetido)")
+    parser.add_argument("--metrics", action="store_true",
+                        help=f"Coleta métricas (pipeline e dashboard) em {metrics.METRICS_FOLDER}")
+    args = parser.parse_args()
+
+    if args.metrics:
+        os.environ["METRICS"] = "1"  # Herdado pelo processo do dashboard
+        metrics.enable()
+
+    run_pipeline(refresh=args.refresh, force=args.force)
+    if args.metrics:
+        print(f"📊 Métricas do pipeline em {metrics.export()}")
+    print(f"\n⏱ Inicialização em {time.perf_counter() - STARTUP:.3f}s")
     start_dashboard()
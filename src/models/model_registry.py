@@ -0,0 +1,53 @@
+import time
+import threading
+
+MODEL_NAME = "sentence-transformers/all-mpnet-base-v2"
+
+# Modelos já carregados, compartilhados por geração de embeddings, busca e dashboard
+_models = {}
+_load_seconds = {}
+_lock = threading.Lock()
+
+
+def get_model(model_name=MODEL_NAME):
+    """Retorna o SentenceTransformer, carregando-o (uma única vez por processo) no primeiro uso
+
+    O import do sentence_transformers/torch também é adiado até aqui, então módulos
+    que só leem embeddings salvos não pagam esse custo.
+    """
+    model = _models.get(model_name)
+    if model is not None:
+        return model
+
+    with _lock:
+        if model_name not in _models:
+            start = time.perf_counter()
+            from sentence_transformers import SentenceTransformer
+            _models[model_name] = SentenceTransformer(model_name)
+            _load_seconds[model_name] = time.perf_counter() - start
+            print(f"🧠 Modelo {model_name} carregado em {_load_seconds[model_name]:.1f}s")
+        return _models[model_name]
+
+
+def register_model(model, model_name=MODEL_NAME):
+    """Registra um modelo já construído sob o nome (ex.: um codificador sintético nos benchmarks)"""
+    with _lock:
+        _models[model_name] = model
+        _load_seconds[model_name] = 0.0
+
+
+def is_loaded(model_name=MODEL_NAME):
+    """Indica se o modelo já está em memória"""
+    return model_name in _models
+
+
+def preload_model(model_name=MODEL_NAME):
+    """Carrega o modelo em segundo plano (ex.: enquanto o dashboard é exibido)"""
+    thread = threading.Thread(target=get_model, args=(model_name,), daemon=True)
+    thread.start()
+    return thread
+
+
+def load_times():
+    """Tempo de carga (s) de cada modelo carregado neste processo"""
+    return dict(_load_seconds)
@@ -0,0 +1,276 @@
+import os
+import sys
+import json
+import time
+import atexit
+import bisect
+import threading
+import contextlib
+from functools import wraps
+
+# Métricas (contadores e histogramas) exportadas em texto do Prometheus e em JSON lines.
+# Desligadas por padrão: com METRICS=1 (ou enable()) passam a ser coletadas e são
+# gravadas em METRICS_FOLDER ao final do processo.
+METRICS_ENABLED = os.environ.get("METRICS", "0") not in ("", "0", "false")
+METRICS_FOLDER = os.environ.get("METRICS_FOLDER", "metrics/")
+PROMETHEUS_FILE = "metrics.prom"
+EVENTS_FILE = "events.jsonl"
+EVENTS_BUFFER = 1000          # Eventos acumulados antes de escrever no JSON lines
+
+# Limites (segundos) dos buckets dos histogramas de latência
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# Perfil opt-in: PROFILE=<nome>[,<nome>...] perfila os blocos com esses nomes (ex.: "search",
+# "etapa:limpeza"); PROFILE_MODE="cprofile" (determinístico) ou "sample" (amostragem de pilhas)
+PROFILE_TARGETS = {name.strip() for name in os.environ.get("PROFILE", "").split(",") if name.strip()}
+PROFILE_MODES = ["cprofile", "sample"]
+PROFILE_MODE = os.environ.get("PROFILE_MODE", "cprofile")
+SAMPLE_INTERVAL = 0.005       # Segundos entre amostras no modo "sample"
+
+
+class NullTimer:
+    """Timer sem efeito, devolvido quando as métricas estão desligadas (custo de uma chamada)"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NULL_TIMER = NullTimer()
+
+
+class Timer:
+    """Mede o bloco e registra a duração no histograma; exceções contam em <nome>_errors_total"""
+
+    def __init__(self, registry, name, labels):
+        self.registry = registry
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.seconds = time.perf_counter() - self.start
+        self.registry.observe(self.name, self.seconds, **self.labels)
+        if exc_type is not None:
+            self.registry.inc(f"{self.name.removesuffix('_seconds')}_errors_total", **self.labels)
+        return False
+
+
+class MetricsRegistry:
+    """Contadores e histogramas em memória, identificados por (nome, rótulos)"""
+
+    def __init__(self, enabled=METRICS_ENABLED, folder=METRICS_FOLDER, buckets=LATENCY_BUCKETS):
+        self.enabled = enabled
+        self.folder = folder
+        self.buckets = buckets
+        self.counters = {}
+        self.histograms = {}     # chave -> [contagem por bucket (+Inf no fim), soma, total]
+        self.events = []
+        self.lock = threading.Lock()
+
+    def inc(self, name, value=1, **labels):
+        """Soma `value` ao contador"""
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        """Registra um valor (ex.: duração em segundos) no histograma e no JSON lines"""
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        # Primeiro bucket cujo limite comporta o valor (o último é +Inf)
+        bucket = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            histogram[0][bucket] += 1
+            histogram[1] += value
+            histogram[2] += 1
+            self.events.append({"ts": round(time.time(), 6), "metric": name, "labels": labels,
+                                "value": round(value, 6)})
+            flush = len(self.events) >= EVENTS_BUFFER
+        if flush:
+            self.flush_events()
+
+    def timer(self, name, **labels):
+        """Context manager que registra a duração do bloco em `name` (no-op se desligado)"""
+        if not self.enabled:
+            return NULL_TIMER
+        return Timer(self, name, labels)
+
+    def timed(self, name, **labels):
+        """Decorador equivalente a envolver a função em timer(name)"""
+        def decorator(function):
+            @wraps(function)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return function(*args, **kwargs)
+                with Timer(self, name, labels):
+                    return function(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def to_prometheus(self):
+        """Texto no formato de exposição do Prometheus"""
+        def format_labels(labels, extra=()):
+            pairs = [f'{key}="{str(value)}"' for key, value in (*labels, *extra)]
+            return "{" + ",".join(pairs) + "}" if pairs else ""
+
+        with self.lock:
+            counters = sorted(self.counters.items())
+            histograms = sorted((key, ([*counts], total, count)) for key, (counts, total, count)
+                                in self.histograms.items())
+
+        lines = []
+        typed = set()
+        for (name, labels), value in counters:
+            if name not in typed:
+                lines.append(f"# TYPE {name} counter")
+                typed.add(name)
+            lines.append(f"{name}{format_labels(labels)} {value}")
+
+        for (name, labels), (counts, total, count) in histograms:
+            if name not in typed:
+                lines.append(f"# TYPE {name} histogram")
+                typed.add(name)
+            cumulative = 0
+            for bound, bucket_count in zip((*self.buckets, "+Inf"), counts):
+                cumulative += bucket_count
+                lines.append(f"{name}_bucket{format_labels(labels, [('le', bound)])} {cumulative}")
+            lines.append(f"{name}_sum{format_labels(labels)} {total:.6f}")
+            lines.append(f"{name}_count{format_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+    def flush_events(self):
+        """Acrescenta os eventos acumulados ao arquivo JSON lines"""
+        with self.lock:
+            events, self.events = self.events, []
+        if not events:
+            return
+        os.makedirs(self.folder, exist_ok=True)
+        with open(os.path.join(self.folder, EVENTS_FILE), "a", encoding="utf-8") as f:
+            f.writelines(json.dumps(event, ensure_ascii=False) + "\n" for event in events)
+
+    def export(self):
+        """Grava o texto do Prometheus (de forma atômica) e os eventos pendentes"""
+        if not self.enabled:
+            return None
+        os.makedirs(self.folder, exist_ok=True)
+        path = os.path.join(self.folder, PROMETHEUS_FILE)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(self.to_prometheus())
+        os.replace(tmp_path, path)
+        self.flush_events()
+        return path
+
+    def summary(self):
+        """{nome: (total de observações, soma)} dos histogramas, somando todos os rótulos"""
+        totals = {}
+        with self.lock:
+            for (name, _), (_, total, count) in self.histograms.items():
+                previous = totals.get(name, (0, 0.0))
+                totals[name] = (previous[0] + count, previous[1] + total)
+        return totals
+
+
+# Registro global usado pelo projeto
+registry = MetricsRegistry()
+inc = registry.inc
+observe = registry.observe
+timer = registry.timer
+timed = registry.timed
+export = registry.export
+atexit.register(export)
+
+
+def enable(folder=None):
+    """Liga a coleta de métricas neste processo (equivale a METRICS=1)"""
+    registry.enabled = True
+    if folder:
+        registry.folder = folder
+
+
+def profiled(name, mode=None):
+    """Decorador equivalente a envolver a função em profile(name); sem perfil, só um teste de conjunto"""
+    def decorator(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            if name not in PROFILE_TARGETS:
+                return function(*args, **kwargs)
+            with profile(name, mode):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def sample_stacks(stop, interval, thread_id, counts):
+    """Amostra a pilha da thread perfilada a cada `interval` segundos até `stop` ser sinalizado"""
+    while not stop.wait(interval):
+        frame = sys._current_frames().get(thread_id)
+        stack = []
+        while frame is not None:
+            stack.append(f"{os.path.basename(frame.f_code.co_filename)}:{frame.f_code.co_name}")
+            frame = frame.f_back
+        if stack:
+            key = ";".join(reversed(stack))
+            counts[key] = counts.get(key, 0) + 1
+
+
+@contextlib.contextmanager
+def profile(name, mode=None, force=False, top=15):
+    """Perfila o bloco se `name` estiver em PROFILE (ou com force=True); caso contrário não faz nada
+
+    Modo "cprofile": salva <METRICS_FOLDER>/profile-<nome>.prof (abrir com pstats/snakeviz)
+    e imprime as funções mais caras. Modo "sample": amostra a pilha da thread a cada
+    SAMPLE_INTERVAL e salva as pilhas agregadas em profile-<nome>.folded (formato do
+    flamegraph.pl / speedscope), com custo baixo mesmo em etapas longas.
+    """
+    if not force and name not in PROFILE_TARGETS:
+        yield
+        return
+
+    mode = mode or PROFILE_MODE
+    if mode not in PROFILE_MODES:
+        raise ValueError(f"Modo de perfil desconhecido. Use um de {PROFILE_MODES}.")
+
+    os.makedirs(registry.folder, exist_ok=True)
+    filename = os.path.join(registry.folder, f"profile-{name.replace(':', '_').replace('/', '_')}")
+
+    if mode == "cprofile":
+        import cProfile
+        import pstats
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            profiler.dump_stats(f"{filename}.prof")
+            print(f"🔬 Perfil de {name} salvo em {filename}.prof")
+            pstats.Stats(profiler).sort_stats("cumulative").print_stats(top)
+        return
+
+    counts = {}
+    stop = threading.Event()
+    sampler = threading.Thread(target=sample_stacks, args=(stop, SAMPLE_INTERVAL, threading.get_ident(), counts),
+                               daemon=True)
+    sampler.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        sampler.join()
+        with open(f"{filename}.folded", "w", encoding="utf-8") as f:
+            f.writelines(f"{stack} {count}\n" for stack, count in sorted(counts.items(), key=lambda item: -item[1]))
+        print(f"🔬 {sum(counts.values())} amostras de {name} salvas em {filename}.folded")
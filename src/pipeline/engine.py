@@ -0,0 +1,274 @@
+import os
+import sys
+import json
+import time
+import queue
+import hashlib
+import threading
+from collections import deque
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from src.monitoring import metrics
+
+# Estado do pipeline: fingerprint das entradas de cada etapa na última execução bem-sucedida
+PIPELINE_STATE_FILE = "data/pipeline_state.json"
+
+_DONE = object()
+
+
+class Inbox:
+    """Fila de itens que uma etapa recebe das etapas anteriores, à medida que são produzidos
+
+    A iteração termina quando todas as etapas produtoras encerram.
+    """
+
+    def __init__(self, producers):
+        self.queue = queue.Queue()
+        self.open = producers
+        self.buffer = deque()
+        self.received = 0
+
+    def put(self, item):
+        self.queue.put(item)
+
+    def close(self):
+        self.queue.put(_DONE)
+
+    def _next(self, block=True):
+        """Próximo item da fila, ou _DONE quando os produtores encerraram (ou a fila está vazia, sem bloquear)"""
+        if self.buffer:
+            return self.buffer.popleft()
+        while self.open > 0:
+            try:
+                item = self.queue.get(block=block)
+            except queue.Empty:
+                return _DONE
+            if item is not _DONE:
+                self.received += 1
+                return item
+            self.open -= 1
+        return _DONE
+
+    def wait(self):
+        """Bloqueia até chegar o primeiro item ou os produtores encerrarem. Retorna True se há itens"""
+        item = self._next()
+        if item is _DONE:
+            return False
+        self.buffer.appendleft(item)
+        return True
+
+    def __iter__(self):
+        while (item := self._next()) is not _DONE:
+            yield item
+
+    def batches(self, max_size=None):
+        """Itera em lotes: espera o primeiro item e junta os que já estiverem disponíveis"""
+        while (item := self._next()) is not _DONE:
+            batch = [item]
+            while max_size is None or len(batch) < max_size:
+                item = self._next(block=False)
+                if item is _DONE:
+                    break
+                batch.append(item)
+            yield batch
+
+
+class Stage:
+    """Etapa do pipeline
+
+    Args:
+        name: Nome da etapa
+        run: Função run(inbox, emit): consome os itens de `inbox` e repassa os próprios com emit(item)
+        deps: Etapas cujos itens esta etapa recebe (devem vir antes na lista do Pipeline)
+        inputs: Arquivos/pastas lidos pela etapa; se o conteúdo mudar, a etapa é refeita
+        outputs: Arquivos/pastas gerados; se algum não existir, a etapa é refeita
+        adoptable: Função sem argumentos que diz se os outputs existentes, gerados antes do
+            pipeline registrar estado, podem ser adotados como atualizados (None: sempre)
+    """
+
+    def __init__(self, name, run, deps=(), inputs=(), outputs=(), adoptable=None):
+        self.name = name
+        self.run = run
+        self.deps = list(deps)
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.adoptable = adoptable
+
+
+def list_files(path):
+    """Lista os arquivos de um caminho (o próprio arquivo ou o conteúdo da pasta), em ordem"""
+    if os.path.isfile(path):
+        return [path]
+    files = []
+    for root, _, names in os.walk(path):
+        files.extend(os.path.join(root, name) for name in names)
+    return sorted(files)
+
+
+def output_missing(path):
+    return not os.path.exists(path) or (os.path.isdir(path) and not os.listdir(path))
+
+
+class Pipeline:
+    """Executa as etapas em threads, passando os itens de uma etapa para as seguintes assim que ficam prontos
+
+    Uma etapa roda se recebeu itens, se foi forçada, se algum de seus outputs não
+    existe ou se o conteúdo de seus inputs mudou desde a última execução bem-sucedida.
+    Caso contrário, é pulada. Os fingerprints reaproveitam o hash de arquivos cujo
+    tamanho e mtime não mudaram, então uma execução sem alterações só faz os stats.
+    """
+
+    def __init__(self, stages, state_file=PIPELINE_STATE_FILE):
+        names = set()
+        for stage in stages:
+            missing = [dep for dep in stage.deps if dep not in names]
+            if missing:
+                raise ValueError(f"Etapa {stage.name} depende de etapas não declaradas antes: {missing}")
+            names.add(stage.name)
+
+        self.stages = stages
+        self.state_file = state_file
+        self.lock = threading.Lock()
+        self.state = self.load_state()
+        self.summary = {}
+
+    def load_state(self):
+        if not os.path.exists(self.state_file):
+            return {"files": {}, "stages": {}}
+        with open(self.state_file, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def save_state(self):
+        # Arquivos que deixaram de existir saem da tabela de hashes
+        self.state["files"] = {path: known for path, known in self.state["files"].items() if os.path.exists(path)}
+        os.makedirs(os.path.dirname(self.state_file) or ".", exist_ok=True)
+        tmp_file = f"{self.state_file}.tmp"
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            json.dump(self.state, f, indent=4, sort_keys=True)
+        os.replace(tmp_file, self.state_file)
+
+    def file_hash(self, path):
+        """Hash SHA-256 do arquivo, reaproveitado enquanto tamanho e mtime não mudarem"""
+        stat = os.stat(path)
+        with self.lock:
+            known = self.state["files"].get(path)
+        if known and known[0] == stat.st_size and known[1] == stat.st_mtime_ns:
+            return known[2]
+
+        with open(path, "rb") as f:
+            digest = hashlib.sha256(f.read()).hexdigest()
+        with self.lock:
+            self.state["files"][path] = [stat.st_size, stat.st_mtime_ns, digest]
+        return digest
+
+    def fingerprint(self, paths):
+        """Fingerprint do conteúdo de um conjunto de arquivos/pastas"""
+        digest = hashlib.sha256()
+        for path in paths:
+            for file_path in list_files(path):
+                digest.update(f"{file_path}\0{self.file_hash(file_path)}\n".encode("utf-8"))
+        return digest.hexdigest()
+
+    def is_stale(self, stage):
+        """Verifica se a etapa precisa rodar sem ter recebido itens. Retorna o motivo ou None"""
+        if any(output_missing(path) for path in stage.outputs):
+            return "outputs ausentes"
+
+        with self.lock:
+            record = self.state["stages"].get(stage.name)
+        fingerprint = self.fingerprint(stage.inputs)
+
+        if record is None:
+            if stage.adoptable is not None and not stage.adoptable():
+                return "artefatos sem registro"
+            # Artefatos gerados antes do pipeline registrar estado: adotados como atualizados
+            with self.lock:
+                self.state["stages"][stage.name] = {"inputs": fingerprint}
+            return None
+        if record.get("inputs") != fingerprint:
+            return "inputs alterados"
+        return None
+
+    def run_stage(self, stage, inbox, consumers, force):
+        info = {"status": "pulada", "seconds": 0.0, "received": 0, "emitted": 0, "reason": ""}
+        self.summary[stage.name] = info
+
+        def emit(item):
+            info["emitted"] += 1
+            for consumer in consumers:
+                consumer.put(item)
+
+        try:
+            # Espera o primeiro item (ou o fim das etapas anteriores) antes de decidir se roda
+            if inbox.wait():
+                reason = "itens recebidos"
+            elif stage.name in force:
+                reason = "forçada"
+            else:
+                reason = self.is_stale(stage)
+
+            if reason:
+                info["reason"] = reason
+                start = time.perf_counter()
+                try:
+                    with metrics.profile(f"etapa:{stage.name}"):
+                        stage.run(inbox, emit)
+                    for _ in inbox:  # Descarta itens que a etapa não consumiu
+                        pass
+                    fingerprint = self.fingerprint(stage.inputs)
+                    with self.lock:
+                        self.state["stages"][stage.name] = {"inputs": fingerprint}
+                    info["status"] = "executada"
+                except Exception as e:
+                    # Sem fingerprint válido a etapa é refeita na próxima execução
+                    with self.lock:
+                        self.state["stages"][stage.name] = {"inputs": None}
+                    info["status"] = "falhou"
+                    info["reason"] = str(e)
+                    print(f"❌ Etapa {stage.name} falhou: {e}")
+                    for _ in inbox:
+                        pass
+                info["seconds"] = time.perf_counter() - start
+                metrics.observe("pipeline_stage_seconds", info["seconds"], stage=stage.name)
+                metrics.inc("pipeline_stage_items_total", info["emitted"], stage=stage.name)
+            metrics.inc("pipeline_stage_runs_total", stage=stage.name, status=info["status"])
+        finally:
+            info["received"] = inbox.received
+            for consumer in consumers:
+                consumer.close()
+
+    def run(self, force=()):
+        """Executa o pipeline e retorna o resumo por etapa
+
+        Args:
+            force: Nomes de etapas a executar mesmo sem alterações
+        """
+        inboxes = {stage.name: Inbox(len(stage.deps)) for stage in self.stages}
+        consumers = {stage.name: [] for stage in self.stages}
+        for stage in self.stages:
+            for dep in stage.deps:
+                consumers[dep].append(inboxes[stage.name])
+
+        threads = [
+            threading.Thread(target=self.run_stage, name=f"stage-{stage.name}",
+                             args=(stage, inboxes[stage.name], consumers[stage.name], set(force)))
+            for stage in self.stages
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.save_state()
+        return self.summary
+
+    def print_summary(self):
+        """Exibe tempo, itens recebidos/emitidos e status de cada etapa"""
+        print(f"\n⏱ {'etapa':<12} {'status':<10} {'tempo':>8} {'recebidos':>10} {'emitidos':>9}  motivo")
+        for stage in self.stages:
+            info = self.summary.get(stage.name)
+            if info is None:
+                continue
+            print(f"   {stage.name:<12} {info['status']:<10} {info['seconds']:7.3f}s {info['received']:>10} "
+                  f"{info['emitted']:>9}  {info['reason']}")
@@ -0,0 +1,35 @@
+# Tamanho das janelas em tokens. O all-mpnet-base-v2 trunca a entrada em 384 tokens,
+# então cada trecho fica abaixo desse limite para ser codificado por inteiro.
+CHUNK_TOKENS = 256
+CHUNK_OVERLAP = 32
+
+
+def chunk_text(text, tokenizer, max_tokens=CHUNK_TOKENS, overlap=CHUNK_OVERLAP):
+    """Divide o texto em janelas de tokens com sobreposição
+
+    Args:
+        text: Texto do documento
+        tokenizer: Tokenizer (rápido) do modelo, usado para obter os offsets dos tokens
+        max_tokens: Número máximo de tokens por trecho
+        overlap: Tokens compartilhados entre trechos consecutivos
+
+    Returns:
+        Lista de (início, fim) em caracteres de cada trecho dentro do texto
+    """
+    if overlap >= max_tokens:
+        raise ValueError("overlap deve ser menor que max_tokens")
+
+    offsets = tokenizer(text, add_special_tokens=False, return_offsets_mapping=True,
+                        truncation=False, verbose=False)["offset_mapping"]
+    if not offsets:
+        return [(0, len(text))] if text else []
+
+    stride = max_tokens - overlap
+    chunks = []
+    for first in range(0, len(offsets), stride):
+        last = min(first + max_tokens, len(offsets)) - 1
+        chunks.append((offsets[first][0], offsets[last][1]))
+        if last == len(offsets) - 1:
+            break
+
+    return chunks
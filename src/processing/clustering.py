@@ -0,0 +1,239 @@
+import os
+import sys
+import time
+import pickle
+import argparse
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from src.search.embedding_store import open_store, store_exists
+
+EMBEDDINGS_STORE = "embeddings/document_embeddings"
+PASSAGE_STORE = "embeddings/passage_embeddings"
+# Modelos de clusters persistidos, um por armazenamento (documentos e trechos não se misturam);
+# cada um é atualizado com partial_fit quando novos documentos ou trechos são codificados
+CLUSTER_MODEL_FILES = {
+    EMBEDDINGS_STORE: "embeddings/cluster_model.documents.pkl",
+    PASSAGE_STORE: "embeddings/cluster_model.passages.pkl",
+}
+CLUSTER_MODEL_FILE = CLUSTER_MODEL_FILES[EMBEDDINGS_STORE]
+
+# Até este número de vetores o K-means completo (n_init=10) é rápido; acima, mini-batch em blocos
+MINIBATCH_THRESHOLD = 20000
+BLOCK_ROWS = 65536        # Linhas lidas do mmap por vez: limita a memória independentemente do tamanho
+MINIBATCH_SIZE = 4096
+MINIBATCH_EPOCHS = 2
+
+# Escolha automática de k: avaliada em uma amostra
+K_RANGE = range(2, 16)
+SAMPLE_SIZE = 5000
+K_CRITERIA = ["elbow", "silhouette"]
+# Em embeddings de texto a silhueta costuma ser baixa e ruidosa para todo k e favorecer k=2;
+# o cotovelo da inércia dá agrupamentos mais úteis para a visualização
+K_CRITERION = "elbow"
+
+
+def iter_blocks(matrix, block_rows=BLOCK_ROWS):
+    """Percorre a matriz (ex.: mmap) em blocos float32, sem carregá-la inteira"""
+    for start in range(0, len(matrix), block_rows):
+        yield start, np.asarray(matrix[start:start + block_rows], dtype=np.float32)
+
+
+def sample_rows(matrix, size=SAMPLE_SIZE, random_state=42):
+    """Amostra aleatória de linhas (lê do disco apenas as linhas sorteadas)"""
+    if len(matrix) <= size:
+        return np.asarray(matrix, dtype=np.float32)
+    rows = np.sort(np.random.default_rng(random_state).choice(len(matrix), size, replace=False))
+    return np.asarray(matrix[rows], dtype=np.float32)
+
+
+def fit_clusters(matrix, n_clusters, random_state=42, block_rows=BLOCK_ROWS, epochs=MINIBATCH_EPOCHS):
+    """Ajusta o K-means: completo em corpora pequenos, mini-batch em blocos nos grandes
+
+    No caminho mini-batch, cada bloco é embaralhado e dividido em lotes de
+    MINIBATCH_SIZE passados a partial_fit; só um bloco fica na memória por vez.
+    """
+    from sklearn.cluster import KMeans, MiniBatchKMeans
+
+    if len(matrix) <= MINIBATCH_THRESHOLD:
+        return KMeans(n_clusters=n_clusters, random_state=random_state, n_init=10).fit(
+            np.asarray(matrix, dtype=np.float32))
+
+    # Centroides iniciais (k-means++) calculados em uma amostra
+    init = KMeans(n_clusters=n_clusters, random_state=random_state, n_init=1).fit(
+        sample_rows(matrix, max(SAMPLE_SIZE, n_clusters * 10), random_state)).cluster_centers_
+    model = MiniBatchKMeans(n_clusters=n_clusters, init=init, n_init=1, batch_size=MINIBATCH_SIZE,
+                            random_state=random_state)
+
+    rng = np.random.default_rng(random_state)
+    for _ in range(epochs):
+        for _, block in iter_blocks(matrix, block_rows):
+            rng.shuffle(block)
+            for start in range(0, len(block), MINIBATCH_SIZE):
+                batch = block[start:start + MINIBATCH_SIZE]
+                if len(batch) >= n_clusters:
+                    model.partial_fit(batch)
+    return model
+
+
+def predict_labels(model, matrix, block_rows=BLOCK_ROWS):
+    """Rótulo de cada linha, calculado em blocos"""
+    labels = np.empty(len(matrix), dtype=np.int32)
+    for start, block in iter_blocks(matrix, block_rows):
+        labels[start:start + len(block)] = model.predict(block)
+    return labels
+
+
+def knee_point(ks, inertias):
+    """Cotovelo: o k mais distante da reta entre o primeiro e o último ponto da curva de inércia"""
+    x = (np.asarray(ks, dtype=np.float64) - ks[0]) / max(ks[-1] - ks[0], 1)
+    y = np.asarray(inertias, dtype=np.float64)
+    y = (y - y[-1]) / max(y[0] - y[-1], 1e-12)
+    return ks[int(np.argmax(np.abs(1 - x - y)))]
+
+
+def choose_k(matrix, k_values=K_RANGE, criterion=K_CRITERION, sample_size=SAMPLE_SIZE, random_state=42):
+    """Escolhe o número de clusters avaliando cada k em uma amostra
+
+    Args:
+        criterion: "silhouette" (maior coeficiente de silhueta) ou "elbow" (cotovelo da inércia)
+
+    Returns:
+        (melhor k, {k: pontuação}), com a silhueta ou a inércia de cada k
+    """
+    from sklearn.cluster import KMeans
+    from sklearn.metrics import silhouette_score
+
+    if criterion not in K_CRITERIA:
+        raise ValueError(f"Critério desconhecido. Use um de {K_CRITERIA}.")
+
+    sample = sample_rows(matrix, sample_size, random_state)
+    k_values = [k for k in k_values if 2 <= k < len(sample)]
+    if not k_values:
+        return 1, {}
+
+    start = time.perf_counter()
+    scores = {}
+    for k in k_values:
+        model = KMeans(n_clusters=k, random_state=random_state, n_init=3).fit(sample)
+        if criterion == "silhouette":
+            scores[k] = float(silhouette_score(sample, model.labels_, metric="cosine"))
+        else:
+            scores[k] = float(model.inertia_)
+
+    if criterion == "silhouette":
+        best = max(scores, key=scores.get)
+    else:
+        best = knee_point(list(scores), list(scores.values()))
+
+    print(f"🔢 k={best} escolhido por {criterion} em {len(sample)} vetores ({time.perf_counter() - start:.1f}s)")
+    return best, scores
+
+
+class ClusterModel:
+    """Modelo de clusters persistido que aceita novos vetores com partial_fit
+
+    Guarda o armazenamento de origem (`store`): vetores de documentos e de trechos têm a
+    mesma dimensão, então só a origem impede que as duas populações se misturem.
+    """
+
+    def __init__(self, model, dimension, n_seen, store=EMBEDDINGS_STORE):
+        self.model = model
+        self.dimension = dimension
+        self.n_seen = n_seen
+        self.store = store
+
+    @property
+    def n_clusters(self):
+        return self.model.n_clusters
+
+    @classmethod
+    def fit(cls, matrix, n_clusters=None, criterion=K_CRITERION, random_state=42, store=EMBEDDINGS_STORE):
+        """Ajusta o modelo (k automático se n_clusters for None) e o converte para mini-batch"""
+        from sklearn.cluster import MiniBatchKMeans
+
+        if n_clusters is None:
+            n_clusters, _ = choose_k(matrix, criterion=criterion, random_state=random_state)
+
+        fitted = fit_clusters(matrix, n_clusters, random_state)
+        if not isinstance(fitted, MiniBatchKMeans):
+            # Parte dos centroides do K-means completo, mas passa a aceitar partial_fit
+            init = fitted.cluster_centers_
+            sizes = np.bincount(fitted.labels_, minlength=n_clusters)
+            fitted = MiniBatchKMeans(n_clusters=n_clusters, init=init, n_init=1, batch_size=MINIBATCH_SIZE,
+                                     random_state=random_state).partial_fit(init)
+            # Cada centroide pesa o tamanho do seu cluster, não um vetor: poucos documentos novos
+            # deslocam os centroides na proporção certa em vez de sobrescrever o ajuste completo
+            fitted.cluster_centers_[:] = init
+            fitted._counts = sizes.astype(fitted._counts.dtype)
+        return cls(fitted, matrix.shape[1], len(matrix), store)
+
+    def partial_fit(self, embeddings):
+        """Atualiza os centroides com novos vetores (ex.: documentos recém-codificados)"""
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        for start in range(0, len(embeddings), MINIBATCH_SIZE):
+            self.model.partial_fit(embeddings[start:start + MINIBATCH_SIZE])
+        self.n_seen += len(embeddings)
+        return self
+
+    def predict(self, matrix):
+        return predict_labels(self.model, matrix)
+
+    def save(self, path=CLUSTER_MODEL_FILE):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(self, f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path=CLUSTER_MODEL_FILE):
+        """Carrega o modelo salvo, ou None se ele não existir"""
+        if not os.path.exists(path):
+            return None
+        with open(path, "rb") as f:
+            return pickle.load(f)
+
+
+def fit_command(store):
+    """Comando que ajusta de novo o modelo de clusters do armazenamento"""
+    return "python src/processing/clustering.py" + (" --passages" if store == PASSAGE_STORE else "")
+
+
+def update_cluster_model(new_embeddings, store=EMBEDDINGS_STORE):
+    """Aplica partial_fit ao modelo salvo do armazenamento (se houver) com os vetores recém-codificados"""
+    model = ClusterModel.load(CLUSTER_MODEL_FILES[store])
+    if model is None or len(new_embeddings) == 0:
+        return None
+    if getattr(model, "store", None) != store:
+        print(f"⚠ Modelo de clusters ajustado em outro armazenamento: ajuste-o novamente com {fit_command(store)}")
+        return None
+    if np.shape(new_embeddings)[1] != model.dimension:
+        print(f"⚠ Modelo de clusters com outra dimensão: ajuste-o novamente com {fit_command(store)}")
+        return None
+
+    model.partial_fit(new_embeddings).save(CLUSTER_MODEL_FILES[store])
+    print(f"🔄 Modelo de clusters atualizado com {len(new_embeddings)} novos vetores ({model.n_seen} no total)")
+    return model
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ajusta o modelo de clusters dos documentos ou trechos")
+    parser.add_argument("--passages", action="store_true", help="Usa os embeddings dos trechos")
+    parser.add_argument("--k", type=int, default=None, help="Número de clusters (padrão: automático)")
+    parser.add_argument("--criterion", choices=K_CRITERIA, default=K_CRITERION)
+    args = parser.parse_args()
+
+    store = PASSAGE_STORE if args.passages else EMBEDDINGS_STORE
+    if not store_exists(store):
+        print(f"Erro: Armazenamento {store} não encontrado. Execute generate_embeddings.py primeiro.")
+        sys.exit(1)
+
+    matrix, _ = open_store(store)
+    start = time.perf_counter()
+    model = ClusterModel.fit(matrix, args.k, args.criterion, store=store)
+    model.save(CLUSTER_MODEL_FILES[store])
+    sizes = np.bincount(model.predict(matrix), minlength=model.n_clusters)
+    print(f"✅ {model.n_clusters} clusters ajustados em {len(matrix)} vetores em {time.perf_counter() - start:.1f}s "
+          f"(tamanhos: {sizes.tolist()}), salvo em {CLUSTER_MODEL_FILES[store]}")
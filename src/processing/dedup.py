@@ -0,0 +1,306 @@
+import os
+import re
+import sys
+import json
+import time
+import zlib
+import hashlib
+import argparse
+import threading
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from src.monitoring import metrics
+
+# Caminhos
+PROCESSED_DOCS_FOLDER = "data/processed/"
+# Documentos quase duplicados (cópia -> original) e assinaturas MinHash em cache (pelo hash do conteúdo)
+DUPLICATES_FILE = "data/duplicates.json"
+SIGNATURES_FILE = "data/dedup_signatures.npz"
+
+# MinHash sobre shingles de 5 palavras; a fração de posições iguais entre duas assinaturas
+# estima a similaridade de Jaccard dos conjuntos de shingles.
+SHINGLE_WORDS = 5
+NUM_PERMUTATIONS = 120
+# LSH: 20 bandas de 6 linhas. Um par vira candidato se coincidir em uma banda inteira:
+# probabilidade ~0.998 com Jaccard 0.8 e ~0.27 com 0.5 (candidatos são conferidos na assinatura)
+LSH_BANDS = 20
+LSH_ROWS = NUM_PERMUTATIONS // LSH_BANDS
+DOC_THRESHOLD = 0.8       # Documentos com Jaccard estimado acima disso são cópias do original
+# Trechos: o cabeçalho de navegação do GitHub ocupa quase todo o primeiro trecho de cada
+# página (só o título muda) e fica em torno de 0.8-0.9 entre páginas diferentes
+CHUNK_THRESHOLD = 0.8
+MINHASH_SEED = 42
+MINHASH_BLOCK = 4096      # Shingles processados por vez (limita a matriz temporária de hashes)
+
+MERSENNE_PRIME = np.uint64((1 << 31) - 1)
+_rng = np.random.default_rng(MINHASH_SEED)
+PERMUTATION_A = _rng.integers(1, (1 << 31) - 1, NUM_PERMUTATIONS).astype(np.uint64)
+PERMUTATION_B = _rng.integers(0, (1 << 31) - 1, NUM_PERMUTATIONS).astype(np.uint64)
+
+WORD_PATTERN = re.compile(r"\w+")
+_lock = threading.Lock()
+
+
+def shingle_hashes(text, size=SHINGLE_WORDS):
+    """Hashes (estáveis entre execuções) dos shingles de `size` palavras consecutivas do texto
+
+    Cada palavra vira um crc32 e os shingles combinam os hashes de `size` palavras
+    vizinhas de forma vetorizada. Textos com menos palavras viram um único shingle.
+    """
+    words = WORD_PATTERN.findall(text.lower())
+    if not words:
+        return np.zeros(0, dtype=np.uint64)
+    hashes = np.fromiter((zlib.crc32(word.encode("utf-8")) for word in words), dtype=np.uint64, count=len(words))
+    if len(hashes) < size:
+        size = len(hashes)
+    shingles = hashes[:len(hashes) - size + 1].copy()
+    for offset in range(1, size):
+        shingles = shingles * np.uint64(1000003) + hashes[offset:len(hashes) - size + 1 + offset]
+    return np.unique(shingles % MERSENNE_PRIME)
+
+
+def minhash(text):
+    """Assinatura MinHash (uint32) do texto, ou None se ele não tiver palavras"""
+    shingles = shingle_hashes(text)
+    if not len(shingles):
+        return None
+    signature = np.full(NUM_PERMUTATIONS, MERSENNE_PRIME, dtype=np.uint64)
+    for start in range(0, len(shingles), MINHASH_BLOCK):
+        # a < 2^31 e shingle < 2^31: o produto cabe em uint64 sem estourar
+        block = shingles[start:start + MINHASH_BLOCK]
+        values = (np.outer(PERMUTATION_A, block) + PERMUTATION_B[:, None]) % MERSENNE_PRIME
+        np.minimum(signature, values.min(axis=1), out=signature)
+    return signature.astype(np.uint32)
+
+
+def similarity(a, b):
+    """Jaccard estimado: fração de posições iguais entre as assinaturas"""
+    return float(np.mean(a == b))
+
+
+class DuplicateIndex:
+    """Assinaturas MinHash indexadas por bandas (LSH) para achar quase duplicatas de um texto
+
+    Args:
+        threshold: Similaridade (Jaccard estimado) mínima para considerar duas assinaturas iguais
+    """
+
+    def __init__(self, threshold):
+        self.threshold = threshold
+        self.signatures = {}
+        self.buckets = {}
+
+    @staticmethod
+    def band_keys(signature):
+        return [(band, signature[band * LSH_ROWS:(band + 1) * LSH_ROWS].tobytes()) for band in range(LSH_BANDS)]
+
+    def add(self, key, signature):
+        self.remove(key)
+        self.signatures[key] = signature
+        for band_key in self.band_keys(signature):
+            self.buckets.setdefault(band_key, []).append(key)
+
+    def remove(self, key):
+        signature = self.signatures.pop(key, None)
+        if signature is not None:
+            for band_key in self.band_keys(signature):
+                self.buckets[band_key].remove(key)
+
+    def matches(self, signature, exclude=None):
+        """Chaves com similaridade >= threshold, em ordem decrescente de similaridade
+
+        Returns:
+            Lista de (chave, similaridade)
+        """
+        candidates = {key for band_key in self.band_keys(signature) for key in self.buckets.get(band_key, ())}
+        candidates.discard(exclude)
+        if not candidates:
+            return []
+        candidates = list(candidates)
+        scores = (np.stack([self.signatures[key] for key in candidates]) == signature).mean(axis=1)
+        order = np.argsort(-scores, kind="stable")
+        return [(candidates[i], float(scores[i])) for i in order if scores[i] >= self.threshold]
+
+
+def load_state(state_file=DUPLICATES_FILE):
+    if not os.path.exists(state_file):
+        return {"documents": {}, "duplicates": {}}
+    with open(state_file, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def copies_of(doc_name, state_file=DUPLICATES_FILE):
+    """Cópias quase idênticas de um documento indexado, com a similaridade estimada"""
+    duplicates = load_state(state_file)["duplicates"]
+    return sorted(((name, info["similarity"]) for name, info in duplicates.items()
+                   if info["canonical"] == doc_name), key=lambda item: -item[1])
+
+
+class DocumentDeduplicator:
+    """Verificação de quase duplicatas no nível do documento
+
+    As assinaturas ficam em cache pelo hash do conteúdo, então só documentos novos ou
+    alterados são processados. Cada cópia aponta para um original do qual é diretamente
+    similar; os originais são, de preferência, documentos que já estavam indexados (em
+    ordem alfabética), para que os embeddings salvos continuem valendo.
+    """
+
+    def __init__(self, folder=PROCESSED_DOCS_FOLDER, threshold=DOC_THRESHOLD, state_file=DUPLICATES_FILE,
+                 signatures_file=SIGNATURES_FILE):
+        self.folder = folder
+        self.threshold = threshold
+        self.state_file = state_file
+        self.signatures_file = signatures_file
+        self.previous = load_state(state_file)
+        self.cache = self.load_signatures()
+        self.computed = 0
+        self.indexed = None
+
+    def load_signatures(self):
+        if not os.path.exists(self.signatures_file):
+            return {}
+        data = np.load(self.signatures_file)
+        if data["signatures"].shape[1:] != (NUM_PERMUTATIONS,) or int(data["seed"]) != MINHASH_SEED:
+            return {}
+        return dict(zip(data["hashes"].tolist(), data["signatures"]))
+
+    def save_signatures(self, hashes):
+        """Salva só as assinaturas dos documentos atuais (o cache não cresce com versões antigas)"""
+        hashes = sorted(digest for digest in set(hashes) if self.cache.get(digest) is not None)
+        signatures = np.stack([self.cache[digest] for digest in hashes]) if hashes else \
+            np.zeros((0, NUM_PERMUTATIONS), dtype=np.uint32)
+        tmp_file = f"{self.signatures_file[:-4]}.{os.getpid()}.tmp.npz"
+        np.savez(tmp_file, hashes=np.array(hashes, dtype=str), signatures=signatures, seed=MINHASH_SEED)
+        os.replace(tmp_file, self.signatures_file)
+
+    def read(self, filename):
+        """Retorna (hash do conteúdo, assinatura) do documento, calculando a assinatura se preciso"""
+        with open(os.path.join(self.folder, filename), "r", encoding="utf-8") as f:
+            content = f.read()
+        digest = hashlib.sha256(content.encode("utf-8")).hexdigest()
+        if digest not in self.cache:
+            self.cache[digest] = minhash(content)
+            self.computed += 1
+        return digest, self.cache[digest]
+
+    def was_indexed(self, name):
+        return name in self.previous["documents"] and name not in self.previous["duplicates"]
+
+    def check(self, filename):
+        """Verifica um documento recém-limpo contra os documentos já indexados
+
+        Usado pelo pipeline para não repassar cópias à codificação enquanto os outros
+        documentos ainda chegam.
+
+        Returns:
+            Nome do documento indexado do qual `filename` é cópia, ou None
+        """
+        if self.indexed is None:
+            self.indexed = DuplicateIndex(self.threshold)
+            for name, digest in self.previous["documents"].items():
+                signature = self.cache.get(digest)
+                if (self.was_indexed(name) and signature is not None
+                        and os.path.exists(os.path.join(self.folder, name))):
+                    self.indexed.add(name, signature)
+
+        _, signature = self.read(filename)
+        if signature is None:
+            return None
+        matches = self.indexed.matches(signature, exclude=filename)
+        return matches[0][0] if matches else None
+
+    def run(self):
+        """Agrupa os documentos da pasta em grupos de quase duplicatas e salva o resultado
+
+        Returns:
+            dict nome da cópia -> nome do documento original
+        """
+        start = time.perf_counter()
+        names = sorted(os.listdir(self.folder)) if os.path.exists(self.folder) else []
+        documents = {}
+        signatures = {}
+        for name in names:
+            documents[name], signatures[name] = self.read(name)
+
+        if (documents == self.previous["documents"] and self.previous.get("threshold") == self.threshold
+                and self.previous.get("permutations") == NUM_PERMUTATIONS):
+            return {name: info["canonical"] for name, info in self.previous["duplicates"].items()}
+
+        # Cada documento é comparado só com os originais já escolhidos: uma cópia é sempre
+        # similar (acima do limiar) ao próprio original, sem agrupar A ≈ B ≈ C por transitividade.
+        # Os já indexados são vistos primeiro, para continuarem como originais.
+        index = DuplicateIndex(self.threshold)
+        duplicates = {}
+        for name in sorted(names, key=lambda name: (not self.was_indexed(name), name)):
+            signature = signatures[name]
+            if signature is None:
+                continue
+            matches = index.matches(signature)
+            if matches:
+                canonical, score = matches[0]
+                duplicates[name] = {"canonical": canonical, "similarity": round(score, 4)}
+            else:
+                index.add(name, signature)
+
+        state = {"threshold": self.threshold, "permutations": NUM_PERMUTATIONS, "documents": documents,
+                 "duplicates": duplicates}
+        os.makedirs(os.path.dirname(self.state_file) or ".", exist_ok=True)
+        tmp_file = f"{self.state_file}.{os.getpid()}.tmp"
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            json.dump(state, f, indent=4, ensure_ascii=False)
+        os.replace(tmp_file, self.state_file)
+        self.save_signatures(documents.values())
+        self.previous = state
+
+        elapsed = time.perf_counter() - start
+        metrics.observe("dedup_seconds", elapsed, level="document")
+        metrics.inc("dedup_duplicates_total", len(duplicates), level="document")
+        print(f"🪞 {len(duplicates)} de {len(names)} documentos são cópias quase idênticas "
+              f"(Jaccard ≥ {self.threshold}) — {len(names) - len(duplicates)} documentos únicos, "
+              f"{self.computed} assinaturas calculadas em {elapsed:.1f}s")
+        return {name: info["canonical"] for name, info in duplicates.items()}
+
+
+def find_duplicates(folder=PROCESSED_DOCS_FOLDER, threshold=DOC_THRESHOLD, state_file=DUPLICATES_FILE):
+    """Atualiza e retorna as quase duplicatas da pasta (cópia -> original)
+
+    Chamado por cada índice (embeddings, trechos, BM25) antes de montá-lo, para que
+    todos deixem as mesmas cópias de fora. Sem documentos alterados, só lê os hashes.
+    """
+    with _lock:
+        return DocumentDeduplicator(folder, threshold, state_file).run()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Procura documentos e trechos quase duplicados (MinHash + LSH)")
+    parser.add_argument("--threshold", type=float, default=DOC_THRESHOLD, help="Jaccard mínimo entre documentos")
+    parser.add_argument("--chunk-threshold", type=float, default=CHUNK_THRESHOLD,
+                        help="Jaccard mínimo entre trechos do índice de trechos")
+    args = parser.parse_args()
+
+    duplicates = find_duplicates(threshold=args.threshold)
+    print(f"📄 {len(duplicates)} cópias ligadas ao documento original (detalhes em {DUPLICATES_FILE})")
+    for name, canonical in sorted(duplicates.items()):
+        print(f"   {name} → {canonical}")
+
+    # Trechos: mesma regra do índice de trechos (o primeiro trecho, na ordem dos documentos, fica)
+    from src.processing.generate_embeddings import load_passage_chunks
+
+    chunks = load_passage_chunks()
+    if chunks is None:
+        print("ℹ️ Índice de trechos ainda sem tabela de trechos: rode generate_embeddings.py --passages.")
+    else:
+        start = time.perf_counter()
+        index = DuplicateIndex(args.chunk_threshold)
+        dropped = 0
+        for row, signature in enumerate(chunks["signatures"]):
+            if index.matches(signature):
+                dropped += 1
+            else:
+                index.add(row, signature)
+        total = len(chunks["signatures"])
+        print(f"🪞 {dropped} de {total} trechos são quase idênticos a um trecho anterior "
+              f"(Jaccard ≥ {args.chunk_threshold}, {dropped / max(total, 1):.1%}) — verificação em "
+              f"{time.perf_counter() - start:.1f}s")
@@ -1,40 +1,495 @@
-from sentence_transformers import SentenceTransformer
 import os
+import sys
+import json
+import time
 import pickle
+import hashlib
+import argparse
+import threading
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from src.processing.chunking import chunk_text, CHUNK_TOKENS, CHUNK_OVERLAP
+from src.models.model_registry import get_model, MODEL_NAME
+from src.search.embedding_store import save_store, open_store, open_store_arrays, store_exists, normalize
+from src.search.ann_index import build_index, save_index, saved_index_meta, remove_index, EXACT_THRESHOLD
+from src.search.quantization import QUANTIZED_KINDS
+from src.processing.clustering import update_cluster_model
+from src.processing.dedup import find_duplicates, minhash, DuplicateIndex, CHUNK_THRESHOLD, NUM_PERMUTATIONS
+from src.monitoring import metrics
 
 
 # Caminhos
 PROCESSED_DOCS_FOLDER = "data/processed/"
-EMBEDDINGS_FILE = "embeddings/document_embeddings.pkl"
+# Armazenamento binário (ver src/search/embedding_store.py): <prefixo>.json + matriz versionada
+EMBEDDINGS_STORE = "embeddings/document_embeddings"
+EMBEDDINGS_DTYPE = "float32"
+# Índice de trechos: vetores normalizados em float16 e offsets (início, fim) de cada trecho
+PASSAGE_STORE = "embeddings/passage_embeddings"
+# Offsets fora do armazenamento (formato antigo, lido até a próxima atualização do índice)
+PASSAGE_OFFSETS_FILE = "embeddings/passage_offsets.npy"
+PASSAGE_DTYPE = "float16"
+# Todos os trechos de cada documento (inclusive os descartados como quase duplicados), com a
+# assinatura MinHash: permite reavaliar os descartes sem recodificar nem redividir os documentos
+PASSAGE_CHUNKS_FILE = "embeddings/passage_chunks.npz"
+# Formato antigo (dict pickle nome -> embedding + hashes em JSON), migrado automaticamente
+LEGACY_EMBEDDINGS_FILE = "embeddings/document_embeddings.pkl"
+LEGACY_HASHES_FILE = "embeddings/document_hashes.json"
+
+# Parâmetros padrão da codificação em lote
+BATCH_SIZE = 32
+COPY_BLOCK_ROWS = 65536  # Trechos reaproveitados copiados por vez para a matriz nova
+PRECISIONS = ["float32", "float16", "bfloat16"]
+
+# encode_documents muda o dtype/dispositivo do modelo compartilhado durante a codificação:
+# etapas do pipeline em threads diferentes (embeddings e trechos) codificam uma de cada vez
+ENCODE_LOCK = threading.Lock()
+
+
+def content_hash(text):
+    """Calcula o hash SHA-256 do conteúdo de um documento"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def load_legacy_store():
+    """Lê o formato antigo (pickle + hashes em JSON) para migrá-lo ao armazenamento binário"""
+    if not os.path.exists(LEGACY_EMBEDDINGS_FILE):
+        return {}, {}
+
+    with open(LEGACY_EMBEDDINGS_FILE, "rb") as f:
+        embeddings = pickle.load(f)
+
+    hashes = {}
+    if os.path.exists(LEGACY_HASHES_FILE):
+        with open(LEGACY_HASHES_FILE, "r", encoding="utf-8") as f:
+            index = json.load(f)
+        if index.get("model") == MODEL_NAME:
+            hashes = index.get("documents", {})
+
+    return embeddings, hashes
+
+
+def load_embedding_store():
+    """Carrega os embeddings salvos e os hashes de conteúdo que os originaram
+
+    Returns:
+        (embeddings, hashes): dicts nome do documento -> embedding / hash. Ficam vazios
+        se não existirem ou se tiverem sido gerados com outro modelo.
+    """
+    if not store_exists(EMBEDDINGS_STORE):
+        return load_legacy_store()
+
+    matrix, meta = open_store(EMBEDDINGS_STORE)
+    if meta.get("model") != MODEL_NAME:
+        return {}, {}
+
+    names = meta["ids"]
+    hashes = {name: digest for name, digest in zip(names, meta.get("hashes") or []) if digest}
+    return dict(zip(names, matrix)), hashes
+
+
+def save_embedding_store(embeddings, hashes):
+    """Salva os embeddings normalizados com o modelo e o hash de cada documento"""
+    names = list(embeddings)
+    version = save_store(EMBEDDINGS_STORE, np.stack([embeddings[name] for name in names]), ids=names,
+                         dtype=EMBEDDINGS_DTYPE, model=MODEL_NAME, hashes=[hashes.get(name) for name in names])
+    rebuild_quantized_index(EMBEDDINGS_STORE, version)
+
+
+def rebuild_quantized_index(prefix, version):
+    """Refaz o índice quantizado (int8/pq) do armazenamento, se ele tiver um
+
+    A quantização e seus parâmetros (rerank, subespaços) são escolhidos uma vez
+    (python src/search/ann_index.py --kind int8|pq) e mantidos nas atualizações seguintes.
 
-MODEL_NAME = "sentence-transformers/all-mpnet-base-v2"
-model = SentenceTransformer(MODEL_NAME)
+    Returns:
+        True se o índice foi refeito
+    """
+    meta = saved_index_meta(prefix)
+    if meta is None or meta["kind"] not in QUANTIZED_KINDS:
+        return False
+    kind = meta["kind"]
+    matrix, _ = open_store(prefix)
+    save_index(build_index(matrix, kind, **meta.get("params", {})), prefix, version)
+    print(f"🗜 Índice {kind} de {prefix} atualizado")
+    return True
 
 
-def generate_embeddings():
-    """Gera embeddings para os documentos processados e salva no arquivo"""
-    doc_embeddings = {}
+def count_tokens(texts):
+    """Conta os tokens que o modelo realmente processa em cada texto (já truncado)"""
+    model = get_model()
+    encoded = model.tokenizer(list(texts), truncation=True, max_length=model.max_seq_length)
+    return np.array([len(ids) for ids in encoded["input_ids"]])
 
+
+def encode_documents(texts, batch_size=BATCH_SIZE, num_threads=None, precision="float32",
+                     device=None, num_workers=1):
+    """Codifica os textos em lotes, agrupando documentos de tamanho parecido
+
+    Os textos são ordenados pelo número de tokens antes de formar os lotes, o que
+    minimiza o padding dentro de cada lote; o resultado volta na ordem original.
+
+    Args:
+        texts: Lista de textos a codificar
+        batch_size: Número de documentos por lote
+        num_threads: Threads do PyTorch na CPU (None mantém o padrão do PyTorch)
+        precision: "float32", "float16" ou "bfloat16" (pesos do modelo durante a codificação)
+        device: Dispositivo do modelo ("cpu", "cuda", ...). None mantém o atual
+        num_workers: Se > 1, codifica em um pool de processos em `device` (CPU por padrão),
+            sempre em float32
+
+    Returns:
+        Matriz numpy (len(texts), dimensão) com os embeddings
+    """
+    if not texts:
+        return np.zeros((0, 0), dtype=np.float32)
+
+    import torch
+
+    model = get_model()
+    # Uma codificação por vez: o dtype e o dispositivo do modelo compartilhado mudam abaixo
+    with ENCODE_LOCK:
+        start = time.perf_counter()
+        token_counts = count_tokens(texts)
+        order = np.argsort(-token_counts, kind="stable")
+        sorted_texts = [texts[i] for i in order]
+
+        if num_threads:
+            torch.set_num_threads(num_threads)
+
+        if num_workers > 1:
+            # Cada processo carrega sua própria cópia do modelo (em float32) e recebe fatias dos lotes
+            if precision != "float32":
+                print(f"⚠ A precisão {precision} não se aplica ao pool de processos; codificando em float32.")
+                precision = "float32"
+            device = device or "cpu"
+            pool = model.start_multi_process_pool(target_devices=[device] * num_workers)
+            try:
+                sorted_embeddings = model.encode_multi_process(sorted_texts, pool, batch_size=batch_size)
+            finally:
+                model.stop_multi_process_pool(pool)
+        else:
+            if device:
+                model.to(device)
+            device = str(model.device)
+            original_dtype = next(model.parameters()).dtype
+            model.to(getattr(torch, precision))
+            try:
+                sorted_embeddings = model.encode(sorted_texts, batch_size=batch_size, convert_to_numpy=True)
+            finally:
+                model.to(original_dtype)
+
+    embeddings = np.empty_like(sorted_embeddings, dtype=np.float32)
+    embeddings[order] = sorted_embeddings
+
+    # precision e device aqui são os efetivamente usados, não os pedidos
+    elapsed = max(time.perf_counter() - start, 1e-9)
+    metrics.observe("encode_seconds", elapsed, precision=precision)
+    metrics.inc("encoded_documents_total", len(texts))
+    metrics.inc("encoded_tokens_total", int(token_counts.sum()))
+    print(f"⚡ {len(texts)} documentos codificados em {elapsed:.1f}s → {len(texts) / elapsed:.1f} docs/s, "
+          f"{token_counts.sum() / elapsed:.0f} tokens/s (lote {batch_size}, {precision}, {device}, "
+          f"{num_workers} processo(s))")
+
+    return embeddings
+
+
+def generate_embeddings(batch_size=BATCH_SIZE, num_threads=None, precision="float32",
+                        device=None, num_workers=1, precomputed=None):
+    """Gera embeddings apenas para documentos novos ou alterados e salva no arquivo
+
+    Cada embedding é identificado pelo hash do conteúdo + nome do modelo: documentos
+    com o mesmo conteúdo reaproveitam o vetor salvo e documentos removidos da pasta
+    são descartados do armazenamento. Cópias quase idênticas de outro documento (ver
+    src/processing/dedup.py) ficam de fora: só o original é codificado e indexado.
+    Os parâmetros são repassados a encode_documents.
+
+    Args:
+        precomputed: dict hash do conteúdo -> embedding já codificado (ex.: pelo pipeline,
+            enquanto outros documentos ainda eram baixados); não é codificado de novo
+    """
     if not os.path.exists(PROCESSED_DOCS_FOLDER):
         print("❌ A pasta de documentos processados não foi encontrada.")
         return
-    
-    for filename in os.listdir(PROCESSED_DOCS_FOLDER):
+
+    start = time.perf_counter()
+    stored_embeddings, stored_hashes = load_embedding_store()
+    cache = {stored_hashes[name]: emb for name, emb in stored_embeddings.items() if name in stored_hashes}
+    known = set(cache)
+    cache.update(precomputed or {})
+    duplicates = find_duplicates(PROCESSED_DOCS_FOLDER)
+
+    doc_hashes = {}
+    pending = {}
+
+    for filename in sorted(os.listdir(PROCESSED_DOCS_FOLDER)):
+        if filename in duplicates:
+            continue
         file_path = os.path.join(PROCESSED_DOCS_FOLDER, filename)
         with open(file_path, "r", encoding="utf-8") as f:
             content = f.read()
 
-        # Criar embedding do conteúdo
-        embedding = model.encode(content, convert_to_numpy=True)
-        doc_embeddings[filename] = embedding
+        digest = content_hash(content)
+        doc_hashes[filename] = digest
+
+        if digest not in cache:
+            pending[digest] = content
+
+    # Criar embeddings do conteúdo novo/alterado em lotes
+    new_embeddings = encode_documents(list(pending.values()), batch_size=batch_size, num_threads=num_threads,
+                                      precision=precision, device=device, num_workers=num_workers)
+    cache.update(zip(pending.keys(), new_embeddings))
+    # Gerados nesta execução: os codificados acima e os pré-calculados que algum documento atual usa
+    used = set(doc_hashes.values())
+    encoded = len(pending) + len((used & set(precomputed or {})) - known)
+    # Novos vetores ajustam o modelo de clusters salvo (se existir), sem reajustá-lo do zero
+    fresh = [cache[digest] for digest in used - known]
+    if fresh:
+        update_cluster_model(np.stack(fresh))
+
+    doc_embeddings = {filename: cache[digest] for filename, digest in doc_hashes.items()}
+
+    evicted = len(set(stored_embeddings) - set(doc_embeddings))
+
+    if encoded == 0 and evicted == 0 and doc_hashes == stored_hashes and store_exists(EMBEDDINGS_STORE):
+        print(f"✅ {len(doc_embeddings)} embeddings já atualizados em {EMBEDDINGS_STORE}")
+        return
 
     # Salvar embeddings
-    os.makedirs("embeddings", exist_ok=True)
-    with open(EMBEDDINGS_FILE, "wb") as f:
-        pickle.dump(doc_embeddings, f)
+    save_embedding_store(doc_embeddings, doc_hashes)
+
+    print(f"✅ {len(doc_embeddings)} embeddings salvos em {EMBEDDINGS_STORE} "
+          f"({encoded} gerados, {len(doc_embeddings) - encoded} reaproveitados, {evicted} removidos, "
+          f"{len(duplicates)} cópias ligadas ao original) em {time.perf_counter() - start:.1f}s")
+
+
+def load_passage_store(chunk_tokens=CHUNK_TOKENS, overlap=CHUNK_OVERLAP):
+    """Carrega o índice de trechos salvo, se compatível com o modelo e o chunking atuais
+
+    Returns:
+        (documentos, embeddings, offsets): lista de {"name", "sha256", "start", "count", ...},
+        matriz mapeada (trechos, dimensão) e matriz int32 (trechos, 2). Vazios se incompatível.
+    """
+    if not store_exists(PASSAGE_STORE):
+        return [], None, None
+
+    embeddings, meta, arrays = open_store_arrays(PASSAGE_STORE, ["offsets"], {"offsets": PASSAGE_OFFSETS_FILE})
+    if (meta.get("model"), meta.get("chunk_tokens"), meta.get("overlap")) != (MODEL_NAME, chunk_tokens, overlap):
+        return [], None, None
+    if arrays["offsets"] is None:
+        return [], None, None
+    return meta["documents"], embeddings, np.array(arrays["offsets"])
+
+
+def load_passage_chunks():
+    """Tabela com todos os trechos do índice, se corresponder à versão atual do armazenamento
+
+    Returns:
+        dict com "offsets" (trechos, 2), "signatures" (trechos, permutações), "kept"
+        (trecho indexado ou descartado) e "threshold", ou None se ausente/desatualizada
+    """
+    if not os.path.exists(PASSAGE_CHUNKS_FILE) or not store_exists(PASSAGE_STORE):
+        return None
+    chunks = dict(np.load(PASSAGE_CHUNKS_FILE))
+    if (str(chunks["version"]) != open_store(PASSAGE_STORE)[1]["version"]
+            or chunks["signatures"].shape[1] != NUM_PERMUTATIONS):
+        return None
+    return chunks
+
+
+def chunk_signatures(content, offsets):
+    """Assinaturas MinHash dos trechos (trechos sem palavras ficam com a assinatura máxima)"""
+    signatures = np.full((len(offsets), NUM_PERMUTATIONS), np.iinfo(np.int32).max, dtype=np.uint32)
+    for i, (begin, end) in enumerate(offsets):
+        signature = minhash(content[begin:end])
+        if signature is not None:
+            signatures[i] = signature
+    return signatures
+
+
+def generate_passage_embeddings(chunk_tokens=CHUNK_TOKENS, overlap=CHUNK_OVERLAP, batch_size=BATCH_SIZE,
+                                num_threads=None, precision="float32", device=None, num_workers=1,
+                                chunk_threshold=CHUNK_THRESHOLD):
+    """Divide os documentos em trechos, gera um embedding por trecho e salva o índice
+
+    Só os documentos novos ou alterados (pelo hash do conteúdo) são divididos e
+    codificados novamente. Os vetores são salvos normalizados (L2) em float16, com
+    os offsets de cada trecho no documento, para o scoring por produto escalar.
+
+    Cópias de documentos (ver src/processing/dedup.py) ficam de fora, e um trecho quase
+    idêntico a outro já indexado (Jaccard >= chunk_threshold, ex.: cabeçalho e rodapé
+    repetidos em todas as páginas) é descartado antes da codificação: na ordem dos
+    documentos, só a primeira ocorrência fica. Os descartes são reavaliados a cada
+    atualização, então um trecho volta ao índice se o original sair.
+    """
+    if not os.path.exists(PROCESSED_DOCS_FOLDER):
+        print("❌ A pasta de documentos processados não foi encontrada.")
+        return
+
+    start = time.perf_counter()
+    stored_docs, stored_embeddings, stored_offsets = load_passage_store(chunk_tokens, overlap)
+    stored_by_name = {doc["name"]: doc for doc in stored_docs}
+    stored_chunks = load_passage_chunks() if stored_offsets is not None else None
+    duplicates = find_duplicates(PROCESSED_DOCS_FOLDER)
+
+    documents = []
+    changed = 0
+
+    for filename in sorted(os.listdir(PROCESSED_DOCS_FOLDER)):
+        if filename in duplicates:
+            continue
+        file_path = os.path.join(PROCESSED_DOCS_FOLDER, filename)
+        with open(file_path, "r", encoding="utf-8") as f:
+            content = f.read()
+
+        digest = content_hash(content)
+        stored = stored_by_name.get(filename)
+        doc = {"name": filename, "sha256": digest, "content": content}
+
+        if stored and stored["sha256"] == digest and stored_chunks is not None and "chunk_start" in stored:
+            # Inalterado: todos os trechos (indexados ou não) vêm da tabela, sem redividir o documento
+            chunk_rows = slice(stored["chunk_start"], stored["chunk_start"] + stored["chunk_count"])
+            kept = stored_chunks["kept"][chunk_rows]
+            doc["offsets"] = stored_chunks["offsets"][chunk_rows]
+            doc["signatures"] = stored_chunks["signatures"][chunk_rows]
+            doc["rows"] = np.full(len(kept), -1, dtype=np.int64)
+            doc["rows"][kept] = np.arange(stored["start"], stored["start"] + stored["count"])
+        elif stored and stored["sha256"] == digest:
+            # Índice salvo sem a tabela de trechos: assinaturas calculadas dos trechos já indexados
+            rows = np.arange(stored["start"], stored["start"] + stored["count"])
+            doc["offsets"] = stored_offsets[rows]
+            doc["signatures"] = chunk_signatures(content, doc["offsets"])
+            doc["rows"] = rows
+        else:
+            chunks = chunk_text(content, get_model().tokenizer, chunk_tokens, overlap)
+            doc["offsets"] = np.array(chunks, dtype=np.int32).reshape(-1, 2)
+            doc["signatures"] = chunk_signatures(content, doc["offsets"])
+            doc["rows"] = np.full(len(chunks), -1, dtype=np.int64)
+            changed += 1
+        documents.append(doc)
+
+    evicted = len(set(stored_by_name) - {doc["name"] for doc in documents})
+    if (changed == 0 and evicted == 0 and stored_chunks is not None and stored_offsets is not None
+            and float(stored_chunks["threshold"]) == chunk_threshold):
+        print(f"✅ {len(stored_offsets)} trechos já atualizados em {PASSAGE_STORE}")
+        return
+
+    # Quase duplicatas: cada trecho é comparado com os trechos mantidos antes dele
+    dedup_start = time.perf_counter()
+    index = DuplicateIndex(chunk_threshold)
+    key = 0
+    for doc in documents:
+        doc["kept"] = np.zeros(len(doc["offsets"]), dtype=bool)
+        for i, signature in enumerate(doc["signatures"]):
+            if not index.matches(signature):
+                index.add(key, signature)
+                doc["kept"][i] = True
+                key += 1
+    n_chunks = sum(len(doc["kept"]) for doc in documents)
+    dropped = n_chunks - key
+    dedup_seconds = time.perf_counter() - dedup_start
+    metrics.observe("dedup_seconds", dedup_seconds, level="chunk")
+    metrics.inc("dedup_duplicates_total", dropped, level="chunk")
+
+    # Trechos mantidos sem embedding salvo (documentos alterados ou descartes que voltaram ao índice)
+    pending_texts = []
+    for doc in documents:
+        doc["pending"] = len(pending_texts)
+        for begin, end in doc["offsets"][doc["kept"] & (doc["rows"] < 0)]:
+            pending_texts.append(doc["content"][begin:end])
+
+    new_embeddings = encode_documents(pending_texts, batch_size=batch_size, num_threads=num_threads,
+                                      precision=precision, device=device, num_workers=num_workers)
+    # Os trechos novos ajustam o modelo de clusters dos trechos (se existir), normalizados como no armazenamento
+    if len(new_embeddings):
+        update_cluster_model(normalize(new_embeddings), PASSAGE_STORE)
+
+    # Montar o índice final na ordem dos documentos, reaproveitando as linhas inalteradas
+    index_docs, reused_rows, reused_positions, new_positions = [], [], [], []
+    row = chunk_row = 0
+    for doc in documents:
+        rows = doc["rows"][doc["kept"]]
+        positions = row + np.arange(len(rows))
+        reused_rows.append(rows[rows >= 0])
+        reused_positions.append(positions[rows >= 0])
+        new_positions.append(positions[rows < 0])
+        index_docs.append({"name": doc["name"], "sha256": doc["sha256"], "start": row, "count": len(rows),
+                           "chunk_start": chunk_row, "chunk_count": len(doc["kept"])})
+        row += len(rows)
+        chunk_row += len(doc["kept"])
 
-    print(f"✅ {len(doc_embeddings)} embeddings gerados e salvos em {EMBEDDINGS_FILE}")
+    if len(new_embeddings):
+        dimension = new_embeddings.shape[1]
+    elif stored_embeddings is not None:
+        dimension = stored_embeddings.shape[1]
+    else:
+        dimension = get_model().get_sentence_embedding_dimension()
+    # A matriz final é montada em um arquivo temporário mapeado (não na memória) e copiada em blocos
+    tmp_embeddings = f"{PASSAGE_STORE}.{os.getpid()}.building.npy"
+    passage_embeddings = np.lib.format.open_memmap(tmp_embeddings, mode="w+", dtype=np.float32,
+                                                   shape=(row, dimension))
+    reused_rows = np.concatenate(reused_rows) if reused_rows else np.zeros(0, np.int64)
+    reused_positions = np.concatenate(reused_positions) if reused_positions else np.zeros(0, np.int64)
+    for begin in range(0, len(reused_rows), COPY_BLOCK_ROWS):
+        block = slice(begin, begin + COPY_BLOCK_ROWS)
+        passage_embeddings[reused_positions[block]] = stored_embeddings[reused_rows[block]]
+    if len(pending_texts):
+        passage_embeddings[np.concatenate(new_positions)] = new_embeddings
+
+    if documents:
+        all_offsets = np.concatenate([doc["offsets"] for doc in documents]).astype(np.int32)
+        signatures = np.concatenate([doc["signatures"] for doc in documents])
+        kept = np.concatenate([doc["kept"] for doc in documents])
+    else:
+        all_offsets = np.zeros((0, 2), np.int32)
+        signatures = np.zeros((0, NUM_PERMUTATIONS), np.uint32)
+        kept = np.zeros(0, bool)
+    passage_offsets = all_offsets[kept]
+
+    # Os offsets são salvos na mesma versão da matriz: um leitor nunca vê offsets de outra versão
+    try:
+        version = save_store(PASSAGE_STORE, passage_embeddings, dtype=PASSAGE_DTYPE,
+                             arrays={"offsets": passage_offsets}, model=MODEL_NAME, chunk_tokens=chunk_tokens,
+                             overlap=overlap, documents=index_docs)
+    finally:
+        del passage_embeddings
+        os.remove(tmp_embeddings)
+    if os.path.exists(PASSAGE_OFFSETS_FILE):
+        os.remove(PASSAGE_OFFSETS_FILE)
+    tmp_chunks = f"{PASSAGE_CHUNKS_FILE[:-4]}.tmp.npz"
+    np.savez(tmp_chunks, offsets=all_offsets, signatures=signatures, kept=kept, version=version,
+             threshold=chunk_threshold)
+    os.replace(tmp_chunks, PASSAGE_CHUNKS_FILE)
+
+    # Corpora grandes ganham um índice aproximado; os pequenos seguem na busca exata
+    if not rebuild_quantized_index(PASSAGE_STORE, version):
+        if len(passage_offsets) >= EXACT_THRESHOLD:
+            matrix, _ = open_store(PASSAGE_STORE)
+            save_index(build_index(matrix), PASSAGE_STORE, version)
+        else:
+            remove_index(PASSAGE_STORE)  # Índice de quando o corpus era maior ficaria desatualizado
+
+    dropped_chars = int(np.diff(all_offsets[~kept], axis=1).sum()) if dropped else 0
+    print(f"🪞 {dropped} de {n_chunks} trechos quase idênticos a outro descartados ({dropped / max(n_chunks, 1):.1%}, "
+          f"{dropped_chars / 1e6:.1f} MB de texto que não é codificado) em {dedup_seconds:.1f}s")
+    print(f"✅ {len(passage_offsets)} trechos de {len(index_docs)} documentos salvos em {PASSAGE_STORE} "
+          f"({len(pending_texts)} trechos gerados de {changed} documentos alterados, {evicted} removidos) "
+          f"em {time.perf_counter() - start:.1f}s")
 
 
 if __name__ == "__main__":
-    generate_embeddings()
+    parser = argparse.ArgumentParser(description="Gera os embeddings dos documentos processados")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="Documentos por lote")
+    parser.add_argument("--threads", type=int, default=None, help="Threads do PyTorch na CPU")
+    parser.add_argument("--precision", choices=PRECISIONS, default="float32", help="Precisão do modelo")
+    parser.add_argument("--device", default=None, help="Dispositivo do modelo (cpu, cuda, mps...)")
+    parser.add_argument("--workers", type=int, default=1, help="Processos de codificação na CPU")
+    parser.add_argument("--passages", action="store_true", help="Gera também o índice de trechos")
+    args = parser.parse_args()
+
+    options = dict(batch_size=args.batch_size, num_threads=args.threads, precision=args.precision,
+                   device=args.device, num_workers=args.workers)
+    generate_embeddings(**options)
+    if args.passages:
+        generate_passage_embeddings(**options)
@@ -1,9 +1,31 @@
 import os
 import re
+import sys
+import json
+import time
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from src.monitoring import metrics
 
 # Caminhos dos arquivos
 RAW_DOCS_FOLDER = "data/raw/docs/"
 PROCESSED_DOCS_FOLDER = "data/processed/"
+CLEAN_MANIFEST_FILE = "data/clean_manifest.json"
+
+# Mudar quando as regras de limpeza mudarem, para reprocessar todos os documentos
+CLEANER_VERSION = 1
+
+MAX_WORKERS = os.cpu_count() or 1
+PARALLEL_MIN_FILES = 16   # Abaixo disto, iniciar o pool de processos custa mais que limpar em série
+SLOWEST_FILES = 5
+
+# Padrões compilados uma única vez (e não a cada documento)
+WHITESPACE_RE = re.compile(r"\s+")
+GITHUB_MENU_RE = re.compile(r"Navigation Menu.*?Explore All features", flags=re.DOTALL)
 
 # caso não exista
 os.makedirs(PROCESSED_DOCS_FOLDER, exist_ok=True)
@@ -11,40 +33,190 @@ os.makedirs(PROCESSED_DOCS_FOLDER, exist_ok=True)
 
 def clean_text(text):
     """Remove espaços desnecessários e normaliza o texto"""
-    text = re.sub(r"\s+", " ", text)
-    text = re.sub(r"[^\x00-\x7F]+", "", text)
-    text = re.sub(r"Navigation Menu.*?Explore All features", "", text, flags=re.DOTALL)
+    text = WHITESPACE_RE.sub(" ", text)
+    # Equivale a remover [^\x00-\x7F]+, sem passar pelo motor de regex
+    text = text.encode("ascii", "ignore").decode("ascii")
+    # A varredura do menu do GitHub só é necessária se o marcador aparecer no texto
+    if "Navigation Menu" in text:
+        text = GITHUB_MENU_RE.sub("", text)
     text = text.strip()
     return text
 
 
-def process_documents():
-    """Processa todos os documentos baixados e aplica limpeza"""
-    files = os.listdir(RAW_DOCS_FOLDER)
+def load_clean_manifest(manifest_file=CLEAN_MANIFEST_FILE):
+    """Carrega o manifesto da limpeza (mtime, tamanho e hash de cada documento bruto)"""
+    if not os.path.exists(manifest_file):
+        return {}
+
+    with open(manifest_file, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+
+    # Manifesto de outra versão do limpador: tudo precisa ser reprocessado
+    if manifest.get("version") != CLEANER_VERSION:
+        return {}
+    return manifest.get("files", {})
+
+
+def save_clean_manifest(files, manifest_file=CLEAN_MANIFEST_FILE):
+    """Salva o manifesto da limpeza de forma atômica"""
+    os.makedirs(os.path.dirname(manifest_file) or ".", exist_ok=True)
+    tmp_file = f"{manifest_file}.tmp"
+    with open(tmp_file, "w", encoding="utf-8") as f:
+        json.dump({"version": CLEANER_VERSION, "files": files}, f, indent=4, sort_keys=True)
+    os.replace(tmp_file, manifest_file)
+
+
+def source_state(input_path):
+    """Retorna (mtime em ns, tamanho) do documento bruto"""
+    stat = os.stat(input_path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def clean_file(input_path, output_path):
+    """Limpa um documento e salva o resultado
+
+    Returns:
+        (hash SHA-256 do documento bruto, tempo de limpeza em segundos)
+    """
+    start = time.perf_counter()
+    with open(input_path, "rb") as f:
+        raw = f.read()
+
+    cleaned_text = clean_text(raw.decode("utf-8"))
+
+    with open(output_path, "w", encoding="utf-8") as f:
+        f.write(cleaned_text)
+
+    return hashlib.sha256(raw).hexdigest(), time.perf_counter() - start
+
+
+def is_unchanged(input_path, output_path, entry):
+    """Verifica se o documento bruto não mudou desde a última limpeza
+
+    Compara mtime e tamanho; se só o mtime mudou (ex.: arquivo reescrito com o
+    mesmo conteúdo), confirma pelo hash antes de reprocessar.
+    """
+    if not entry or not os.path.exists(output_path):
+        return False
+
+    mtime_ns, size = source_state(input_path)
+    if entry["mtime_ns"] == mtime_ns and entry["size"] == size:
+        return True
+    if entry["size"] != size:
+        return False
+
+    with open(input_path, "rb") as f:
+        if hashlib.sha256(f.read()).hexdigest() != entry["sha256"]:
+            return False
+
+    entry["mtime_ns"] = mtime_ns
+    return True
+
+
+def process_documents(raw_folder=RAW_DOCS_FOLDER, output_folder=PROCESSED_DOCS_FOLDER,
+                      max_workers=MAX_WORKERS, manifest_file=CLEAN_MANIFEST_FILE, force=False,
+                      only=None, on_document=None):
+    """Processa todos os documentos baixados e aplica limpeza
+
+    Só documentos novos ou alterados desde a última execução são limpos novamente.
+
+    Args:
+        raw_folder: Pasta com os documentos baixados
+        output_folder: Pasta onde os textos limpos serão salvos
+        max_workers: Número de processos de limpeza (1 = limpeza sequencial)
+        manifest_file: Manifesto com mtime, tamanho e hash de cada documento bruto
+        force: Se True, limpa todos os documentos mesmo sem alterações
+        only: Se informado, verifica apenas estes arquivos (os demais mantêm o estado atual)
+        on_document: Função chamada com o nome de cada documento limpo, assim que fica pronto
+
+    Returns:
+        dict com as estatísticas da limpeza (processados, inalterados, erros e tempo)
+    """
+    files = sorted(os.listdir(raw_folder)) if os.path.isdir(raw_folder) else []
     total = len(files)
 
     if total == 0:
-        print(f"Erro: Nenhum documento encontrado em {RAW_DOCS_FOLDER}. Execute download_docs.py primeiro.")
+        print(f"Erro: Nenhum documento encontrado em {raw_folder}. Execute download_docs.py primeiro.")
         return
 
-    print(f"Iniciando processamento de {total} documentos...")
+    os.makedirs(output_folder, exist_ok=True)
+
+    manifest = {} if force else load_clean_manifest(manifest_file)
+    candidates = files if only is None else sorted(set(only) & set(files))
+    pending = [
+        filename for filename in candidates
+        if not is_unchanged(os.path.join(raw_folder, filename), os.path.join(output_folder, filename),
+                            manifest.get(filename))
+    ]
+    stats = {"processed": 0, "unchanged": len(candidates) - len(pending), "errors": 0}
+    start = time.perf_counter()
+
+    if not pending:
+        print(f"✅ {len(candidates)} documentos sem alterações desde a última limpeza.")
+        save_clean_manifest({name: manifest[name] for name in files if name in manifest}, manifest_file)
+        stats["seconds"] = time.perf_counter() - start
+        return stats
+
+    print(f"Iniciando processamento de {len(pending)} documentos "
+          f"({stats['unchanged']} sem alterações, {max_workers} processos)...")
+
+    # O estado do arquivo é lido antes da limpeza: se ele mudar durante o processamento,
+    # a próxima execução ainda o considera alterado
+    states = {filename: source_state(os.path.join(raw_folder, filename)) for filename in pending}
+    timings = {}
 
-    for i, filename in enumerate(files):
-        input_path = os.path.join(RAW_DOCS_FOLDER, filename)
-        output_path = os.path.join(PROCESSED_DOCS_FOLDER, filename)
+    def record(i, filename, result):
+        sha256, seconds = result
+        mtime_ns, size = states[filename]
+        manifest[filename] = {"mtime_ns": mtime_ns, "size": size, "sha256": sha256}
+        timings[filename] = seconds
+        stats["processed"] += 1
+        # Medido no processo que limpou o arquivo e registrado aqui (as métricas dos workers se perderiam)
+        metrics.observe("clean_seconds", seconds)
+        metrics.inc("clean_documents_total", status="processed")
+        print(f"[{i + 1}/{len(pending)}] Processado: {filename} ({seconds * 1000:.1f} ms)")
+        if on_document:
+            on_document(filename)
 
-        try:
-            with open(input_path, "r", encoding="utf-8") as f:
-                text = f.read()
+    def fail(i, filename, error):
+        manifest.pop(filename, None)
+        stats["errors"] += 1
+        metrics.inc("clean_documents_total", status="error")
+        print(f"[{i + 1}/{len(pending)}] Erro ao processar {filename}: {error}")
 
-            cleaned_text = clean_text(text)
+    paths = [(os.path.join(raw_folder, filename), os.path.join(output_folder, filename)) for filename in pending]
 
-            with open(output_path, "w", encoding="utf-8") as f:
-                f.write(cleaned_text)
+    if max_workers <= 1 or len(pending) < PARALLEL_MIN_FILES:
+        for i, (filename, (input_path, output_path)) in enumerate(zip(pending, paths)):
+            try:
+                record(i, filename, clean_file(input_path, output_path))
+            except Exception as e:
+                fail(i, filename, e)
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = [executor.submit(clean_file, input_path, output_path) for input_path, output_path in paths]
+            for i, (filename, future) in enumerate(zip(pending, futures)):
+                try:
+                    record(i, filename, future.result())
+                except Exception as e:
+                    fail(i, filename, e)
+
+    # Documentos brutos removidos saem do manifesto
+    save_clean_manifest({name: manifest[name] for name in files if name in manifest}, manifest_file)
+
+    stats["seconds"] = time.perf_counter() - start
+    print(f"\n📊 {stats['processed']} documentos limpos em {stats['seconds']:.2f}s "
+          f"({stats['unchanged']} sem alterações, {stats['errors']} erros)")
+    for filename, seconds in sorted(timings.items(), key=lambda item: item[1], reverse=True)[:SLOWEST_FILES]:
+        print(f"   {filename:<40} {seconds * 1000:8.1f} ms")
+
+    return stats
 
-            print(f"[{i+1}/{total}] Processado: {filename}")
-        except Exception as e:
-            print(f"[{i+1}/{total}] Erro ao processar {filename}: {e}")
 
 if __name__ == "__main__":
-    process_documents()
+    parser = argparse.ArgumentParser(description="Limpeza dos documentos baixados")
+    parser.add_argument("--workers", type=int, default=MAX_WORKERS, help="Processos de limpeza (1 = sequencial)")
+    parser.add_argument("--force", action="store_true", help="Limpa todos os documentos, mesmo sem alterações")
+    args = parser.parse_args()
+
+    process_documents(max_workers=args.workers, force=args.force)
@@ -1,11 +1,35 @@
 import os
+import sys
 import json
+import time
+import hashlib
+import argparse
+from datetime import datetime, timezone
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlparse
 import requests
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from src.scraping.html_extract import (
+    extract_text, available_extractors, DEFAULT_EXTRACTOR, MAX_PAGE_BYTES, CHUNK_SIZE
+)
+from src.monitoring import metrics
 
 # Caminhos dos arquivos
 LINKS_FILE = "data/raw/awesome_links.json"
 OUTPUT_FOLDER = "data/raw/docs/"
+MANIFEST_FILE = "data/raw/crawl_manifest.json"
+
+# Parâmetros do download concorrente
+MAX_WORKERS = 16          # Limite global de requisições em andamento
+MAX_PER_HOST = 4          # Limite de requisições simultâneas por host
+MAX_RETRIES = 3           # Novas tentativas após a primeira falha
+BACKOFF_FACTOR = 0.5      # Espera base (s) entre tentativas: 0.5, 1, 2, ...
+REQUEST_TIMEOUT = 10
+RETRY_STATUS = {429, 500, 502, 503, 504}
 
 os.makedirs(OUTPUT_FOLDER, exist_ok=True)
 
@@ -15,39 +39,228 @@ def clean_text(text):
     return " ".join(text.split())
 
 
-def download_documentation():
-    """Faz o download do conteúdo dos links extraídos"""
-    if not os.path.exists(LINKS_FILE):
-        print(f"Erro: Arquivo {LINKS_FILE} não encontrado. Execute extract_links.py primeiro.")
+def create_session(pool_size=MAX_WORKERS):
+    """Cria uma sessão HTTP com conexões keep-alive compartilhadas entre as threads"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def load_manifest(manifest_file=MANIFEST_FILE):
+    """Carrega o manifesto do crawl (ETag, Last-Modified, hash e data de cada URL)"""
+    if not os.path.exists(manifest_file):
+        return {}
+
+    with open(manifest_file, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_manifest(manifest, manifest_file=MANIFEST_FILE):
+    """Salva o manifesto do crawl de forma atômica"""
+    os.makedirs(os.path.dirname(manifest_file) or ".", exist_ok=True)
+    tmp_file = f"{manifest_file}.tmp"
+    with open(tmp_file, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=4, ensure_ascii=False, sort_keys=True)
+    os.replace(tmp_file, manifest_file)
+
+
+def file_sha256(file_path):
+    """Calcula o hash SHA-256 do conteúdo de um arquivo de texto"""
+    with open(file_path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def conditional_headers(entry):
+    """Monta os cabeçalhos de GET condicional a partir da entrada do manifesto"""
+    headers = {}
+    if entry.get("etag"):
+        headers["If-None-Match"] = entry["etag"]
+    if entry.get("last_modified"):
+        headers["If-Modified-Since"] = entry["last_modified"]
+    return headers
+
+
+def fetch_url(session, url, retries=MAX_RETRIES, backoff=BACKOFF_FACTOR, timeout=REQUEST_TIMEOUT, headers=None,
+              stream=False):
+    """Faz o GET da URL com novas tentativas e backoff exponencial em falhas temporárias
+
+    Com stream=True o corpo não é lido: quem chama deve consumi-lo e fechar a resposta.
+    """
+    for attempt in range(retries + 1):
+        try:
+            response = session.get(url, timeout=timeout, headers=headers, stream=stream)
+            if response.status_code not in RETRY_STATUS or attempt == retries:
+                if response.status_code >= 400:
+                    response.close()
+                response.raise_for_status()
+                return response
+            response.close()
+        except (requests.ConnectionError, requests.Timeout):
+            if attempt == retries:
+                raise
+        time.sleep(backoff * (2 ** attempt))
+
+
+def download_link(session, link, output_folder, host_limit, entry=None, extractor=DEFAULT_EXTRACTOR,
+                  max_page_bytes=MAX_PAGE_BYTES):
+    """Baixa um único link, extrai o texto e salva no disco se o conteúdo mudou
+
+    O HTML é lido em blocos e passado direto ao extrator, sem montar a árvore
+    da página nem guardar o corpo inteiro da resposta na memória.
+
+    Args:
+        entry: Entrada anterior do manifesto para esta URL (habilita o GET condicional)
+        extractor: Extrator de texto (veja html_extract.EXTRACTORS)
+        max_page_bytes: Limite de bytes lidos por página
+
+    Returns:
+        (título, status, bytes baixados, nova entrada do manifesto, página truncada), onde
+        status é "updated", "unchanged" (200 com o mesmo conteúdo) ou "not_modified" (304)
+    """
+    url = link["url"]
+    title = link["title"].replace(" ", "_").lower()
+    file_path = os.path.join(output_folder, f"{title}.txt")
+
+    # Só faz o GET condicional se o arquivo correspondente ainda existir no disco
+    entry = dict(entry) if entry and os.path.exists(file_path) else {}
+    if not entry and os.path.exists(file_path):
+        # Arquivo baixado antes do manifesto existir: usa o hash do conteúdo atual
+        entry["sha256"] = file_sha256(file_path)
+
+    # O tempo medido não inclui a espera pela vaga do host
+    with host_limit(url), metrics.timer("download_seconds", extractor=extractor):
+        with fetch_url(session, url, headers=conditional_headers(entry), stream=True) as response:
+            entry["file"] = os.path.basename(file_path)
+            entry["fetched_at"] = datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+            if response.status_code == 304:
+                return title, "not_modified", 0, entry, False
+
+            entry["etag"] = response.headers.get("ETag")
+            entry["last_modified"] = response.headers.get("Last-Modified")
+
+            # Extrair o texto da página HTML à medida que ela chega
+            text, size, truncated = extract_text(response.iter_content(CHUNK_SIZE), extractor,
+                                                 max_page_bytes, response.encoding or "utf-8")
+    text = clean_text(text)
+
+    content_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    if entry.get("sha256") == content_hash:
+        return title, "unchanged", size, entry, truncated
+
+    with open(file_path, "w", encoding="utf-8") as f:
+        f.write(text)
+
+    entry["sha256"] = content_hash
+    return title, "updated", size, entry, truncated
+
+
+def make_host_limiter(max_per_host):
+    """Cria um limitador de concorrência por host (um semáforo para cada domínio)"""
+    semaphores = {}
+    lock = threading.Lock()
+
+    def host_limit(url):
+        host = urlparse(url).netloc
+        with lock:
+            if host not in semaphores:
+                semaphores[host] = threading.BoundedSemaphore(max_per_host)
+            return semaphores[host]
+
+    return host_limit
+
+
+def download_documentation(links_file=LINKS_FILE, output_folder=OUTPUT_FOLDER,
+                           max_workers=MAX_WORKERS, max_per_host=MAX_PER_HOST,
+                           manifest_file=MANIFEST_FILE, extractor=DEFAULT_EXTRACTOR,
+                           max_page_bytes=MAX_PAGE_BYTES, on_page=None):
+    """Faz o download concorrente do conteúdo dos links extraídos
+
+    Páginas já presentes no manifesto são buscadas com GET condicional
+    (If-None-Match / If-Modified-Since): respostas 304 ou com o mesmo hash
+    de conteúdo não reescrevem o arquivo.
+
+    Args:
+        links_file: Arquivo JSON com os links ({"title", "url"})
+        output_folder: Pasta onde os textos serão salvos
+        max_workers: Número máximo de requisições em andamento (1 = download sequencial)
+        max_per_host: Número máximo de requisições simultâneas para um mesmo host
+        manifest_file: Manifesto do crawl com ETag, Last-Modified, hash e data por URL
+        extractor: Extrator de texto do HTML ("lxml", "html.parser" ou "bs4", o caminho antigo)
+        max_page_bytes: Limite de bytes lidos por página (o restante é descartado)
+        on_page: Função chamada com o nome do arquivo de cada página atualizada, assim que é salva
+
+    Returns:
+        dict com as estatísticas do download (páginas, atualizadas, bytes, erros e tempo)
+    """
+    if not os.path.exists(links_file):
+        print(f"Erro: Arquivo {links_file} não encontrado. Execute extract_links.py primeiro.")
         return
 
-    with open(LINKS_FILE, "r", encoding="utf-8") as f:
+    with open(links_file, "r", encoding="utf-8") as f:
         links = json.load(f)
 
+    os.makedirs(output_folder, exist_ok=True)
+
     total = len(links)
-    print(f"Iniciando download de {total} documentações...")
+    print(f"Iniciando download de {total} documentações ({max_workers} conexões, {max_per_host} por host, "
+          f"extrator {extractor})...")
 
-    for i, link in enumerate(links):
-        url = link["url"]
-        title = link["title"].replace(" ", "_").lower()
-        file_path = os.path.join(OUTPUT_FOLDER, f"{title}.txt")
+    manifest = load_manifest(manifest_file)
+    host_limit = make_host_limiter(max_per_host)
+    stats = {"pages": 0, "updated": 0, "not_modified": 0, "unchanged": 0, "bytes": 0, "truncated": 0,
+             "errors": 0}
+    start = time.perf_counter()
 
-        try:
-            response = requests.get(url, timeout=10)
-            response.raise_for_status()
+    with create_session(max_workers) as session, ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(download_link, session, link, output_folder, host_limit,
+                            manifest.get(link["url"]), extractor, max_page_bytes): link
+            for link in links
+        }
+        for i, future in enumerate(as_completed(futures)):
+            url = futures[future]["url"]
+            try:
+                title, status, size, entry, truncated = future.result()
+                manifest[url] = entry
+                stats["pages"] += 1
+                stats[status] += 1
+                stats["bytes"] += size
+                stats["truncated"] += truncated
+                metrics.inc("download_pages_total", status=status)
+                metrics.inc("download_bytes_total", size)
+                if truncated:
+                    print(f"⚠ {title}: página maior que {max_page_bytes / 1e6:.0f} MB, texto truncado")
+                if status == "updated":
+                    print(f"[{i + 1}/{total}] Sucesso: {title}")
+                    if on_page:
+                        on_page(entry["file"])
+                else:
+                    print(f"[{i + 1}/{total}] Sem alterações: {title}")
+            except Exception as e:
+                stats["errors"] += 1
+                metrics.inc("download_pages_total", status="error")
+                print(f"[{i + 1}/{total}] Erro ao baixar {url}: {e}")
 
-            # Extrair o texto da página HTML
-            soup = BeautifulSoup(response.text, "html.parser")
-            text = soup.get_text()
-            text = clean_text(text)
+    save_manifest(manifest, manifest_file)
 
-            with open(file_path, "w", encoding="utf-8") as f:
-                f.write(text)
+    stats["seconds"] = time.perf_counter() - start
+    elapsed = max(stats["seconds"], 1e-9)
+    print(f"\n📊 {stats['pages']} páginas ({stats['bytes'] / 1e6:.1f} MB) em {stats['seconds']:.1f}s "
+          f"→ {stats['pages'] / elapsed:.1f} páginas/s, {stats['bytes'] / 1e6 / elapsed:.2f} MB/s "
+          f"({stats['updated']} atualizadas, {stats['not_modified'] + stats['unchanged']} sem alterações, "
+          f"{stats['errors']} erros)")
 
-            print(f"[{i + 1}/{total}] Sucesso: {title}")
-        except Exception as e:
-            print(f"[{i + 1}/{total}] Erro ao baixar {url}: {e}")
+    return stats
 
 
 if __name__ == "__main__":
-    download_documentation()
+    parser = argparse.ArgumentParser(description="Download do conteúdo dos links extraídos")
+    parser.add_argument("--extractor", default=DEFAULT_EXTRACTOR, choices=available_extractors(),
+                        help="Extrator de texto do HTML")
+    parser.add_argument("--workers", type=int, default=MAX_WORKERS, help="Requisições simultâneas")
+    args = parser.parse_args()
+
+    download_documentation(max_workers=args.workers, extractor=args.extractor)
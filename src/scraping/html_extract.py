@@ -0,0 +1,167 @@
+import codecs
+from html.parser import HTMLParser
+
+try:
+    from lxml import etree
+except ImportError:  # Dependência opcional: sem ela a extração usa o html.parser da biblioteca padrão
+    etree = None
+
+# Limite de bytes lidos por página: o restante do HTML é descartado
+MAX_PAGE_BYTES = 8 * 1024 * 1024
+CHUNK_SIZE = 64 * 1024
+
+# Elementos cujo texto não é conteúdo: scripts/estilos e o cabeçalho, menus e rodapé
+# do GitHub (o bloco "Navigation Menu ... Explore All features" vem do <header>)
+SKIP_TAGS = {"script", "style", "template", "noscript", "svg", "header", "nav", "footer"}
+
+
+class TextCollector:
+    """Acumula o texto de um documento HTML ignorando os elementos de SKIP_TAGS
+
+    Recebe os eventos start/end/data do parser (a mesma interface de "target"
+    do lxml), sem montar a árvore do documento.
+    """
+
+    def __init__(self, skip_tags=SKIP_TAGS):
+        self.skip_tags = skip_tags
+        self.parts = []
+        self.skip_tag = None
+        self.skip_depth = 0
+
+    def start(self, tag, attrs=None):
+        tag = tag.lower()
+        if self.skip_tag is None:
+            if tag in self.skip_tags:
+                self.skip_tag, self.skip_depth = tag, 1
+        elif tag == self.skip_tag:
+            self.skip_depth += 1
+
+    def end(self, tag):
+        if self.skip_tag is not None and tag.lower() == self.skip_tag:
+            self.skip_depth -= 1
+            if self.skip_depth == 0:
+                self.skip_tag = None
+
+    def data(self, text):
+        if self.skip_tag is None:
+            self.parts.append(text)
+
+    def close(self):
+        return "".join(self.parts)
+
+
+class HTMLParserExtractor(HTMLParser):
+    """Extrator incremental com o html.parser da biblioteca padrão (sem dependências)"""
+
+    name = "html.parser"
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.collector = TextCollector()
+
+    def handle_starttag(self, tag, attrs):
+        self.collector.start(tag)
+
+    def handle_endtag(self, tag):
+        self.collector.end(tag)
+
+    def handle_data(self, data):
+        self.collector.data(data)
+
+    def close(self):
+        super().close()
+        return self.collector.close()
+
+
+class LxmlExtractor:
+    """Extrator incremental com o parser HTML do lxml (libxml2), se instalado"""
+
+    name = "lxml"
+
+    def __init__(self):
+        self.collector = TextCollector()
+        self.parser = etree.HTMLParser(target=self.collector)
+        self.empty = True
+
+    def feed(self, chunk):
+        if chunk:
+            self.empty = False
+            self.parser.feed(chunk)
+
+    def close(self):
+        # O libxml2 recusa fechar um documento vazio
+        return "" if self.empty else self.parser.close()
+
+
+class BeautifulSoupExtractor:
+    """Caminho anterior: monta a árvore completa com BeautifulSoup e chama get_text()"""
+
+    name = "bs4"
+
+    def __init__(self):
+        self.chunks = []
+
+    def feed(self, chunk):
+        self.chunks.append(chunk)
+
+    def close(self):
+        from bs4 import BeautifulSoup
+
+        return BeautifulSoup("".join(self.chunks), "html.parser").get_text()
+
+
+EXTRACTORS = {
+    HTMLParserExtractor.name: HTMLParserExtractor,
+    LxmlExtractor.name: LxmlExtractor,
+    BeautifulSoupExtractor.name: BeautifulSoupExtractor,
+}
+DEFAULT_EXTRACTOR = LxmlExtractor.name if etree is not None else HTMLParserExtractor.name
+
+
+def available_extractors():
+    """Lista os extratores utilizáveis neste ambiente"""
+    return [name for name in EXTRACTORS if name != LxmlExtractor.name or etree is not None]
+
+
+def create_extractor(name=None):
+    """Cria um extrator (um por página: eles guardam o estado do parser)
+
+    Todo extrator expõe feed(texto) e close() -> texto extraído.
+    """
+    name = name or DEFAULT_EXTRACTOR
+    if name not in available_extractors():
+        raise ValueError(f"Extrator desconhecido ou indisponível: {name} (opções: {available_extractors()})")
+    return EXTRACTORS[name]()
+
+
+def extract_text(chunks, extractor=None, max_bytes=MAX_PAGE_BYTES, encoding="utf-8"):
+    """Extrai o texto de um HTML recebido em blocos de bytes (ex.: response.iter_content)
+
+    Args:
+        chunks: Iterável de blocos de bytes do HTML
+        extractor: Nome do extrator (None = DEFAULT_EXTRACTOR)
+        max_bytes: Limite de bytes lidos; acima dele o restante da página é ignorado
+        encoding: Codificação do HTML (bytes inválidos são substituídos)
+
+    Returns:
+        (texto, bytes lidos, True se a página foi truncada)
+    """
+    parser = create_extractor(extractor)
+    try:
+        decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+    except LookupError:
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+
+    size = 0
+    truncated = False
+    for chunk in chunks:
+        if size + len(chunk) > max_bytes:
+            chunk = chunk[:max_bytes - size]
+            truncated = True
+        size += len(chunk)
+        parser.feed(decoder.decode(chunk))
+        if truncated:
+            break
+
+    parser.feed(decoder.decode(b"", final=True))
+    return parser.close(), size, truncated
@@ -0,0 +1,378 @@
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from src.search.embedding_store import open_store, score, OPEN_RETRIES, OPEN_RETRY_SECONDS
+
+try:
+    import hnswlib
+except ImportError:  # Dependência opcional: sem ela o índice aproximado usa IVF
+    hnswlib = None
+
+# Abaixo deste número de vetores a busca exata é rápida o suficiente
+EXACT_THRESHOLD = 20000
+
+# Parâmetros padrão do IVF (listas invertidas sobre centroides do k-means)
+IVF_PROBES = 8
+
+# Parâmetros padrão do HNSW
+HNSW_M = 16
+HNSW_EF_CONSTRUCTION = 200
+HNSW_EF_SEARCH = 64
+
+# Arquivos do índice salvo ao lado do armazenamento:
+#   <prefixo>.<versão do armazenamento>.<tipo>.<extensão> -> estrutura do índice
+#   <prefixo>.ann.json                                  -> tipo, parâmetros, versão e nome do arquivo
+# Como em embedding_store, o JSON é substituído por último e as versões antigas são apagadas depois.
+INDEX_FILE_RE = r"(\.[0-9a-f]{16})?\.(ivf|hnsw|int8|pq)\.(npz|bin)"
+
+
+def select_top_k(scores, k):
+    """Seleciona os k maiores valores de cada linha (argpartition + ordenação só dos k)"""
+    scores = np.atleast_2d(scores)
+    k = min(k, scores.shape[1])
+    if k == 0:
+        return np.zeros((scores.shape[0], 0), dtype=np.int64), np.zeros((scores.shape[0], 0), dtype=np.float32)
+
+    indices = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    top_scores = np.take_along_axis(scores, indices, axis=1)
+    order = np.argsort(-top_scores, axis=1)
+    return np.take_along_axis(indices, order, axis=1), np.take_along_axis(top_scores, order, axis=1)
+
+
+class ExactIndex:
+    """Busca exata (força bruta) sobre a matriz normalizada"""
+
+    kind = "exact"
+    extension = None
+
+    def __init__(self, matrix):
+        self.matrix = matrix
+
+    def search(self, query_embeddings, k):
+        """Retorna (índices, pontuações) dos k vetores mais similares a cada consulta"""
+        query_embeddings = np.atleast_2d(query_embeddings).astype(np.float32)
+        return select_top_k(score(self.matrix, query_embeddings.T).T, k)
+
+    def save(self, path):
+        """A busca exata não tem estrutura própria para salvar"""
+
+    def params(self):
+        return {}
+
+
+class IVFIndex:
+    """Índice IVF: vetores agrupados em listas pelo centroide mais próximo
+
+    A consulta só é comparada com os vetores das `n_probes` listas mais próximas,
+    o que troca um pouco de recall por uma fração do custo da busca exata.
+    """
+
+    kind = "ivf"
+    extension = "npz"
+
+    def __init__(self, matrix, centroids, list_offsets, list_rows, n_probes=IVF_PROBES):
+        self.matrix = matrix
+        self.centroids = centroids
+        self.list_offsets = list_offsets
+        self.list_rows = list_rows
+        self.n_probes = n_probes
+
+    @classmethod
+    def build(cls, matrix, n_lists=None, n_probes=IVF_PROBES, seed=42):
+        """Treina os centroides com k-means mini-batch e monta as listas invertidas"""
+        from sklearn.cluster import MiniBatchKMeans
+
+        n_lists = n_lists or max(1, int(4 * np.sqrt(len(matrix))))
+        kmeans = MiniBatchKMeans(n_clusters=n_lists, batch_size=4096, n_init=1, random_state=seed)
+
+        labels = np.empty(len(matrix), dtype=np.int32)
+        sample = np.random.default_rng(seed).choice(len(matrix), min(len(matrix), 256 * n_lists), replace=False)
+        kmeans.fit(np.asarray(matrix[np.sort(sample)], dtype=np.float32))
+        for start in range(0, len(matrix), 65536):
+            labels[start:start + 65536] = kmeans.predict(np.asarray(matrix[start:start + 65536], dtype=np.float32))
+
+        centroids = kmeans.cluster_centers_.astype(np.float32)
+        centroids /= np.maximum(np.linalg.norm(centroids, axis=1, keepdims=True), 1e-12)
+
+        list_rows = np.argsort(labels, kind="stable").astype(np.int64)
+        list_offsets = np.concatenate([[0], np.cumsum(np.bincount(labels, minlength=n_lists))]).astype(np.int64)
+        return cls(matrix, centroids, list_offsets, list_rows, n_probes)
+
+    def search(self, query_embeddings, k):
+        """Retorna (índices, pontuações) aproximados dos k vetores mais similares a cada consulta"""
+        query_embeddings = np.atleast_2d(query_embeddings).astype(np.float32)
+        probes, _ = select_top_k(query_embeddings @ self.centroids.T, self.n_probes)
+
+        all_indices = np.full((len(query_embeddings), k), -1, dtype=np.int64)
+        all_scores = np.full((len(query_embeddings), k), -np.inf, dtype=np.float32)
+        for i, lists in enumerate(probes):
+            rows = np.concatenate([self.list_rows[self.list_offsets[l]:self.list_offsets[l + 1]] for l in lists])
+            rows.sort()  # Leitura sequencial do mmap
+            candidate_scores = np.asarray(self.matrix[rows], dtype=np.float32) @ query_embeddings[i]
+            best, best_scores = select_top_k(candidate_scores, k)
+            all_indices[i, :best.shape[1]] = rows[best[0]]
+            all_scores[i, :best.shape[1]] = best_scores[0]
+
+        return all_indices, all_scores
+
+    def save(self, path):
+        np.savez(path, centroids=self.centroids, list_offsets=self.list_offsets, list_rows=self.list_rows)
+
+    @classmethod
+    def load(cls, path, matrix, n_probes=IVF_PROBES, **build_params):
+        """Abre o índice salvo; os parâmetros de construção (n_lists) já estão no arquivo"""
+        data = np.load(path)
+        return cls(matrix, data["centroids"], data["list_offsets"], data["list_rows"], n_probes)
+
+    def params(self):
+        return {"n_lists": len(self.centroids), "n_probes": self.n_probes}
+
+
+class HNSWIndex:
+    """Índice HNSW (grafo navegável) via hnswlib, se instalado"""
+
+    kind = "hnsw"
+    extension = "bin"
+
+    def __init__(self, graph, ef_search=HNSW_EF_SEARCH):
+        self.graph = graph
+        self.ef_search = ef_search
+        self.graph.set_ef(ef_search)
+
+    @classmethod
+    def build(cls, matrix, m=HNSW_M, ef_construction=HNSW_EF_CONSTRUCTION, ef_search=HNSW_EF_SEARCH):
+        graph = hnswlib.Index(space="ip", dim=matrix.shape[1])
+        graph.init_index(max_elements=len(matrix), M=m, ef_construction=ef_construction)
+        for start in range(0, len(matrix), 65536):
+            block = np.asarray(matrix[start:start + 65536], dtype=np.float32)
+            graph.add_items(block, np.arange(start, start + len(block)))
+        return cls(graph, ef_search)
+
+    def search(self, query_embeddings, k):
+        """Retorna (índices, pontuações) aproximados dos k vetores mais similares a cada consulta"""
+        query_embeddings = np.atleast_2d(query_embeddings).astype(np.float32)
+        self.graph.set_ef(max(self.ef_search, k))
+        labels, distances = self.graph.knn_query(query_embeddings, k=min(k, self.graph.get_current_count()))
+        # No espaço "ip" do hnswlib a distância é 1 - produto escalar
+        return labels.astype(np.int64), (1.0 - distances).astype(np.float32)
+
+    def save(self, path):
+        self.graph.save_index(path)
+
+    @classmethod
+    def load(cls, path, matrix, ef_search=HNSW_EF_SEARCH, **build_params):
+        graph = hnswlib.Index(space="ip", dim=matrix.shape[1])
+        graph.load_index(path, max_elements=len(matrix))
+        return cls(graph, ef_search)
+
+    def params(self):
+        return {"ef_search": self.ef_search}
+
+
+def saved_index_meta(prefix):
+    """Tipo, parâmetros e versão do índice salvo para o armazenamento (None se não houver)"""
+    meta_path = index_meta_path(prefix)
+    if not os.path.exists(meta_path):
+        return None
+    with open(meta_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def resolve_kind(n_vectors, kind="auto"):
+    """Resolve kind="auto": exato para corpora pequenos, HNSW se o hnswlib existir, senão IVF"""
+    if kind != "auto":
+        return kind
+    if n_vectors < EXACT_THRESHOLD:
+        return "exact"
+    return "hnsw" if hnswlib is not None else "ivf"
+
+
+def build_index(matrix, kind="auto", **params):
+    """Constrói um índice de vizinhos mais próximos sobre a matriz normalizada
+
+    Args:
+        matrix: Matriz (linhas, dimensão) normalizada, possivelmente mapeada em memória
+        kind: "exact", "ivf", "hnsw", "int8", "pq" ou "auto" (ver resolve_kind)
+        **params: Parâmetros do índice (n_lists/n_probes para IVF, m/ef_construction/ef_search para HNSW,
+            rerank/n_subspaces para os quantizados)
+    """
+    kind = resolve_kind(len(matrix), kind)
+
+    if kind == "exact":
+        return ExactIndex(matrix)
+    if kind == "ivf":
+        return IVFIndex.build(matrix, **params)
+    if kind == "hnsw":
+        if hnswlib is None:
+            raise ImportError("hnswlib não está instalado. Use kind='ivf' ou instale com `pip install hnswlib`.")
+        return HNSWIndex.build(matrix, **params)
+    if kind in ("int8", "pq"):
+        from src.search.quantization import QuantizedIndex
+        return QuantizedIndex.build(matrix, kind, **params)
+    raise ValueError("Tipo de índice desconhecido. Use 'exact', 'ivf', 'hnsw', 'int8', 'pq' ou 'auto'.")
+
+
+def index_meta_path(prefix):
+    """Caminho do arquivo com o tipo, os parâmetros e a versão do índice salvo"""
+    return f"{prefix}.ann.json"
+
+
+def save_index(index, prefix, store_version):
+    """Salva o índice e o arquivo <prefixo>.ann.json com o tipo, parâmetros e versão do armazenamento
+
+    A estrutura vai para um arquivo com a versão do armazenamento no nome (gravado em um
+    temporário e renomeado) e o JSON é substituído por último: um leitor nunca abre um
+    arquivo pela metade nem um índice de outra versão.
+    """
+    folder, base = os.path.split(prefix)
+    filename = None
+    if index.extension:
+        filename = f"{base}.{store_version}.{index.kind}.{index.extension}"
+        path = os.path.join(folder, filename)
+        tmp_path = f"{path[:-len(index.extension) - 1]}.{os.getpid()}.tmp.{index.extension}"
+        index.save(tmp_path)
+        os.replace(tmp_path, path)
+
+    meta_path = index_meta_path(prefix)
+    tmp_meta = f"{meta_path}.{os.getpid()}.tmp"
+    with open(tmp_meta, "w", encoding="utf-8") as f:
+        json.dump({"kind": index.kind, "params": index.params(), "store_version": store_version,
+                   "file": filename}, f)
+    os.replace(tmp_meta, meta_path)
+    remove_index_files(prefix, keep={filename})
+
+
+def remove_index_files(prefix, keep=()):
+    """Apaga os arquivos de índices salvos para o armazenamento, exceto os de `keep`"""
+    folder, base = os.path.split(prefix)
+    pattern = re.compile(re.escape(base) + INDEX_FILE_RE)
+    for name in os.listdir(folder or "."):
+        if pattern.fullmatch(name) and name not in keep:
+            try:
+                os.remove(os.path.join(folder, name))
+            except OSError:
+                pass  # Ex.: apagado por outro processo; sai na próxima atualização
+
+
+def remove_index(prefix):
+    """Apaga o índice salvo (JSON primeiro, depois os arquivos), ex.: quando a busca exata volta a bastar"""
+    try:
+        os.remove(index_meta_path(prefix))
+    except FileNotFoundError:
+        pass
+    remove_index_files(prefix)
+
+
+def load_index(prefix, matrix, store_version=None, **search_params):
+    """Carrega o índice salvo para a matriz. Retorna None se não existir ou estiver desatualizado
+
+    Os parâmetros salvos (n_probes, ef_search, rerank...) valem a menos que `search_params`
+    os substitua. Se outro processo trocar o índice no meio da leitura, lê o JSON de novo.
+    """
+    meta_path = index_meta_path(prefix)
+    for attempt in range(OPEN_RETRIES):
+        if not os.path.exists(meta_path):
+            return None
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+
+        if store_version is not None and meta["store_version"] != store_version:
+            print(f"⚠ Índice aproximado {prefix} desatualizado. Usando busca exata.")
+            return None
+
+        kind = meta["kind"]
+        # Formato antigo: arquivo sem a versão no nome (<prefixo>.<tipo>.<extensão>)
+        filename = meta.get("file") or f"{os.path.basename(prefix)}.{kind}.{'bin' if kind == 'hnsw' else 'npz'}"
+        path = os.path.join(os.path.dirname(prefix), filename)
+        params = {**meta.get("params", {}), **search_params}
+        try:
+            if kind == "ivf":
+                return IVFIndex.load(path, matrix, **params)
+            if kind == "hnsw" and hnswlib is not None:
+                return HNSWIndex.load(path, matrix, **params)
+            if kind in ("int8", "pq"):
+                from src.search.quantization import QuantizedIndex
+                return QuantizedIndex.load(path, matrix, kind, **params)
+            return None
+        except FileNotFoundError:
+            if attempt == OPEN_RETRIES - 1:
+                raise
+        time.sleep(OPEN_RETRY_SECONDS)
+
+
+def recall_at_k(index, matrix, query_embeddings, k=10):
+    """Mede o recall@k do índice em relação à busca exata
+
+    Returns:
+        (recall médio, latência média por consulta do índice em ms, latência da busca exata em ms)
+    """
+    exact_index = ExactIndex(matrix)
+    start = time.perf_counter()
+    exact = np.vstack([exact_index.search(query, k)[0] for query in query_embeddings])
+    exact_ms = (time.perf_counter() - start) * 1000 / len(query_embeddings)
+
+    start = time.perf_counter()
+    approx = np.vstack([index.search(query, k)[0] for query in query_embeddings])
+    approx_ms = (time.perf_counter() - start) * 1000 / len(query_embeddings)
+
+    hits = [len(set(a) & set(e)) / len(e) for a, e in zip(approx, exact)]
+    return float(np.mean(hits)), approx_ms, exact_ms
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Constrói o índice aproximado e mede o recall@k")
+    parser.add_argument("--store", default="embeddings/passage_embeddings", help="Prefixo do armazenamento")
+    parser.add_argument("--kind", choices=["auto", "ivf", "hnsw", "exact", "int8", "pq"], default="auto")
+    parser.add_argument("--n-lists", type=int, default=None, help="Listas do IVF")
+    parser.add_argument("--n-probes", type=int, default=IVF_PROBES, help="Listas visitadas por consulta (IVF)")
+    parser.add_argument("--ef-search", type=int, default=HNSW_EF_SEARCH, help="Tamanho da fila de busca (HNSW)")
+    parser.add_argument("--rerank", type=int, default=200,
+                        help="Candidatos reordenados com os vetores float (int8/pq; 0 desliga)")
+    parser.add_argument("--subspaces", type=int, default=96, help="Subespaços da quantização por produto (pq)")
+    parser.add_argument("--queries", type=int, default=200, help="Consultas usadas para medir o recall")
+    parser.add_argument("-k", type=int, default=10)
+    args = parser.parse_args()
+
+    matrix, meta = open_store(args.store)
+    kind = resolve_kind(len(matrix), args.kind)
+    params = {}
+    if kind == "ivf":
+        params = {"n_lists": args.n_lists, "n_probes": args.n_probes}
+    elif kind == "hnsw":
+        params = {"ef_search": args.ef_search}
+    elif kind == "int8":
+        params = {"rerank": args.rerank}
+    elif kind == "pq":
+        params = {"rerank": args.rerank, "n_subspaces": args.subspaces}
+
+    start = time.perf_counter()
+    index = build_index(matrix, kind, **params)
+    print(f"🏗 Índice {index.kind} {index.params()} construído em {time.perf_counter() - start:.1f}s "
+          f"para {len(matrix)} vetores")
+    save_index(index, args.store, meta["version"])
+
+    # Consultas: vetores do próprio corpus com ruído, para simular consultas próximas aos documentos
+    rng = np.random.default_rng(0)
+    rows = rng.choice(len(matrix), min(args.queries, len(matrix)), replace=False)
+    queries = np.asarray(matrix[np.sort(rows)], dtype=np.float32)
+    queries += rng.normal(scale=0.05, size=queries.shape).astype(np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+
+    recall, approx_ms, exact_ms = recall_at_k(index, matrix, queries, args.k)
+    print(f"📊 recall@{args.k}: {recall:.3f} | {approx_ms:.2f} ms/consulta (exata: {exact_ms:.2f} ms/consulta)")
+
+    if kind in ("int8", "pq"):
+        float_bytes = matrix.shape[0] * matrix.shape[1] * 4
+        print(f"💾 Memória: {index.nbytes() / 1e6:.1f} MB de códigos contra {float_bytes / 1e6:.1f} MB em float32 "
+              f"({float_bytes / index.nbytes():.1f}x menor)")
+        if index.rerank:
+            index.rerank = 0
+            recall, approx_ms, _ = recall_at_k(index, matrix, queries, args.k)
+            print(f"📊 sem reordenação: recall@{args.k}: {recall:.3f} | {approx_ms:.2f} ms/consulta")
@@ -0,0 +1,34 @@
+import os
+import requests
+
+# Se definido (ex.: http://127.0.0.1:8502), o dashboard busca pelo servidor em vez de carregar o modelo
+SEARCH_SERVER_URL = os.environ.get("SEARCH_SERVER_URL")
+REQUEST_TIMEOUT = 10
+
+_session = requests.Session()
+
+
+def remote_search(query, top_n=5, server_url=SEARCH_SERVER_URL):
+    """Busca pelo servidor HTTP. Retorna [(documento, similaridade), ...] como search()"""
+    response = _session.post(f"{server_url}/search", json={"query": query, "top_n": top_n},
+                             timeout=REQUEST_TIMEOUT)
+    response.raise_for_status()
+    return [(item["doc"], item["score"]) for item in response.json()["results"]]
+
+
+def remote_search_batch(queries, top_n=5, server_url=SEARCH_SERVER_URL):
+    """Busca várias consultas em uma requisição. Retorna uma lista de resultados por consulta"""
+    response = _session.post(f"{server_url}/search_batch", json={"queries": list(queries), "top_n": top_n},
+                             timeout=REQUEST_TIMEOUT)
+    response.raise_for_status()
+    return [[(item["doc"], item["score"]) for item in result] for result in response.json()["results"]]
+
+
+def server_health(server_url=SEARCH_SERVER_URL):
+    """Consulta /health do servidor. Retorna None se ele não estiver acessível"""
+    try:
+        response = _session.get(f"{server_url}/health", timeout=2)
+        response.raise_for_status()
+        return response.json()
+    except requests.RequestException:
+        return None
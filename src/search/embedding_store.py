@@ -0,0 +1,206 @@
+import os
+import re
+import json
+import time
+import hashlib
+import numpy as np
+
+# Formato do armazenamento de embeddings:
+#   <prefixo>.<versão>.npy        -> matriz contígua (linhas, dimensão) normalizada (L2), float32 ou
+#                                    float16, aberta com mmap: a carga é O(1) e processos diferentes
+#                                    compartilham as mesmas páginas do cache do sistema operacional
+#   <prefixo>.<versão>.<nome>.npy -> arrays alinhados às linhas (ex.: offsets dos trechos)
+#   <prefixo>.json                -> ids das linhas, dtype, dimensão, versão, nomes dos arquivos da
+#                                    versão e metadados livres
+# O JSON é o único arquivo substituído no lugar (e por último): um leitor sempre vê uma
+# matriz e arrays da mesma versão dos ids. Armazenamentos antigos (<prefixo>.npy, sem a
+# versão no nome) continuam sendo lidos.
+
+DTYPES = {"float32": np.float32, "float16": np.float16}
+SCORE_BLOCK_ROWS = 65536  # Linhas convertidas para float32 por vez ao pontuar matrizes float16
+OPEN_RETRIES = 5          # Tentativas de abrir a versão atual enquanto outro processo a substitui
+OPEN_RETRY_SECONDS = 0.05
+
+
+def meta_path(prefix):
+    """Caminho da tabela de metadados do armazenamento"""
+    return f"{prefix}.json"
+
+
+def matrix_path(prefix, meta):
+    """Caminho da matriz da versão descrita em `meta` (<prefixo>.npy no formato antigo)"""
+    name = meta.get("matrix")
+    return os.path.join(os.path.dirname(prefix), name) if name else f"{prefix}.npy"
+
+
+def store_exists(prefix):
+    """Verifica se o armazenamento existe (a tabela de metadados aponta para a matriz)"""
+    return os.path.exists(meta_path(prefix))
+
+
+def normalize(embeddings):
+    """Normaliza as linhas (L2) para que o produto escalar seja a similaridade de cosseno"""
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    return embeddings / np.maximum(norms, 1e-12)
+
+
+def save_store(prefix, embeddings, ids=None, dtype="float32", arrays=None, **metadata):
+    """Salva a matriz normalizada e a tabela de metadados
+
+    A matriz e os arrays ganham arquivos com a versão no nome e a tabela de metadados
+    é substituída por último, então a troca de versão é atômica: leitores que já
+    mapearam a versão anterior continuam válidos e os novos abrem a versão nova inteira.
+
+    Args:
+        prefix: Caminho sem extensão (ex.: "embeddings/document_embeddings")
+        embeddings: Matriz (linhas, dimensão); pode ser um mmap, lido em blocos
+        ids: Identificador de cada linha (opcional)
+        dtype: "float32" ou "float16" no disco
+        arrays: dict nome -> array salvo junto com a matriz, na mesma versão (ver open_store_arrays)
+        **metadata: Campos extras salvos no JSON (modelo, hashes, ...)
+
+    Returns:
+        Versão do armazenamento (hash do conteúdo da matriz, dos ids e dos arrays)
+    """
+    folder, base = os.path.split(prefix)
+    os.makedirs(folder or ".", exist_ok=True)
+
+    embeddings = np.asarray(embeddings)
+    if embeddings.ndim != 2:
+        embeddings = embeddings.reshape(len(embeddings), -1) if embeddings.size else np.zeros((0, 0), np.float32)
+    if ids is not None and len(ids) != len(embeddings):
+        raise ValueError("ids e embeddings devem ter o mesmo número de linhas")
+    arrays = {name: np.ascontiguousarray(array) for name, array in (arrays or {}).items()}
+
+    # A matriz é normalizada e gravada em blocos: `embeddings` pode ser um mmap maior que a memória
+    tmp_matrix = os.path.join(folder, f"{base}.{os.getpid()}.tmp.npy")
+    matrix = np.lib.format.open_memmap(tmp_matrix, mode="w+", dtype=DTYPES[dtype], shape=embeddings.shape)
+    digest = hashlib.sha256()
+    for start in range(0, len(embeddings), SCORE_BLOCK_ROWS):
+        block = normalize(embeddings[start:start + SCORE_BLOCK_ROWS]).astype(DTYPES[dtype])
+        matrix[start:start + len(block)] = block
+        digest.update(block.tobytes())
+    matrix.flush()
+    shape = matrix.shape
+    del matrix
+
+    digest.update(json.dumps(ids).encode("utf-8"))
+    for name, array in sorted(arrays.items()):
+        digest.update(name.encode("utf-8"))
+        digest.update(array.tobytes())
+    version = digest.hexdigest()[:16]
+
+    files = {None: f"{base}.{version}.npy"}
+    files.update({name: f"{base}.{version}.{name}.npy" for name in arrays})
+    os.replace(tmp_matrix, os.path.join(folder, files[None]))
+    for name, array in arrays.items():
+        path = os.path.join(folder, files[name])
+        tmp_path = f"{path[:-4]}.{os.getpid()}.tmp.npy"
+        np.save(tmp_path, array)
+        os.replace(tmp_path, path)
+
+    meta = dict(metadata, ids=ids, dtype=dtype, count=int(shape[0]), dimension=int(shape[1]), version=version,
+                matrix=files.pop(None), arrays=files)
+
+    tmp_meta = f"{meta_path(prefix)}.{os.getpid()}.tmp"
+    with open(tmp_meta, "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False)
+    os.replace(tmp_meta, meta_path(prefix))
+
+    remove_stale_versions(prefix, {meta["matrix"], *meta["arrays"].values()})
+    return version
+
+
+def remove_stale_versions(prefix, keep):
+    """Apaga os arquivos de versões anteriores (e o <prefixo>.npy do formato antigo)
+
+    Leitores que já mapearam uma versão apagada continuam lendo (o sistema mantém o
+    arquivo até o último mapeamento fechar); quem leu o JSON antigo e ainda não abriu
+    a matriz tenta de novo em open_store.
+    """
+    folder, base = os.path.split(prefix)
+    pattern = re.compile(re.escape(base) + r"(\.[0-9a-f]{16}(\.\w+)?)?\.npy")
+    for name in os.listdir(folder or "."):
+        if pattern.fullmatch(name) and name not in keep:
+            try:
+                os.remove(os.path.join(folder, name))
+            except OSError:
+                pass  # Ex.: arquivo mapeado no Windows; sai na próxima atualização
+
+
+def load_store_metadata(prefix):
+    """Lê apenas a tabela de metadados do armazenamento"""
+    with open(meta_path(prefix), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def open_store(prefix):
+    """Abre o armazenamento sem copiar a matriz (mmap somente leitura)
+
+    Returns:
+        (matriz mapeada em memória, metadados)
+    """
+    matrix, meta, _ = open_store_arrays(prefix)
+    return matrix, meta
+
+
+def open_store_arrays(prefix, names=(), legacy_paths=None):
+    """Abre (mmap) a matriz e os arrays salvos com save_store(arrays=...), todos da mesma versão
+
+    Se outro processo trocar a versão no meio da leitura (arquivo apagado ou, no formato
+    antigo, número de linhas diferente), lê o JSON de novo e reabre tudo.
+
+    Args:
+        names: Nomes dos arrays
+        legacy_paths: dict nome -> arquivo separado usado antes do array fazer parte do
+            armazenamento; só é aceito se tiver uma linha por linha da matriz
+
+    Returns:
+        (matriz, metadados, dict nome -> array ou None se não existir nesta versão)
+    """
+    folder = os.path.dirname(prefix)
+    legacy_paths = legacy_paths or {}
+    for attempt in range(OPEN_RETRIES):
+        meta = load_store_metadata(prefix)
+        try:
+            matrix = np.load(matrix_path(prefix, meta), mmap_mode="r")
+            arrays = {}
+            for name in names:
+                filename = meta.get("arrays", {}).get(name)
+                legacy_path = legacy_paths.get(name)
+                if filename:
+                    arrays[name] = np.load(os.path.join(folder, filename), mmap_mode="r")
+                elif legacy_path and os.path.exists(legacy_path):
+                    arrays[name] = np.load(legacy_path, mmap_mode="r")
+                else:
+                    arrays[name] = None
+        except FileNotFoundError:
+            if attempt == OPEN_RETRIES - 1:
+                raise
+        else:
+            if len(matrix) == meta["count"]:
+                # Um arquivo antigo (fora do armazenamento) de outra versão conta como ausente
+                return matrix, meta, {name: None if array is None or len(array) != meta["count"] else array
+                                      for name, array in arrays.items()}
+        time.sleep(OPEN_RETRY_SECONDS)
+    raise ValueError(f"A matriz de {prefix} não corresponde aos metadados")
+
+
+def score(matrix, query_embedding, block_rows=SCORE_BLOCK_ROWS):
+    """Calcula matrix @ query_embedding (similaridade de cosseno se ambos normalizados)
+
+    query_embedding pode ser um vetor (dimensão,) ou uma matriz (dimensão, consultas).
+
+    Matrizes float32 são multiplicadas direto do mmap; matrizes float16 são
+    convertidas em blocos, o que mantém o uso de memória limitado.
+    """
+    query_embedding = np.asarray(query_embedding, dtype=np.float32)
+    if matrix.dtype == np.float32:
+        return matrix @ query_embedding
+
+    scores = np.empty((matrix.shape[0],) + query_embedding.shape[1:], dtype=np.float32)
+    for start in range(0, matrix.shape[0], block_rows):
+        block = np.asarray(matrix[start:start + block_rows], dtype=np.float32)
+        scores[start:start + block_rows] = block @ query_embedding
+    return scores
@@ -0,0 +1,285 @@
+import os
+import re
+import sys
+import json
+import time
+import hashlib
+import argparse
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from src.search.ann_index import select_top_k
+from src.search.embedding_store import remove_stale_versions, OPEN_RETRIES, OPEN_RETRY_SECONDS
+from src.processing.dedup import find_duplicates
+from src.monitoring import metrics
+
+# Índice BM25: <prefixo>.<versão>.<array>.npy mapeáveis + <prefixo>.json (vocabulário, documentos,
+# parâmetros e nomes dos arrays da versão), substituído por último como em embedding_store
+PROCESSED_DOCS_FOLDER = "data/processed/"
+LEXICAL_INDEX = "embeddings/bm25"
+ARRAYS = ["offsets", "docs", "tf", "lengths"]
+
+# Parâmetros padrão do BM25
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Identificadores como "node.js", "c++", "c#" e "scikit-learn" viram um termo e também suas partes
+TOKEN_RE = re.compile(r"\w+(?:[.+#-]+\w+)*[+#]*")
+WORD_RE = re.compile(r"\w+")
+
+
+def tokenize(text):
+    """Quebra o texto em termos minúsculos (identificadores compostos + suas partes)"""
+    tokens = []
+    for token in TOKEN_RE.findall(text.lower()):
+        tokens.append(token)
+        if not token.isalnum():
+            parts = WORD_RE.findall(token)
+            if parts != [token]:
+                tokens.extend(parts)
+    return tokens
+
+
+def compact_dtype(max_value):
+    """Menor tipo inteiro sem sinal que representa valores até max_value"""
+    for dtype in (np.uint16, np.uint32):
+        if max_value <= np.iinfo(dtype).max:
+            return dtype
+    return np.int64
+
+
+def index_paths(prefix, meta=None):
+    """Caminhos dos arquivos do índice: {"json": ..., "offsets": ..., "docs": ..., ...}
+
+    Os arrays são os da versão listada em `meta` (o JSON salvo); sem ela, ou no formato
+    antigo, são os arquivos <prefixo>.<array>.npy sem a versão no nome.
+    """
+    files = (meta or {}).get("arrays") or {}
+    folder = os.path.dirname(prefix)
+    paths = {name: os.path.join(folder, files[name]) if name in files else f"{prefix}.{name}.npy"
+             for name in ARRAYS}
+    paths["json"] = f"{prefix}.json"
+    return paths
+
+
+class BM25Index:
+    """Índice invertido com pontuação BM25
+
+    As listas de postings ficam concatenadas em dois arrays (documento e frequência
+    do termo); `offsets[t]:offsets[t + 1]` delimita os postings do termo t. Todos os
+    arrays são salvos em .npy e abertos com mmap, sem carregar o índice na memória.
+    """
+
+    def __init__(self, names, vocabulary, offsets, docs, tf, lengths, k1=BM25_K1, b=BM25_B,
+                 hashes=None, version=None):
+        self.names = names
+        self.vocabulary = vocabulary
+        self.offsets = offsets
+        self.docs = docs
+        self.tf = tf
+        self.lengths = lengths
+        self.k1 = k1
+        self.b = b
+        self.hashes = hashes or []
+        self.version = version
+        self.avgdl = float(lengths.mean()) if len(lengths) else 0.0
+        self.aligned = None
+
+    @classmethod
+    def build(cls, names, texts, k1=BM25_K1, b=BM25_B, hashes=None):
+        """Monta o índice a partir dos textos (uma entrada de `names` por texto)"""
+        vocabulary = {}
+        term_ids, doc_ids, freqs = [], [], []
+        lengths = np.zeros(len(texts), dtype=np.int32)
+
+        for doc, text in enumerate(texts):
+            tokens = tokenize(text)
+            lengths[doc] = len(tokens)
+            ids = np.fromiter((vocabulary.setdefault(token, len(vocabulary)) for token in tokens),
+                              dtype=np.int32, count=len(tokens))
+            unique, counts = np.unique(ids, return_counts=True)
+            term_ids.append(unique)
+            doc_ids.append(np.full(len(unique), doc, dtype=np.int32))
+            freqs.append(counts)
+
+        term_ids = np.concatenate(term_ids) if term_ids else np.zeros(0, dtype=np.int32)
+        doc_ids = np.concatenate(doc_ids) if doc_ids else np.zeros(0, dtype=np.int32)
+        freqs = np.concatenate(freqs) if freqs else np.zeros(0, dtype=np.int64)
+
+        # Agrupa os postings por termo (a ordem por documento é mantida dentro de cada termo)
+        order = np.argsort(term_ids, kind="stable")
+        offsets = np.zeros(len(vocabulary) + 1, dtype=compact_dtype(len(order)))
+        np.cumsum(np.bincount(term_ids, minlength=len(vocabulary)), out=offsets[1:])
+
+        docs = doc_ids[order].astype(compact_dtype(max(len(texts) - 1, 0)))
+        tf = np.minimum(freqs[order], np.iinfo(np.uint16).max).astype(np.uint16)
+        index = cls(list(names), vocabulary, offsets, docs, tf, lengths, k1, b, hashes)
+        index.version = index.compute_version()
+        return index
+
+    def compute_version(self):
+        digest = hashlib.sha256(json.dumps([self.names, self.hashes, self.k1, self.b]).encode("utf-8"))
+        return digest.hexdigest()[:16]
+
+    def save(self, prefix=LEXICAL_INDEX):
+        """Salva os arrays com a versão no nome e os metadados (o .json por último, de forma atômica)
+
+        Um leitor que abrir o índice no meio da gravação vê o JSON anterior, que aponta
+        para os arrays da versão anterior: postings e vocabulário são sempre da mesma versão.
+        """
+        folder, base = os.path.split(prefix)
+        os.makedirs(folder or ".", exist_ok=True)
+        files = {name: f"{base}.{self.version}.{name}.npy" for name in ARRAYS}
+        for name in ARRAYS:
+            path = os.path.join(folder, files[name])
+            tmp_path = f"{path[:-4]}.{os.getpid()}.tmp.npy"
+            np.save(tmp_path, getattr(self, name))
+            os.replace(tmp_path, path)
+
+        # Termos na ordem dos ids: o vocabulário é reconstruído com enumerate na leitura
+        terms = sorted(self.vocabulary, key=self.vocabulary.get)
+        json_path = f"{prefix}.json"
+        tmp_path = f"{json_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": self.version, "names": self.names, "hashes": self.hashes,
+                       "k1": self.k1, "b": self.b, "arrays": files, "terms": terms}, f, ensure_ascii=False)
+        os.replace(tmp_path, json_path)
+
+        remove_stale_versions(prefix, set(files.values()))
+        for path in index_paths(prefix).values():
+            if path.endswith(".npy") and os.path.exists(path):
+                os.remove(path)  # Arrays do formato antigo, sem a versão no nome
+
+    @classmethod
+    def load(cls, prefix=LEXICAL_INDEX):
+        """Abre o índice salvo com os arrays mapeados em memória
+
+        Se outro processo trocar a versão entre a leitura do JSON e a dos arrays (arquivos
+        apagados), lê o JSON de novo e reabre tudo.
+        """
+        for attempt in range(OPEN_RETRIES):
+            with open(f"{prefix}.json", "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            paths = index_paths(prefix, meta)
+            try:
+                arrays = {name: np.load(paths[name], mmap_mode="r") for name in ARRAYS}
+            except FileNotFoundError:
+                if attempt == OPEN_RETRIES - 1:
+                    raise
+                time.sleep(OPEN_RETRY_SECONDS)
+                continue
+            vocabulary = {term: i for i, term in enumerate(meta["terms"])}
+            return cls(meta["names"], vocabulary, k1=meta["k1"], b=meta["b"], hashes=meta["hashes"],
+                       version=meta["version"], **arrays)
+
+    @metrics.timed("search_scoring_seconds", kind="bm25")
+    def scores(self, query):
+        """Pontuação BM25 de todos os documentos para a consulta (0 sem termos em comum)"""
+        n_docs = len(self.names)
+        scores = np.zeros(n_docs, dtype=np.float32)
+        norm = self.k1 * (1 - self.b + self.b * self.lengths / max(self.avgdl, 1e-9))
+
+        for term in set(tokenize(query)):
+            term_id = self.vocabulary.get(term)
+            if term_id is None:
+                continue
+            start, end = int(self.offsets[term_id]), int(self.offsets[term_id + 1])
+            docs = self.docs[start:end]
+            tf = self.tf[start:end].astype(np.float32)
+            idf = np.log(1 + (n_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+            # Cada documento aparece uma vez por termo: a soma indexada não tem colisões
+            scores[docs] += idf * tf * (self.k1 + 1) / (tf + norm[docs])
+
+        return scores
+
+    def search(self, query, top_n=5):
+        """Retorna (índices, pontuações) dos top_n documentos com pontuação > 0"""
+        scores = self.scores(query)
+        indices, top_scores = select_top_k(scores, min(top_n, len(scores)))
+        keep = top_scores[0] > 0
+        return indices[0][keep], top_scores[0][keep]
+
+    def align(self, doc_names):
+        """Mapeia os documentos do índice para as linhas de `doc_names` (-1 se ausente)"""
+        if self.aligned is None or self.aligned[0] is not doc_names:
+            rows = {name: i for i, name in enumerate(doc_names)}
+            self.aligned = (doc_names, np.array([rows.get(name, -1) for name in self.names], dtype=np.int64))
+        return self.aligned[1]
+
+
+def read_documents(folder=PROCESSED_DOCS_FOLDER, skip=()):
+    """Lê os documentos processados, exceto os de `skip`. Retorna (nomes, textos, hashes de conteúdo)"""
+    names, texts, hashes = [], [], []
+    for filename in sorted(os.listdir(folder)):
+        if filename in skip:
+            continue
+        with open(os.path.join(folder, filename), "r", encoding="utf-8") as f:
+            text = f.read()
+        names.append(filename)
+        texts.append(text)
+        hashes.append(hashlib.sha256(text.encode("utf-8")).hexdigest())
+    return names, texts, hashes
+
+
+@metrics.timed("index_load_seconds", index="bm25")
+def load_lexical_index(prefix=LEXICAL_INDEX):
+    """Abre o índice BM25 salvo, ou None se ele não existir"""
+    if not os.path.exists(index_paths(prefix)["json"]):
+        return None
+    return BM25Index.load(prefix)
+
+
+def build_lexical_index(folder=PROCESSED_DOCS_FOLDER, prefix=LEXICAL_INDEX, k1=BM25_K1, b=BM25_B, force=False):
+    """Monta e salva o índice BM25 dos documentos processados (pula se nada mudou)
+
+    Cópias quase idênticas de outro documento (ver src/processing/dedup.py) ficam de fora.
+
+    Returns:
+        O índice BM25 atualizado
+    """
+    start = time.perf_counter()
+    names, texts, hashes = read_documents(folder, skip=find_duplicates(folder))
+
+    current = load_lexical_index(prefix)
+    if not force and current is not None and (current.names, current.hashes, current.k1, current.b) == (
+            names, hashes, k1, b):
+        print(f"✅ Índice BM25 já atualizado ({len(names)} documentos, {len(current.vocabulary)} termos).")
+        return current
+
+    index = BM25Index.build(names, texts, k1, b, hashes)
+    index.save(prefix)
+
+    with open(f"{prefix}.json", "r", encoding="utf-8") as f:
+        paths = index_paths(prefix, json.load(f))
+    size = sum(os.path.getsize(path) for path in paths.values())
+    print(f"✅ Índice BM25 salvo em {prefix}.* ({len(names)} documentos, {len(index.vocabulary)} termos, "
+          f"{len(index.docs)} postings, {size / 1e6:.1f} MB) em {time.perf_counter() - start:.2f}s")
+    return index
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Monta o índice BM25 e mede a latência das consultas")
+    parser.add_argument("queries", nargs="*", default=["python", "node.js", "c++", "react hooks", "kubernetes",
+                                                       "machine learning", "scikit-learn", "rust async"])
+    parser.add_argument("--force", action="store_true", help="Remonta o índice mesmo sem alterações")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    index = build_lexical_index(force=args.force)
+
+    start = time.perf_counter()
+    index = BM25Index.load()
+    print(f"📂 Índice aberto em {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    latencies = []
+    for query in args.queries:
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            indices, scores = index.search(query)
+            latencies.append((time.perf_counter() - start) * 1000)
+        top = ", ".join(index.names[i] for i in indices[:3])
+        print(f"🔹 {query!r}: {top}")
+
+    print(f"\n⏱ Latência BM25: p50 {np.percentile(latencies, 50):.2f} ms, p95 {np.percentile(latencies, 95):.2f} ms "
+          f"({len(args.queries)} consultas x {args.repeat})")
@@ -0,0 +1,251 @@
+import os
+import sys
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from src.search.embedding_store import score
+from src.search.ann_index import select_top_k
+
+# Armazenamento quantizado: os códigos ficam na memória e a matriz float (mmap) só é lida
+# para reordenar os melhores candidatos com a similaridade exata.
+#   "int8": um byte por dimensão (4x menor que float32), escala e deslocamento por dimensão
+#   "pq":   quantização por produto, um byte por subespaço (768 dims / 96 subespaços = 32x menor)
+QUANTIZED_KINDS = ["int8", "pq"]
+RERANK_CANDIDATES = 200    # Candidatos da pontuação aproximada reordenados com os vetores float (0 desliga)
+PQ_SUBSPACES = 96
+PQ_CENTROIDS = 256         # Centroides por subespaço (cabem em um uint8)
+PQ_TRAIN_SAMPLE = 10000    # Vetores usados para treinar os centroides (~40 por centroide)
+PQ_ITERATIONS = 15         # Iterações do k-means de cada subespaço
+PQ_BLOCK_ROWS = 512        # Linhas por bloco ao buscar o centroide mais próximo (distâncias cabem no cache)
+INT8_BLOCK_ROWS = 1024     # Linhas convertidas por vez ao pontuar (o bloco cabe no cache da CPU)
+ENCODE_BLOCK_ROWS = 65536
+
+
+class ScalarQuantizer:
+    """Quantização escalar: cada dimensão é mapeada de [mínimo, máximo] para int8
+
+    x ≈ offset + (código + 128) * step, então <q, x> = <q * step, código> + constante
+    da consulta: a pontuação assimétrica é um produto com os códigos, sem decodificá-los.
+    """
+
+    kind = "int8"
+
+    def __init__(self, offset, step):
+        self.offset = offset
+        self.step = step
+
+    @classmethod
+    def train(cls, matrix, sample_size=PQ_TRAIN_SAMPLE, seed=42):
+        sample = np.asarray(training_sample(matrix, sample_size, seed), dtype=np.float32)
+        low, high = sample.min(axis=0), sample.max(axis=0)
+        return cls(low, np.maximum(high - low, 1e-12) / 255)
+
+    def encode(self, block):
+        codes = np.rint((np.asarray(block, dtype=np.float32) - self.offset) / self.step) - 128
+        return np.clip(codes, -128, 127).astype(np.int8)
+
+    def scores(self, codes, query_embeddings, block_rows=INT8_BLOCK_ROWS):
+        """Pontuações aproximadas (linhas, consultas) para consultas (dimensão, consultas)"""
+        weights = query_embeddings * self.step[:, None]
+        constant = (self.offset + 128 * self.step) @ query_embeddings
+
+        scores = np.empty((len(codes), query_embeddings.shape[1]), dtype=np.float32)
+        buffer = np.empty((min(block_rows, len(codes)), codes.shape[1]), dtype=np.float32)
+        for start in range(0, len(codes), block_rows):
+            block = codes[start:start + block_rows]
+            converted = buffer[:len(block)]
+            np.copyto(converted, block, casting="unsafe")
+            scores[start:start + len(block)] = converted @ weights
+        return scores + constant
+
+    def state(self):
+        return {"offset": self.offset, "step": self.step}
+
+    def params(self):
+        return {}
+
+
+class ProductQuantizer:
+    """Quantização por produto: o vetor é dividido em subespaços e cada parte vira o
+    índice do centroide mais próximo (k-means por subespaço)
+
+    A pontuação assimétrica monta, para cada consulta, a tabela <parte da consulta,
+    centroide> de cada subespaço; a similaridade de um vetor é a soma de uma entrada
+    da tabela por subespaço.
+    """
+
+    kind = "pq"
+
+    def __init__(self, centroids):
+        self.centroids = centroids  # (subespaços, centroides, dimensão do subespaço)
+
+    @classmethod
+    def train(cls, matrix, n_subspaces=PQ_SUBSPACES, n_centroids=PQ_CENTROIDS, sample_size=PQ_TRAIN_SAMPLE,
+              iterations=PQ_ITERATIONS, seed=42):
+        """k-means (Lloyd) em cada subespaço da amostra
+
+        Implementado com numpy: são 96 k-means pequenos (8 dimensões), e o custo fixo
+        de cada chamada ao KMeans do sklearn dominaria o treino.
+        """
+        dimension = matrix.shape[1]
+        if dimension % n_subspaces:
+            raise ValueError(f"A dimensão {dimension} não é divisível por {n_subspaces} subespaços.")
+        sample = np.asarray(training_sample(matrix, sample_size, seed), dtype=np.float32)
+        n_centroids = min(n_centroids, len(sample))
+        width = dimension // n_subspaces
+        rng = np.random.default_rng(seed)
+
+        centroids = np.empty((n_subspaces, n_centroids, width), dtype=np.float32)
+        for m in range(n_subspaces):
+            part = np.ascontiguousarray(sample[:, m * width:(m + 1) * width])
+            current = part[rng.choice(len(part), n_centroids, replace=False)].copy()
+            for _ in range(iterations):
+                labels = nearest_centroids(part, current)
+                counts = np.bincount(labels, minlength=n_centroids)
+                sums = np.stack([np.bincount(labels, part[:, j], minlength=n_centroids) for j in range(width)],
+                                axis=1)
+                filled = counts > 0  # Centroides sem pontos ficam onde estão
+                current[filled] = sums[filled] / counts[filled, None]
+            centroids[m] = current
+        return cls(centroids)
+
+    def encode(self, block):
+        block = np.asarray(block, dtype=np.float32)
+        n_subspaces, _, width = self.centroids.shape
+        codes = np.empty((n_subspaces, len(block)), dtype=np.uint8)
+        for m, centroids in enumerate(self.centroids):
+            codes[m] = nearest_centroids(block[:, m * width:(m + 1) * width], centroids)
+        return codes
+
+    def scores(self, codes, query_embeddings):
+        """Pontuações aproximadas (linhas, consultas); os códigos ficam transpostos (subespaços, linhas)"""
+        n_subspaces, _, width = self.centroids.shape
+        # Tabela (consultas, subespaços, centroides) com o produto de cada parte da consulta por cada centroide
+        parts = query_embeddings.T.reshape(-1, n_subspaces, width)
+        tables = np.einsum("qmw,mcw->qmc", parts, self.centroids)
+
+        scores = np.zeros((len(tables), codes.shape[1]), dtype=np.float32)
+        for q, table in enumerate(tables):
+            for m in range(n_subspaces):
+                scores[q] += np.take(table[m], codes[m])
+        return scores.T
+
+    def state(self):
+        return {"centroids": self.centroids}
+
+    def params(self):
+        # Mesmos nomes de train: os parâmetros salvos refazem o mesmo quantizador
+        return {"n_subspaces": int(self.centroids.shape[0]), "n_centroids": int(self.centroids.shape[1])}
+
+
+QUANTIZERS = {"int8": ScalarQuantizer, "pq": ProductQuantizer}
+
+
+def nearest_centroids(points, centroids, block_rows=PQ_BLOCK_ROWS):
+    """Índice do centroide mais próximo: argmax de 2<x, c> - |c|² (|x|² não muda a escolha)"""
+    norms = (centroids ** 2).sum(axis=1)
+    labels = np.empty(len(points), dtype=np.intp)
+    for start in range(0, len(points), block_rows):
+        distances = points[start:start + block_rows] @ centroids.T
+        distances *= 2
+        distances -= norms
+        labels[start:start + block_rows] = distances.argmax(axis=1)
+    return labels
+
+
+def training_sample(matrix, sample_size, seed):
+    """Linhas (em ordem, para leitura sequencial do mmap) usadas no treino do quantizador"""
+    if len(matrix) <= sample_size:
+        return matrix
+    rows = np.random.default_rng(seed).choice(len(matrix), sample_size, replace=False)
+    return matrix[np.sort(rows)]
+
+
+class QuantizedIndex:
+    """Busca sobre os códigos quantizados com reordenação exata dos melhores candidatos
+
+    Mesma interface dos índices de ann_index (kind, search, save, load, params). A
+    pontuação aproximada percorre só os códigos; os `rerank` melhores candidatos de
+    cada consulta são pontuados de novo com as linhas float da matriz (mmap), então
+    apenas essas linhas são lidas do disco.
+
+    Também se comporta como a matriz original (len, shape, indexação, np.asarray),
+    que é lida do mmap: pode ser usado no lugar dela (ver semantic_search.load_embeddings).
+    """
+
+    extension = "npz"
+
+    def __init__(self, matrix, quantizer, codes, rerank=RERANK_CANDIDATES):
+        self.matrix = matrix
+        self.quantizer = quantizer
+        self.codes = codes
+        self.rerank = rerank
+        self.kind = quantizer.kind
+
+    @classmethod
+    def build(cls, matrix, kind="pq", rerank=RERANK_CANDIDATES, **params):
+        """Treina o quantizador e codifica a matriz em blocos"""
+        quantizer = QUANTIZERS[kind].train(matrix, **params)
+        blocks = [quantizer.encode(matrix[start:start + ENCODE_BLOCK_ROWS])
+                  for start in range(0, len(matrix), ENCODE_BLOCK_ROWS)]
+        # int8: (linhas, dimensão); pq: (subespaços, linhas), contíguo por subespaço para a soma da tabela
+        codes = np.concatenate(blocks, axis=0 if kind == "int8" else 1)
+        return cls(matrix, quantizer, codes, rerank)
+
+    def scores(self, query_embeddings):
+        """Pontuações aproximadas (linhas, consultas) de consultas (consultas, dimensão)"""
+        query_embeddings = np.atleast_2d(query_embeddings).astype(np.float32)
+        return self.quantizer.scores(self.codes, np.ascontiguousarray(query_embeddings.T))
+
+    def __len__(self):
+        return len(self.matrix)
+
+    def __getitem__(self, key):
+        return self.matrix[key]
+
+    def __array__(self, dtype=None, copy=None):
+        return np.asarray(self.matrix, dtype=dtype)
+
+    @property
+    def shape(self):
+        return self.matrix.shape
+
+    @property
+    def dtype(self):
+        return self.matrix.dtype
+
+    def search(self, query_embeddings, k):
+        """Retorna (índices, pontuações) dos k vetores mais similares a cada consulta"""
+        query_embeddings = np.atleast_2d(query_embeddings).astype(np.float32)
+        k = min(k, len(self.matrix))
+        approximate = self.scores(query_embeddings).T
+        candidates, candidate_scores = select_top_k(approximate, max(k, self.rerank))
+        if not self.rerank:
+            return candidates[:, :k], candidate_scores[:, :k]
+
+        all_indices = np.full((len(query_embeddings), k), -1, dtype=np.int64)
+        all_scores = np.full((len(query_embeddings), k), -np.inf, dtype=np.float32)
+        for i, rows in enumerate(candidates):
+            rows = np.sort(rows)  # Leitura sequencial do mmap
+            best, best_scores = select_top_k(score(self.matrix[rows], query_embeddings[i]), k)
+            all_indices[i, :best.shape[1]] = rows[best[0]]
+            all_scores[i, :best.shape[1]] = best_scores[0]
+        return all_indices, all_scores
+
+    def nbytes(self):
+        """Memória ocupada pelos códigos e pelo quantizador"""
+        return self.codes.nbytes + sum(array.nbytes for array in self.quantizer.state().values())
+
+    def save(self, path):
+        np.savez(path, codes=self.codes, **self.quantizer.state())
+
+    @classmethod
+    def load(cls, path, matrix, kind="pq", rerank=RERANK_CANDIDATES, **build_params):
+        """Abre os códigos salvos; os parâmetros do quantizador (subespaços...) já estão no arquivo"""
+        data = np.load(path)
+        state = {name: data[name] for name in data.files if name != "codes"}
+        return cls(matrix, QUANTIZERS[kind](**state), data["codes"], rerank)
+
+    def params(self):
+        return dict(self.quantizer.params(), rerank=self.rerank)
@@ -0,0 +1,167 @@
+import os
+import time
+import pickle
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+def normalize_query(query):
+    """Normaliza a consulta para uso como chave (espaços extras não mudam o resultado)"""
+    return " ".join(query.split())
+
+
+def freeze(value):
+    """Versão somente leitura do valor, para guardar no cache
+
+    Os valores são devolvidos por referência a todos os acertos: arrays numpy viram
+    views somente leitura e listas (de resultados) viram tuplas, para que quem recebe
+    um acerto não altere a entrada dos próximos.
+    """
+    if isinstance(value, np.ndarray):
+        value = value.view()
+        value.setflags(write=False)
+    elif isinstance(value, list):
+        value = tuple(value)
+    return value
+
+
+class LRUCache:
+    """Cache LRU limitado com expiração (TTL) e métricas de acerto
+
+    Cada entrada guarda o custo (em segundos) de produzi-la, para que os acertos
+    contabilizem a latência economizada. Os valores são guardados com freeze().
+    """
+
+    def __init__(self, maxsize=1024, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+
+    def get(self, key):
+        """Retorna o valor em cache ou None (conta acerto/erro)"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and (entry[2] is None or entry[2] > time.monotonic()):
+                self.entries.move_to_end(key)
+                self.hits += 1
+                self.saved_seconds += entry[1]
+                return entry[0]
+
+            if entry is not None:
+                del self.entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value, cost=0.0):
+        """Insere o valor (somente leitura), descartando o menos usado recentemente se o cache estiver cheio
+
+        Returns:
+            O valor como foi guardado
+        """
+        value = freeze(value)
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        with self.lock:
+            self.entries[key] = (value, cost, expires_at)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+        return value
+
+    def get_or_compute(self, key, compute):
+        """Retorna o valor em cache ou calcula com compute(), guardando o custo medido
+
+        O valor devolvido é sempre o guardado (somente leitura), com ou sem acerto.
+        """
+        value = self.get(key)
+        if value is None:
+            start = time.perf_counter()
+            value = compute()
+            value = self.put(key, value, time.perf_counter() - start)
+        return value
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        """Retorna acertos, erros, taxa de acerto, tamanho e latência economizada (ms)"""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "size": len(self.entries),
+            "saved_ms": self.saved_seconds * 1000,
+        }
+
+
+class QueryEmbeddingCache(LRUCache):
+    """Cache consulta normalizada -> embedding, opcionalmente persistido em disco"""
+
+    def __init__(self, model_name, maxsize=4096, ttl=None, path=None):
+        super().__init__(maxsize, ttl)
+        self.model_name = model_name
+        self.path = path
+        if path:
+            self.load()
+
+    def get_or_encode(self, query, encode):
+        """Retorna o embedding da consulta, codificando com encode(consulta) só em caso de erro"""
+        key = normalize_query(query)
+        return self.get_or_compute(key, lambda: encode(key))
+
+    def load(self):
+        """Carrega as entradas salvas (ignoradas se geradas por outro modelo)"""
+        if not self.path or not os.path.exists(self.path):
+            return
+
+        with open(self.path, "rb") as f:
+            data = pickle.load(f)
+
+        if data.get("model") == self.model_name:
+            for key, (value, cost) in data["entries"].items():
+                self.put(key, value, cost)
+
+    def save(self):
+        """Salva as entradas atuais (sem a expiração, que é relativa a este processo)"""
+        if not self.path:
+            return
+
+        with self.lock:
+            entries = {key: (value, cost) for key, (value, cost, _) in self.entries.items()}
+
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"  # Vários processos (ex.: shards) podem salvar juntos
+        with open(tmp_path, "wb") as f:
+            pickle.dump({"model": self.model_name, "entries": entries}, f)
+        os.replace(tmp_path, self.path)
+
+
+class ResultCache(LRUCache):
+    """Cache de resultados por (índice, consulta, parâmetros, versão do índice)
+
+    Quando a versão de um índice muda, as entradas daquele índice são descartadas.
+    """
+
+    def __init__(self, maxsize=1024, ttl=None):
+        super().__init__(maxsize, ttl)
+        self.index_versions = {}
+
+    def invalidate(self, index_name):
+        """Descarta as entradas de um índice"""
+        with self.lock:
+            for key in [key for key in self.entries if key[0] == index_name]:
+                del self.entries[key]
+
+    def get_or_search(self, index_name, query, params, index_version, search):
+        """Retorna os resultados em cache ou executa search()"""
+        if self.index_versions.get(index_name) != index_version:
+            self.invalidate(index_name)
+            self.index_versions[index_name] = index_version
+        return self.get_or_compute((index_name, normalize_query(query), params, index_version), search)
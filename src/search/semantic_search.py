@@ -1,50 +1,437 @@
 import os
-import pickle
+import sys
+import time
+import atexit
 import numpy as np
-from sentence_transformers import SentenceTransformer
-from sklearn.metrics.pairwise import cosine_similarity
 
-# Caminhos dos arquivos
-EMBEDDINGS_FILE = "embeddings/document_embeddings.pkl"
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from src.search.embedding_store import open_store, open_store_arrays, store_exists, score, load_store_metadata
+from src.search.ann_index import load_index, select_top_k
+from src.search.quantization import QuantizedIndex
+from src.search.query_cache import QueryEmbeddingCache, ResultCache, normalize_query
+from src.search.lexical_index import load_lexical_index, LEXICAL_INDEX
+from src.models.model_registry import get_model, MODEL_NAME
+from src.monitoring import metrics
+
+# Caminhos dos arquivos (armazenamentos <prefixo>.json + matriz versionada, ver embedding_store.py)
+EMBEDDINGS_STORE = "embeddings/document_embeddings"
+PASSAGE_STORE = "embeddings/passage_embeddings"
+PASSAGE_OFFSETS_FILE = "embeddings/passage_offsets.npy"  # Formato antigo (offsets fora do armazenamento)
 PROCESSED_DOCS_FOLDER = "data/processed/"
 
-MODEL_NAME = "sentence-transformers/all-mpnet-base-v2"  # Deve ser o mesmo do generate_embeddings.py
-model = SentenceTransformer(MODEL_NAME)
+# Trechos recuperados pelo índice aproximado antes da agregação por documento
+ANN_CANDIDATES = 200
+
+# Busca híbrida (BM25 + semântica)
+HYBRID_MODES = ["rrf", "shortlist"]
+RRF_K = 60                 # Constante da fusão por rank recíproco
+HYBRID_DEPTH = 100         # Documentos de cada ranking considerados na fusão
+LEXICAL_CANDIDATES = 200   # Candidatos do BM25 pontuados pelos embeddings no modo "shortlist"
+
+# Caches: embedding de consultas (persistido ao sair) e resultados por versão do índice
+QUERY_CACHE_FILE = "embeddings/query_cache.pkl"
+QUERY_CACHE_SIZE = 4096
+QUERY_CACHE_TTL = 7 * 24 * 3600
+RESULT_CACHE_SIZE = 1024
+query_cache = QueryEmbeddingCache(MODEL_NAME, QUERY_CACHE_SIZE, QUERY_CACHE_TTL, path=QUERY_CACHE_FILE)
+result_cache = ResultCache(RESULT_CACHE_SIZE)
+atexit.register(query_cache.save)
+
+
+def encode_query(query):
+    """Retorna o embedding normalizado da consulta, usando o cache LRU"""
+    return query_cache.get_or_encode(query, encode_text)
+
+
+@metrics.timed("query_encode_seconds")
+def encode_text(text):
+    """Chama o modelo para uma consulta (apenas quando ela não está no cache)"""
+    return get_model().encode(text, convert_to_numpy=True, normalize_embeddings=True)
+
+
+def encode_queries(queries):
+    """Codifica várias consultas, enviando ao modelo apenas as que não estão no cache (em um lote)"""
+    keys = [normalize_query(query) for query in queries]
+    cached = {key: query_cache.get(key) for key in dict.fromkeys(keys)}
+    missing = [key for key, embedding in cached.items() if embedding is None]
+
+    if missing:
+        start = time.perf_counter()
+        embeddings = get_model().encode(missing, convert_to_numpy=True, normalize_embeddings=True)
+        elapsed = time.perf_counter() - start
+        cost = elapsed / len(missing)
+        metrics.observe("query_encode_batch_seconds", elapsed)
+        metrics.inc("query_encoded_total", len(missing))
+        for key, embedding in zip(missing, embeddings):
+            cached[key] = query_cache.put(key, embedding, cost)
 
+    return np.stack([cached[key] for key in keys])
 
 
+def cache_stats():
+    """Métricas dos caches de consulta e de resultados"""
+    return {"query_embeddings": query_cache.stats(), "results": result_cache.stats()}
+
+
+@metrics.timed("index_load_seconds", index="documents")
 def load_embeddings():
-    """Carrega os embeddings armazenados e retorna nomes e vetores"""
-    if not os.path.exists(EMBEDDINGS_FILE):
-        print(f"Erro: Arquivo {EMBEDDINGS_FILE} não encontrado. Execute generate_embeddings.py primeiro.")
+    """Carrega os embeddings armazenados e retorna nomes e vetores
+
+    A matriz é mapeada em memória (sem cópia) a partir do armazenamento embeddings/document_embeddings.
+    Se houver um índice quantizado válido para ela (ann_index.py --kind int8/pq), ele é
+    retornado no lugar da matriz: a busca pontua os códigos e reordena só os melhores
+    candidatos com os vetores float.
+    """
+    if not store_exists(EMBEDDINGS_STORE):
+        print(f"Erro: Armazenamento {EMBEDDINGS_STORE} não encontrado. Execute generate_embeddings.py primeiro.")
         return None, None
 
-    with open(EMBEDDINGS_FILE, "rb") as f:
-        embeddings_dict = pickle.load(f)
+    doc_embeddings, meta = open_store(EMBEDDINGS_STORE)  # Matriz de embeddings (mmap)
+    doc_names = meta["ids"]  # Lista com os nomes dos documentos
 
-    doc_names = list(embeddings_dict.keys())  # Lista com os nomes dos documentos
-    doc_embeddings = np.array(list(embeddings_dict.values()))  # Matriz de embeddings
+    index = load_index(EMBEDDINGS_STORE, doc_embeddings, meta["version"])
+    if isinstance(index, QuantizedIndex):
+        doc_embeddings = index
 
     return doc_names, doc_embeddings
 
 
-def search(query, doc_names, doc_embeddings, top_n=5):
-    """Realiza busca semântica nos documentos e retorna os mais relevantes"""
+def embeddings_version():
+    """Versão atual do armazenamento de documentos (usada como chave do cache de resultados)"""
+    if not store_exists(EMBEDDINGS_STORE):
+        return None
+    return load_store_metadata(EMBEDDINGS_STORE)["version"]
+
+
+def passage_version():
+    """Versão atual do armazenamento de trechos (None se não existir)"""
+    if not store_exists(PASSAGE_STORE):
+        return None
+    return load_store_metadata(PASSAGE_STORE)["version"]
+
+
+@metrics.timed("index_load_seconds", index="passages")
+def load_passage_index():
+    """Carrega o índice de trechos (um vetor normalizado por trecho de documento)
+
+    Returns:
+        dict com "documents" (nomes), "doc_ids" (documento de cada trecho),
+        "offsets" (início, fim de cada trecho), "embeddings" (mmap), "version"
+        e "ann" (índice aproximado ou None), ou None se o índice não existir
+    """
+    if not store_exists(PASSAGE_STORE):
+        return None
+
+    embeddings, meta, arrays = open_store_arrays(PASSAGE_STORE, ["offsets"], {"offsets": PASSAGE_OFFSETS_FILE})
+    offsets = arrays["offsets"]
+    if offsets is None:
+        return None
+    documents = [doc["name"] for doc in meta["documents"]]
+    counts = [doc["count"] for doc in meta["documents"]]
+
+    return {
+        "documents": documents,
+        "doc_ids": np.repeat(np.arange(len(documents)), counts),
+        "offsets": offsets,
+        "embeddings": embeddings,
+        "version": meta["version"],
+        # Índice aproximado (None se não existir ou estiver desatualizado: busca exata)
+        "ann": load_index(PASSAGE_STORE, embeddings, meta["version"]),
+    }
+
+
+def aggregate_passage_scores(scores, doc_ids, n_docs, method="max", top_k=3):
+    """Agrega a similaridade dos trechos em uma pontuação por documento
+
+    Args:
+        scores: Similaridade de cada trecho com a consulta
+        doc_ids: Documento de cada trecho
+        n_docs: Número total de documentos
+        method: "max" (melhor trecho) ou "mean" (média dos top_k melhores trechos)
+        top_k: Trechos considerados por documento no método "mean"
+
+    Returns:
+        Array (n_docs,) com a pontuação de cada documento (-inf se não tiver trechos)
+    """
+    if method == "max":
+        doc_scores = np.full(n_docs, -np.inf, dtype=np.float32)
+        np.maximum.at(doc_scores, doc_ids, scores)
+        return doc_scores
+
+    if method != "mean":
+        raise ValueError("Método de agregação desconhecido. Use 'max' ou 'mean'.")
+
+    # Ordena por documento e, dentro dele, por pontuação decrescente para obter o rank de cada trecho
+    order = np.lexsort((-scores, doc_ids))
+    sorted_docs = doc_ids[order]
+    rank = np.arange(len(order)) - np.searchsorted(sorted_docs, sorted_docs, side="left")
+    keep = order[rank < top_k]
+
+    sums = np.bincount(doc_ids[keep], weights=scores[keep], minlength=n_docs)
+    counts = np.bincount(doc_ids[keep], minlength=n_docs)
+    return np.where(counts > 0, sums / np.maximum(counts, 1), -np.inf)
+
+
+def search_passages(query, passage_index, top_n=5, aggregate="max", top_k=3):
+    """Busca nos trechos e agrega os resultados por documento
+
+    Se o índice tiver um índice aproximado ("ann"), só os ANN_CANDIDATES trechos
+    mais próximos são pontuados e agregados; caso contrário a busca é exata.
+
+    Returns:
+        Lista de (documento, pontuação, (início, fim) do melhor trecho)
+    """
+    return rank_passages(encode_query(query), passage_index, top_n, aggregate, top_k)
+
+
+@metrics.timed("search_scoring_seconds", kind="passages")
+def rank_passages(query_embedding, passage_index, top_n=5, aggregate="max", top_k=3, scores=None):
+    """Pontua os trechos para um embedding de consulta e agrega por documento
+
+    Args:
+        scores: Similaridades já calculadas com todos os trechos (ex.: uma coluna do
+            produto matriz-matriz de search_many). Se None, são calculadas aqui.
+    """
+    ann = passage_index.get("ann")
+    if scores is not None:
+        rows = np.arange(len(scores))
+    elif ann is not None:
+        rows, scores = ann.search(query_embedding, max(ANN_CANDIDATES, top_n * top_k))
+        valid = rows[0] >= 0
+        rows, scores = rows[0][valid], scores[0][valid]
+    else:
+        # Vetores já normalizados: a similaridade de cosseno é um único produto matriz-vetor
+        scores = score(passage_index["embeddings"], query_embedding)
+        rows = np.arange(len(scores))
+
+    doc_ids = passage_index["doc_ids"][rows]
+    doc_scores = aggregate_passage_scores(scores, doc_ids, len(passage_index["documents"]), aggregate, top_k)
+
+    top_n = min(top_n, len(doc_scores))
+    if top_n <= 0:
+        return []
+    top_docs = np.argpartition(-doc_scores, top_n - 1)[:top_n]
+    top_docs = top_docs[np.argsort(-doc_scores[top_docs])]
+
+    # Melhor trecho de cada documento retornado
+    best_passage = {}
+    for i in np.flatnonzero(np.isin(doc_ids, top_docs)):
+        doc = doc_ids[i]
+        if doc not in best_passage or scores[i] > scores[best_passage[doc]]:
+            best_passage[doc] = i
+
+    return [
+        (passage_index["documents"][doc], float(doc_scores[doc]),
+         tuple(int(offset) for offset in passage_index["offsets"][rows[best_passage[doc]]]))
+        for doc in top_docs if doc in best_passage
+    ]
+
+
+def best_passage(query, doc_name, passage_index):
+    """(início, fim) do trecho do documento mais similar à consulta
+
+    Pontua só os trechos do documento (os trechos de cada documento são contíguos no índice).
+
+    Returns:
+        Tupla (início, fim), ou None se o documento não estiver no índice de trechos
+    """
+    try:
+        doc = passage_index["documents"].index(doc_name)
+    except ValueError:
+        return None
+
+    doc_ids = passage_index["doc_ids"]
+    first, last = np.searchsorted(doc_ids, doc, side="left"), np.searchsorted(doc_ids, doc, side="right")
+    if first == last:
+        return None
+    scores = score(passage_index["embeddings"][first:last], encode_query(query))
+    return tuple(int(offset) for offset in passage_index["offsets"][first + int(np.argmax(scores))])
+
+
+@metrics.timed("search_scoring_seconds", kind="documents")
+def rank_documents(query_embeddings, doc_embeddings, top_n=5):
+    """Pontua e seleciona os top_n documentos para uma ou mais consultas
+
+    Como a matriz do armazenamento já está normalizada, a similaridade de cosseno
+    é um único produto matriz-vetor (ou matriz-matriz para várias consultas) e os
+    top_n saem de uma seleção parcial (argpartition), sem ordenar todas as pontuações.
+
+    Args:
+        query_embeddings: Vetor (dimensão,) ou matriz (consultas, dimensão) normalizados
+        doc_embeddings: Matriz (documentos, dimensão) normalizada, ou um QuantizedIndex
+
+    Returns:
+        (índices, similaridades), ambos com forma (consultas, top_n)
+    """
+    query_embeddings = np.atleast_2d(query_embeddings)
+    if isinstance(doc_embeddings, QuantizedIndex):
+        return doc_embeddings.search(query_embeddings, top_n)
+    similarities = score(doc_embeddings, query_embeddings.T).T
+    return select_top_k(similarities, top_n)
+
+
+def fuse_rankings(rankings, top_n=5, k=RRF_K):
+    """Combina rankings (listas de documentos, do mais ao menos relevante) por rank recíproco (RRF)
+
+    Cada documento recebe a soma de 1 / (k + posição) nos rankings em que aparece.
+
+    Returns:
+        Lista de (documento, pontuação RRF) em ordem decrescente
+    """
+    fused = {}
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking, start=1):
+            fused[doc] = fused.get(doc, 0.0) + 1.0 / (k + rank)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)[:top_n]
+
+
+def hybrid_search(query, doc_names, doc_embeddings, lexical_index, top_n=5, mode="rrf", passage_index=None,
+                  aggregate="max", top_k=3, depth=HYBRID_DEPTH, candidates=LEXICAL_CANDIDATES):
+    """Busca combinando o índice BM25 (termos exatos) com a similaridade dos embeddings
+
+    Args:
+        lexical_index: Índice BM25 (ver lexical_index.load_lexical_index)
+        mode: "rrf" funde os `depth` primeiros de cada ranking por rank recíproco
+            (com passage_index, o ranking semântico vem dos trechos); "shortlist" usa
+            o BM25 como gerador de candidatos e pontua só os `candidates` primeiros
+            pelos embeddings dos documentos (sem termos em comum, a busca é completa)
+
+    Returns:
+        Lista de (documento, pontuação): RRF no modo "rrf", similaridade no modo "shortlist"
+    """
+    if mode not in HYBRID_MODES:
+        raise ValueError(f"Modo híbrido desconhecido. Use um de {HYBRID_MODES}.")
+
+    query_embedding = encode_query(query)
+
+    if mode == "shortlist":
+        lexical_docs, _ = lexical_index.search(query, candidates)
+        rows = lexical_index.align(doc_names)[lexical_docs]
+        rows = np.sort(rows[rows >= 0])
+        if len(rows) == 0:
+            top_indices, similarities = rank_documents(query_embedding, doc_embeddings, top_n)
+            return [(doc_names[i], float(similarities[0, j])) for j, i in enumerate(top_indices[0])]
+
+        top_rows, similarities = select_top_k(score(doc_embeddings[rows], query_embedding), top_n)
+        return [(doc_names[rows[i]], float(similarities[0, j])) for j, i in enumerate(top_rows[0])]
+
+    if passage_index is not None:
+        dense = [doc for doc, _, _ in rank_passages(query_embedding, passage_index, depth, aggregate, top_k)]
+    else:
+        top_indices, _ = rank_documents(query_embedding, doc_embeddings, depth)
+        dense = [doc_names[i] for i in top_indices[0]]
+
+    lexical_docs, _ = lexical_index.search(query, depth)
+    lexical = [lexical_index.names[i] for i in lexical_docs]
+    return fuse_rankings([dense, lexical], top_n)
+
+
+@metrics.profiled("search")
+@metrics.timed("search_seconds")
+def search(query, doc_names, doc_embeddings, top_n=5, passage_index=None, aggregate="max", top_k=3,
+           index_version=None, lexical_index=None, hybrid="rrf"):
+    """Realiza busca semântica nos documentos e retorna os mais relevantes
+
+    Se passage_index for informado (ver load_passage_index), a busca é feita nos
+    trechos dos documentos e agregada por documento com o método `aggregate`.
+    Com lexical_index, a busca é híbrida (ver hybrid_search, modo `hybrid`).
+    Os resultados ficam em cache por (consulta, parâmetros, versão do índice): a
+    versão vem do passage_index ou de `index_version` (sem versão, não há cache);
+    um resultado em cache é devolvido como tupla (somente leitura).
+    """
+    metrics.inc("search_queries_total",
+                mode="hybrid" if lexical_index is not None else "passages" if passage_index is not None else "documents")
+
+    if lexical_index is not None:
+        if doc_names is None or doc_embeddings is None:
+            print("Erro: Os embeddings não foram carregados corretamente.")
+            return []
+
+        def run_hybrid():
+            return hybrid_search(query, doc_names, doc_embeddings, lexical_index, top_n, hybrid,
+                                 passage_index, aggregate, top_k)
+
+        dense_version = passage_index["version"] if passage_index is not None else index_version
+        if dense_version is None:
+            return run_hybrid()
+        return result_cache.get_or_search("hybrid", query, (top_n, hybrid, aggregate, top_k),
+                                          f"{lexical_index.version}:{dense_version}", run_hybrid)
+
+    if passage_index is not None:
+        return result_cache.get_or_search(
+            "passages", query, (top_n, aggregate, top_k), passage_index["version"],
+            lambda: [(doc, score) for doc, score, _ in search_passages(query, passage_index, top_n, aggregate, top_k)])
+
     if doc_names is None or doc_embeddings is None:
         print("Erro: Os embeddings não foram carregados corretamente.")
         return []
 
-    # Gerar embedding da consulta
-    query_embedding = model.encode(query, convert_to_numpy=True)
+    def run_search():
+        # Gerar embedding (normalizado) da consulta
+        query_embedding = encode_query(query)
+
+        # Similaridade de cosseno + seleção dos mais relevantes (maior similaridade primeiro)
+        top_indices, similarities = rank_documents(query_embedding, doc_embeddings, top_n)
+        return [(doc_names[i], similarities[0, j]) for j, i in enumerate(top_indices[0])]
+
+    if index_version is None:
+        return run_search()
+    return result_cache.get_or_search("documents", query, (top_n,), index_version, run_search)
 
-    # Calcular similaridade de cosseno entre a consulta e os documentos
-    similarities = cosine_similarity([query_embedding], doc_embeddings)[0]
 
-    # Ordenar os resultados por relevância (maior similaridade primeiro)
-    top_indices = similarities.argsort()[-top_n:][::-1]
-    results = [(doc_names[i], similarities[i]) for i in top_indices]
+@metrics.profiled("search")
+@metrics.timed("search_batch_seconds")
+def search_many(queries, doc_names, doc_embeddings, top_n=5, passage_index=None, aggregate="max", top_k=3,
+                lexical_index=None, hybrid="rrf"):
+    """Busca várias consultas de uma vez: uma codificação em lote e um produto matriz-matriz
+
+    Com passage_index (sem índice aproximado), todos os trechos são pontuados para
+    todas as consultas em um único produto e agregados por documento. Com
+    lexical_index, as consultas são codificadas em lote e ranqueadas por hybrid_search.
+
+    Returns:
+        Lista com os resultados [(documento, similaridade), ...] de cada consulta
+    """
+    if len(queries) == 0:
+        return []
+    metrics.inc("search_queries_total", len(queries), mode="batch")
+
+    if lexical_index is not None:
+        if doc_names is None or doc_embeddings is None:
+            print("Erro: Os embeddings não foram carregados corretamente.")
+            return [[] for _ in queries]
+
+        encode_queries(queries)  # Preenche o cache de embeddings em um único lote
+        return [
+            hybrid_search(query, doc_names, doc_embeddings, lexical_index, top_n, hybrid,
+                          passage_index, aggregate, top_k)
+            for query in queries
+        ]
+
+    if passage_index is not None:
+        query_embeddings = encode_queries(queries)
+        all_scores = None
+        if passage_index.get("ann") is None:
+            all_scores = score(passage_index["embeddings"], query_embeddings.T)
+        return [
+            [(doc, doc_score) for doc, doc_score, _ in rank_passages(
+                query_embeddings[q], passage_index, top_n, aggregate, top_k,
+                scores=None if all_scores is None else all_scores[:, q])]
+            for q in range(len(queries))
+        ]
+
+    if doc_names is None or doc_embeddings is None:
+        print("Erro: Os embeddings não foram carregados corretamente.")
+        return [[] for _ in queries]
+
+    query_embeddings = encode_queries(queries)
+    top_indices, similarities = rank_documents(query_embeddings, doc_embeddings, top_n)
 
-    return results
+    return [
+        [(doc_names[i], similarities[q, j]) for j, i in enumerate(top_indices[q])]
+        for q in range(len(queries))
+    ]
 
 
 def display_document_content(doc_name):
@@ -65,16 +452,20 @@ def display_document_content(doc_name):
 
 if __name__ == "__main__":
     doc_names, doc_embeddings = load_embeddings()
+    passage_index = load_passage_index()
+    lexical_index = load_lexical_index(LEXICAL_INDEX)
 
     if doc_names is None or doc_embeddings is None:
         print("Erro: Não foi possível carregar os embeddings.")
     else:
         query = input("Digite sua busca: ")
-        results = search(query, doc_names, doc_embeddings)
+        results = search(query, doc_names, doc_embeddings, passage_index=passage_index, lexical_index=lexical_index)
 
         print("\n📌 Resultados mais relevantes:\n")
+        # Com o índice BM25 a busca é híbrida "rrf": a pontuação é a soma dos ranks recíprocos, não similaridade
+        score_label = "Pontuação RRF" if lexical_index is not None else "Similaridade"
         for doc, score in results:
-            print(f"🔹 {doc} → Similaridade: {score:.4f}")
+            print(f"🔹 {doc} → {score_label}: {score:.4f}")
 
         # Perguntar ao usuário se deseja visualizar o conteúdo dos documentos
         while True:
@@ -0,0 +1,294 @@
+import os
+import sys
+import time
+import asyncio
+import threading
+import argparse
+from aiohttp import web
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from src.search.semantic_search import (
+    load_embeddings, load_passage_index, embeddings_version, passage_version, search_many, cache_stats
+)
+from src.models.model_registry import get_model
+from src.monitoring import metrics
+
+HOST = "127.0.0.1"
+PORT = 8502
+
+# Micro-batching: consultas que chegam juntas viram uma codificação e um produto matricial
+MAX_BATCH = 64
+MAX_WAIT_MS = 5
+MAX_TOP_N = 100
+MAX_BATCH_QUERIES = 256     # Consultas aceitas em um único POST /search_batch
+RELOAD_CHECK_SECONDS = 2.0  # Intervalo mínimo entre verificações da versão dos armazenamentos
+
+
+class SearchIndex:
+    """Embeddings e índice de trechos servidos, reabertos quando os armazenamentos mudam de versão
+
+    Após cada regeneração (generate_embeddings) a versão no JSON do armazenamento muda;
+    ela é verificada a cada lote e em /health (no máximo a cada RELOAD_CHECK_SECONDS)
+    e o servidor passa a usar a versão nova sem reiniciar.
+    """
+
+    def __init__(self, check_interval=RELOAD_CHECK_SECONDS):
+        self.check_interval = check_interval
+        self.lock = threading.Lock()
+        self.reloads = 0
+        self.load()
+
+    def load(self):
+        versions = (embeddings_version(), passage_version())
+        doc_names, doc_embeddings = load_embeddings()
+        if doc_names is None:
+            raise FileNotFoundError("Embeddings não encontrados. Execute generate_embeddings.py primeiro.")
+        passage_index = load_passage_index()
+        # Troca tudo junto só depois de abrir a versão nova inteira
+        self.doc_names, self.doc_embeddings, self.passage_index = doc_names, doc_embeddings, passage_index
+        self.versions = versions
+        self.checked = time.monotonic()
+
+    @property
+    def version(self):
+        return self.passage_index["version"] if self.passage_index else self.versions[0]
+
+    def refresh(self):
+        """Reabre os armazenamentos se a versão mudou desde a última carga"""
+        with self.lock:
+            if time.monotonic() - self.checked < self.check_interval:
+                return
+            self.checked = time.monotonic()
+            try:
+                if (embeddings_version(), passage_version()) == self.versions:
+                    return
+                self.load()
+            except (OSError, ValueError, KeyError) as e:
+                # Regeneração em andamento ou armazenamento removido: segue com a versão anterior
+                print(f"⚠ Falha ao recarregar os índices ({e}). Mantendo a versão {self.version}.")
+                return
+            self.reloads += 1
+            print(f"🔄 Índices recarregados (versão {self.version})")
+
+    def run_batch(self, queries, top_n):
+        self.refresh()
+        with self.lock:
+            doc_names, doc_embeddings, passage_index = self.doc_names, self.doc_embeddings, self.passage_index
+        return search_many(queries, doc_names, doc_embeddings, top_n, passage_index=passage_index)
+
+
+class MicroBatcher:
+    """Agrupa consultas concorrentes em lotes processados por search_many
+
+    O primeiro pedido de um lote espera no máximo `max_wait_ms` por companhia;
+    o lote é fechado antes disso se chegar a `max_batch` consultas.
+    """
+
+    def __init__(self, run_batch, max_batch=MAX_BATCH, max_wait_ms=MAX_WAIT_MS):
+        self.run_batch = run_batch
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.queue = asyncio.Queue()
+        self.task = None
+        self.batches = 0
+        self.queries = 0
+
+    def start(self):
+        self.task = asyncio.create_task(self.loop())
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+
+    async def submit(self, query, top_n):
+        """Enfileira a consulta e aguarda seus resultados"""
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((query, top_n, future))
+        return await future
+
+    async def loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            queries = [query for query, _, _ in batch]
+            top_n = max(top_n for _, top_n, _ in batch)
+            try:
+                # Codificação e scoring fora do event loop, para continuar aceitando conexões
+                results = await loop.run_in_executor(None, self.run_batch, queries, top_n)
+            except Exception as e:
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            self.batches += 1
+            self.queries += len(batch)
+            for (_, n, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result[:n])
+
+
+def format_results(results):
+    return [{"doc": doc, "score": float(score)} for doc, score in results]
+
+
+async def read_json(request):
+    """Lê o corpo JSON da requisição, respondendo 400 se for inválido"""
+    try:
+        payload = await request.json()
+    except ValueError:
+        raise web.HTTPBadRequest(text="Corpo da requisição deve ser JSON")
+    if not isinstance(payload, dict):
+        raise web.HTTPBadRequest(text="Corpo da requisição deve ser um objeto JSON")
+    return payload
+
+
+def parse_top_n(payload):
+    top_n = payload.get("top_n", 5)
+    if not isinstance(top_n, int) or not 1 <= top_n <= MAX_TOP_N:
+        raise web.HTTPBadRequest(text=f"top_n deve estar entre 1 e {MAX_TOP_N}")
+    return top_n
+
+
+async def handle_search(request):
+    """POST /search {"query": str, "top_n": int} -> {"results": [{"doc", "score"}]}"""
+    payload = await read_json(request)
+    query = payload.get("query")
+    if not isinstance(query, str) or not query.strip():
+        raise web.HTTPBadRequest(text="Campo 'query' obrigatório")
+
+    results = await request.app["batcher"].submit(query, parse_top_n(payload))
+    return web.json_response({"results": format_results(results)})
+
+
+async def handle_search_batch(request):
+    """POST /search_batch {"queries": [str], "top_n": int} -> {"results": [[{"doc", "score"}]]}"""
+    payload = await read_json(request)
+    queries = payload.get("queries")
+    if not isinstance(queries, list) or not all(isinstance(q, str) and q.strip() for q in queries):
+        raise web.HTTPBadRequest(text="Campo 'queries' deve ser uma lista de consultas não vazias")
+    if len(queries) > MAX_BATCH_QUERIES:
+        # Um lote sem limite ocuparia o executor e atrasaria as consultas do micro-batching
+        raise web.HTTPRequestEntityTooLarge(MAX_BATCH_QUERIES, len(queries),
+                                            text=f"No máximo {MAX_BATCH_QUERIES} consultas por requisição")
+
+    top_n = parse_top_n(payload)
+    loop = asyncio.get_running_loop()
+    results = await loop.run_in_executor(None, request.app["run_batch"], queries, top_n)
+    return web.json_response({"results": [format_results(result) for result in results]})
+
+
+async def handle_health(request):
+    """GET /health -> estado do índice, caches e micro-batching (e dos shards, se houver)"""
+    batcher = request.app["batcher"]
+    index = request.app["index"]
+    health = {"status": "ok", "documents": 0, "passages": 0, "index_version": None}
+    if index is not None:
+        await asyncio.get_running_loop().run_in_executor(None, index.refresh)
+        passage_index = index.passage_index
+        health.update({
+            "documents": len(index.doc_names),
+            "passages": 0 if passage_index is None else len(passage_index["doc_ids"]),
+            "index_version": index.version,
+            "reloads": index.reloads,
+        })
+    health.update({
+        "uptime_s": time.monotonic() - request.app["started"],
+        "batches": batcher.batches,
+        "avg_batch_size": batcher.queries / batcher.batches if batcher.batches else 0.0,
+        "cache": cache_stats(),
+    })
+
+    coordinator = request.app["coordinator"]
+    if coordinator is not None:
+        loop = asyncio.get_running_loop()
+        shards = await loop.run_in_executor(None, coordinator.health)
+        health["shards"] = shards
+        health["documents"] = sum(shard["documents"] for shard in shards.values() if shard)
+        health["partial_batches"] = coordinator.partial_batches
+        if not all(shards.values()):
+            health["status"] = "degraded"
+    return web.json_response(health)
+
+
+async def handle_metrics(request):
+    """GET /metrics -> contadores e histogramas no formato de texto do Prometheus"""
+    return web.Response(text=metrics.registry.to_prometheus(), content_type="text/plain",
+                        headers={"X-Metrics-Format": "prometheus-0.0.4"})
+
+
+def create_app(max_batch=MAX_BATCH, max_wait_ms=MAX_WAIT_MS, collect_metrics=True, shards=None,
+               shard_timeout=None):
+    """Carrega modelo e índices uma única vez e monta a aplicação aiohttp
+
+    Com collect_metrics, as métricas do processo ficam disponíveis em GET /metrics.
+    Com `shards` (URLs dos processos de src/search/sharding.py), o servidor só codifica
+    as consultas e as distribui entre os shards (ver ShardCoordinator).
+    """
+    if collect_metrics:
+        metrics.enable()
+
+    coordinator = index = None
+    if shards:
+        from src.search.sharding import ShardCoordinator, SHARD_TIMEOUT
+
+        coordinator = ShardCoordinator(shards, shard_timeout or SHARD_TIMEOUT)
+        run_batch = coordinator.search_many
+    else:
+        try:
+            index = SearchIndex()
+        except FileNotFoundError:
+            raise SystemExit("Erro: embeddings não encontrados. Execute generate_embeddings.py primeiro.")
+        run_batch = index.run_batch
+
+    get_model()  # Carrega o modelo antes de aceitar a primeira consulta
+
+    app = web.Application()
+    app["index"] = index
+    app["coordinator"] = coordinator
+    app["run_batch"] = run_batch
+    app["batcher"] = MicroBatcher(run_batch, max_batch, max_wait_ms)
+    app["started"] = time.monotonic()
+
+    async def on_startup(app):
+        app["batcher"].start()
+
+    async def on_cleanup(app):
+        await app["batcher"].stop()
+
+    app.on_startup.append(on_startup)
+    app.on_cleanup.append(on_cleanup)
+    app.router.add_post("/search", handle_search)
+    app.router.add_post("/search_batch", handle_search_batch)
+    app.router.add_get("/health", handle_health)
+    app.router.add_get("/metrics", handle_metrics)
+    return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Servidor HTTP de busca semântica")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--max-batch", type=int, default=MAX_BATCH, help="Consultas por lote")
+    parser.add_argument("--max-wait-ms", type=float, default=MAX_WAIT_MS,
+                        help="Espera máxima (ms) para formar um lote")
+    parser.add_argument("--no-metrics", action="store_true", help="Não coleta métricas (/metrics fica vazio)")
+    parser.add_argument("--shards", nargs="+", default=None,
+                        help="URLs dos shards (sharding.py serve): o servidor vira o coordenador")
+    parser.add_argument("--shard-timeout", type=float, default=None, help="Espera máxima (s) por shard")
+    args = parser.parse_args()
+
+    print(f"🌐 Servidor de busca em http://{args.host}:{args.port} (/search, /search_batch, /health, /metrics)")
+    web.run_app(create_app(args.max_batch, args.max_wait_ms, not args.no_metrics, args.shards, args.shard_timeout),
+                host=args.host, port=args.port, print=None)
@@ -0,0 +1,294 @@
+import os
+import sys
+import time
+import heapq
+import base64
+import asyncio
+import hashlib
+import argparse
+import subprocess
+from concurrent.futures import ThreadPoolExecutor, wait
+import numpy as np
+import requests
+from aiohttp import web
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from src.search.embedding_store import open_store, save_store, store_exists, load_store_metadata
+from src.search.ann_index import load_index
+from src.search.quantization import QuantizedIndex
+from src.search.server import read_json, parse_top_n, format_results
+from src.monitoring import metrics
+
+# Índice de documentos dividido em shards pelo hash do nome do documento; cada shard é um
+# armazenamento comum (embedding_store) servido por um processo próprio (nesta ou em outra máquina)
+EMBEDDINGS_STORE = "embeddings/document_embeddings"
+SHARDS_FOLDER = "embeddings/shards/"
+HOST = "127.0.0.1"
+SHARD_PORT = 8610         # Porta do shard 0; o shard i usa SHARD_PORT + i
+SHARD_TIMEOUT = 2.0       # Segundos de espera por shard: quem não responder fica fora do resultado
+STARTUP_TIMEOUT = 60      # Segundos para os processos locais começarem a responder
+
+
+def shard_of(name, n_shards):
+    """Shard do documento pelo hash do nome (estável: um documento editado continua no mesmo shard)"""
+    return int(hashlib.sha1(name.encode("utf-8")).hexdigest()[:8], 16) % n_shards
+
+
+def shard_prefix(shard, n_shards, folder=SHARDS_FOLDER):
+    """Prefixo do armazenamento do shard (ex.: embeddings/shards/documents-001-of-004)"""
+    return os.path.join(folder, f"documents-{shard:03d}-of-{n_shards:03d}")
+
+
+def build_shards(n_shards, source=EMBEDDINGS_STORE, folder=SHARDS_FOLDER):
+    """Divide o armazenamento de documentos em n_shards armazenamentos
+
+    Cada shard guarda a origem e a versão dela (source, source_version), para
+    detectar shards desatualizados depois que os embeddings forem regenerados.
+
+    Returns:
+        Lista com o prefixo de cada shard
+    """
+    matrix, meta = open_store(source)
+    names = meta["ids"]
+    hashes = meta.get("hashes") or [None] * len(names)
+    assignment = np.array([shard_of(name, n_shards) for name in names], dtype=np.int64)
+
+    prefixes = []
+    for shard in range(n_shards):
+        rows = np.flatnonzero(assignment == shard)
+        prefix = shard_prefix(shard, n_shards, folder)
+        save_store(prefix, np.asarray(matrix[rows], dtype=np.float32).reshape(len(rows), matrix.shape[1]),
+                   ids=[names[i] for i in rows], dtype=meta["dtype"], model=meta.get("model"),
+                   hashes=[hashes[i] for i in rows], shard=shard, n_shards=n_shards, source=source,
+                   source_version=meta["version"])
+        prefixes.append(prefix)
+        print(f"🧱 Shard {shard + 1}/{n_shards}: {len(rows)} documentos em {prefix}")
+    return prefixes
+
+
+def encode_embeddings(embeddings):
+    """Matriz float32 em base64, para enviar as consultas aos shards em JSON sem perder precisão"""
+    return base64.b64encode(np.ascontiguousarray(embeddings, dtype=np.float32).tobytes()).decode("ascii")
+
+
+def decode_embeddings(data, dimension):
+    return np.frombuffer(base64.b64decode(data), dtype=np.float32).reshape(-1, dimension)
+
+
+def search_shard(doc_names, doc_embeddings, query_embeddings, top_n):
+    """top_n documentos do shard para cada consulta: [[(documento, similaridade), ...], ...]"""
+    from src.search.semantic_search import rank_documents
+
+    if len(doc_names) == 0:
+        return [[] for _ in query_embeddings]
+    top_indices, similarities = rank_documents(query_embeddings, doc_embeddings, top_n)
+    return [[(doc_names[i], similarities[q, j]) for j, i in enumerate(top_indices[q])]
+            for q in range(len(query_embeddings))]
+
+
+async def handle_shard_search(request):
+    """POST /shard_search {"embeddings": base64, "dimension": int, "top_n": int} -> {"results": [[...]]}"""
+    payload = await read_json(request)
+    app = request.app
+    try:
+        query_embeddings = decode_embeddings(payload["embeddings"], payload["dimension"])
+    except (KeyError, TypeError, ValueError):
+        raise web.HTTPBadRequest(text="Campos 'embeddings' (base64 float32) e 'dimension' obrigatórios")
+    if query_embeddings.shape[1] != app["dimension"]:
+        raise web.HTTPBadRequest(text=f"Dimensão deve ser {app['dimension']}")
+
+    loop = asyncio.get_running_loop()
+    results = await loop.run_in_executor(None, search_shard, app["doc_names"], app["doc_embeddings"],
+                                         query_embeddings, parse_top_n(payload))
+    return web.json_response({"shard": app["shard"], "results": [format_results(result) for result in results]})
+
+
+async def handle_shard_health(request):
+    """GET /health -> shard, número de documentos e versões"""
+    app = request.app
+    return web.json_response({"status": "ok", "shard": app["shard"], "n_shards": app["n_shards"],
+                              "documents": len(app["doc_names"]), "version": app["version"],
+                              "source_version": app["source_version"]})
+
+
+def create_shard_app(shard, n_shards, folder=SHARDS_FOLDER):
+    """Carrega o armazenamento do shard (mmap, ou o índice quantizado se houver) e monta o app aiohttp"""
+    prefix = shard_prefix(shard, n_shards, folder)
+    if not store_exists(prefix):
+        raise SystemExit(f"Erro: shard {prefix} não encontrado. Execute `sharding.py build --shards {n_shards}`.")
+
+    matrix, meta = open_store(prefix)
+    index = load_index(prefix, matrix, meta["version"])
+    source = meta["source"]
+    if store_exists(source) and load_store_metadata(source)["version"] != meta["source_version"]:
+        print(f"⚠ Shard {prefix} desatualizado em relação a {source}. Refaça os shards.")
+
+    app = web.Application()
+    app["shard"] = shard
+    app["n_shards"] = n_shards
+    app["doc_names"] = meta["ids"]
+    app["doc_embeddings"] = index if isinstance(index, QuantizedIndex) else matrix
+    app["dimension"] = meta["dimension"]
+    app["version"] = meta["version"]
+    app["source_version"] = meta["source_version"]
+    app.router.add_post("/shard_search", handle_shard_search)
+    app.router.add_get("/health", handle_shard_health)
+    return app
+
+
+class ShardCoordinator:
+    """Envia cada lote de consultas a todos os shards em paralelo e junta os top-k
+
+    Os shards que não respondem em `timeout` segundos (ou falham) ficam de fora: o
+    resultado é parcial, mas a latência fica limitada pelo timeout e não pelo shard
+    mais lento.
+    """
+
+    def __init__(self, endpoints, timeout=SHARD_TIMEOUT):
+        self.endpoints = list(endpoints)
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_maxsize=max(10, 4 * len(self.endpoints)))
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.pool = ThreadPoolExecutor(max_workers=4 * len(self.endpoints))
+        self.partial_batches = 0
+
+    def query_shard(self, endpoint, payload):
+        response = self.session.post(f"{endpoint}/shard_search", json=payload, timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()["results"]
+
+    def search_embeddings(self, query_embeddings, top_n=5):
+        """Busca consultas já codificadas (consultas, dimensão) em todos os shards
+
+        Returns:
+            (resultados [(documento, similaridade), ...] de cada consulta, shards que ficaram de fora)
+        """
+        query_embeddings = np.atleast_2d(query_embeddings).astype(np.float32)
+        payload = {"embeddings": encode_embeddings(query_embeddings), "dimension": query_embeddings.shape[1],
+                   "top_n": top_n}
+
+        futures = {self.pool.submit(self.query_shard, endpoint, payload): endpoint for endpoint in self.endpoints}
+        done, pending = wait(futures, timeout=self.timeout)
+
+        merged = [[] for _ in query_embeddings]
+        missing = [futures[future] for future in pending]
+        for future in done:
+            try:
+                shard_results = future.result()
+            except (requests.RequestException, ValueError, KeyError):
+                missing.append(futures[future])
+                continue
+            for results, shard_result in zip(merged, shard_results):
+                results.extend((item["doc"], item["score"]) for item in shard_result)
+
+        if missing:
+            self.partial_batches += 1
+            for endpoint in missing:
+                metrics.inc("shard_missing_total", shard=endpoint)
+        return [heapq.nlargest(top_n, results, key=lambda item: item[1]) for results in merged], missing
+
+    def search_many(self, queries, top_n=5):
+        """Codifica as consultas (em lote, com cache) e busca em todos os shards, como search_many"""
+        from src.search.semantic_search import encode_queries
+
+        results, missing = self.search_embeddings(encode_queries(queries), top_n)
+        if missing:
+            print(f"⚠ Resultado parcial: sem resposta de {', '.join(missing)}")
+        return results
+
+    def health(self):
+        """/health de cada shard (None para os que não responderem)"""
+        def fetch(endpoint):
+            try:
+                response = self.session.get(f"{endpoint}/health", timeout=self.timeout)
+                response.raise_for_status()
+                return response.json()
+            except requests.RequestException:
+                return None
+        return dict(zip(self.endpoints, self.pool.map(fetch, self.endpoints)))
+
+
+def start_local_shards(n_shards, folder=SHARDS_FOLDER, port=SHARD_PORT, host=HOST):
+    """Sobe um processo por shard nesta máquina e espera todos responderem
+
+    Cada processo usa uma thread de BLAS, para que N shards ocupem N núcleos sem
+    disputar a CPU.
+
+    Returns:
+        (processos, endpoints)
+    """
+    env = dict(os.environ, OMP_NUM_THREADS="1", OPENBLAS_NUM_THREADS="1", MKL_NUM_THREADS="1")
+    processes, endpoints = [], []
+    for shard in range(n_shards):
+        command = [sys.executable, os.path.abspath(__file__), "serve", "--shard", str(shard), "--shards",
+                   str(n_shards), "--folder", folder, "--host", host, "--port", str(port + shard)]
+        processes.append(subprocess.Popen(command, env=env))
+        endpoints.append(f"http://{host}:{port + shard}")
+
+    deadline = time.monotonic() + STARTUP_TIMEOUT
+    for process, endpoint in zip(processes, endpoints):
+        while True:
+            try:
+                requests.get(f"{endpoint}/health", timeout=1).raise_for_status()
+                break
+            except requests.RequestException:
+                if process.poll() is not None or time.monotonic() > deadline:
+                    stop_shards(processes)
+                    raise RuntimeError(f"O shard em {endpoint} não iniciou.")
+                time.sleep(0.2)
+    return processes, endpoints
+
+
+def stop_shards(processes):
+    """Encerra os processos dos shards locais"""
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Índice de documentos dividido em shards")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build_parser = subparsers.add_parser("build", help="Divide o armazenamento de documentos em shards")
+    build_parser.add_argument("--shards", type=int, required=True)
+    build_parser.add_argument("--folder", default=SHARDS_FOLDER)
+
+    serve_parser = subparsers.add_parser("serve", help="Serve um shard por HTTP")
+    serve_parser.add_argument("--shard", type=int, required=True)
+    serve_parser.add_argument("--shards", type=int, required=True)
+    serve_parser.add_argument("--folder", default=SHARDS_FOLDER)
+    serve_parser.add_argument("--host", default=HOST)
+    serve_parser.add_argument("--port", type=int, default=None, help="Padrão: SHARD_PORT + shard")
+
+    local_parser = subparsers.add_parser("local", help="Sobe todos os shards nesta máquina e busca pelo terminal")
+    local_parser.add_argument("--shards", type=int, required=True)
+    local_parser.add_argument("--folder", default=SHARDS_FOLDER)
+    local_parser.add_argument("--timeout", type=float, default=SHARD_TIMEOUT)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        build_shards(args.shards, folder=args.folder)
+    elif args.command == "serve":
+        port = args.port if args.port is not None else SHARD_PORT + args.shard
+        print(f"🧱 Shard {args.shard + 1}/{args.shards} em http://{args.host}:{port}")
+        web.run_app(create_shard_app(args.shard, args.shards, args.folder), host=args.host, port=port, print=None)
+    else:
+        processes, endpoints = start_local_shards(args.shards, args.folder)
+        coordinator = ShardCoordinator(endpoints, args.timeout)
+        try:
+            while True:
+                query = input("\n🔍 Digite sua consulta (ou 'sair' para encerrar): ").strip()
+                if query.lower() == "sair":
+                    break
+                for doc, similarity in coordinator.search_many([query])[0]:
+                    print(f"📄 {doc} (Similaridade: {similarity:.4f})")
+        finally:
+            stop_shards(processes)
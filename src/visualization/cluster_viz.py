@@ -1,252 +1,512 @@
 import os
-import pickle
+import sys
+import importlib.util
 import numpy as np
-import matplotlib.pyplot as plt
-from sklearn.manifold import TSNE
-from sklearn.decomposition import PCA
-from sklearn.cluster import KMeans
-from scipy.spatial import ConvexHull
-import umap
 
-# Caminho do arquivo de embeddings
-EMBEDDINGS_FILE = "embeddings/document_embeddings.pkl"
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from src.search.embedding_store import open_store, store_exists, load_store_metadata
+from src.visualization.projection_cache import cached_array
+from src.processing.clustering import fit_clusters, predict_labels, choose_k, K_RANGE, K_CRITERION
+from src.visualization.reducer import get_reducer, REDUCER_METHODS
+from src.monitoring import metrics
+
+# Armazenamento de embeddings (<prefixo>.json + matriz versionada, ver embedding_store.py)
+EMBEDDINGS_STORE = "embeddings/document_embeddings"
+PROCESSED_DOCS_FOLDER = "data/processed/"
+
+# Palavras ignoradas nos rótulos dos clusters extraídos dos nomes dos arquivos
+STOP_WORDS = {"and", "the", "to", "of", "in", "for", "on", "with", "by", "a",
+              "an", "is", "it", "are", "this", "that", "there", "their"}
+KEYWORD_VOCABULARY = 50000     # Termos mantidos no TF-IDF do conteúdo
+NAME_SEPARATOR = "\x00"
+
+# Acima deste número de pontos o gráfico estático vira uma imagem de densidade (um artista só)
+SCATTER_MAX_POINTS = 50000
+SHADE_BINS = 600
+# O gráfico interativo (WebGL) usa o plotly, opcional
+INTERACTIVE_AVAILABLE = importlib.util.find_spec("plotly") is not None
+
 
 def load_embeddings():
     """Carrega os embeddings armazenados"""
-    if not os.path.exists(EMBEDDINGS_FILE):
-        print(f"Erro: Arquivo {EMBEDDINGS_FILE} não encontrado. Execute generate_embeddings.py primeiro.")
+    if not store_exists(EMBEDDINGS_STORE):
+        print(f"Erro: Armazenamento {EMBEDDINGS_STORE} não encontrado. Execute generate_embeddings.py primeiro.")
         return None, None
 
-    with open(EMBEDDINGS_FILE, "rb") as f:
-        embeddings_dict = pickle.load(f)
+    doc_embeddings, meta = open_store(EMBEDDINGS_STORE)
+    doc_names = meta["ids"]
+
+    # Os algoritmos de projeção e clustering trabalham em float32
+    return doc_names, np.asarray(doc_embeddings, dtype=np.float32)
+
 
-    doc_names = list(embeddings_dict.keys())
-    doc_embeddings = np.array(list(embeddings_dict.values()))
+def projection_params(reduction_method, n_docs, grouped=False):
+    """Parâmetros da projeção 2D (também usados como chave do cache). None se o método for desconhecido"""
+    if not grouped:
+        return {"tsne": {"perplexity": 30, "random_state": 42},
+                "umap": {"random_state": 42},
+                "pca": {}}.get(reduction_method)
+
+    # Na visualização por clusters há uma redução intermediária para 10D antes da projeção,
+    # com parâmetros ajustados para maximizar a separação
+    params = {"pca_components": 10}
+    if reduction_method == "tsne":
+        # Aumentar perplexity e early_exaggeration ajuda na separação dos clusters
+        params.update(perplexity=min(40, n_docs // 5), early_exaggeration=20, random_state=42)
+    elif reduction_method == "umap":
+        # Aumentar n_neighbors amplia a visão global e minimal_dist força mais separação
+        params.update(n_neighbors=min(30, n_docs // 3), min_dist=0.3, random_state=42)
+    elif reduction_method != "pca":
+        return None
+    return params
 
-    return doc_names, doc_embeddings
 
-def plot_clean_embeddings(doc_embeddings, reduction_method):
+def compute_projection(doc_embeddings, reduction_method, params, n_jobs=1):
+    """Projeta os embeddings em 2D com o método e os parâmetros de projection_params"""
+    from sklearn.decomposition import PCA
+
+    print(f"Reduzindo dimensionalidade com {reduction_method.upper()}...")
+
+    # Redução intermediária: ajuda a preservar mais informações antes da projeção final 2D
+    data = doc_embeddings
+    if "pca_components" in params and doc_embeddings.shape[1] > params["pca_components"]:
+        data = PCA(n_components=params["pca_components"]).fit_transform(doc_embeddings)
+
+    if reduction_method == "tsne":
+        from sklearn.manifold import TSNE
+        return TSNE(n_components=2, perplexity=params["perplexity"],
+                    early_exaggeration=params.get("early_exaggeration", 12.0),
+                    random_state=params["random_state"], n_jobs=n_jobs).fit_transform(data)
+    if reduction_method == "umap":
+        import umap  # O import do umap (numba) leva alguns segundos
+        extra = {key: params[key] for key in ("n_neighbors", "min_dist") if key in params}
+        return umap.UMAP(n_components=2, random_state=params["random_state"], **extra).fit_transform(data)
+    return PCA(n_components=2).fit_transform(data)
+
+
+def project_embeddings(doc_embeddings, reduction_method, index_version=None, grouped=False):
+    """Projeção 2D dos embeddings, em cache por (versão do índice, método, parâmetros)
+
+    Returns:
+        Array (documentos, 2), ou None se o método for desconhecido
+    """
+    params = projection_params(reduction_method, len(doc_embeddings), grouped)
+    if params is None:
+        print("Método desconhecido. Use 'tsne', 'umap' ou 'pca'.")
+        return None
+
+    kind = "grouped_projection" if grouped else "projection"
+    return cached_array(kind, index_version, reduction_method, params,
+                        lambda: compute_projection(doc_embeddings, reduction_method, params,
+                                                   n_jobs=-1 if grouped else 1))
+
+
+def cluster_documents(doc_embeddings, n_clusters=None, index_version=None):
+    """Rótulos do K-means, em cache por (versão do índice, n_clusters): independem da projeção
+
+    Se n_clusters for None, o número de clusters é escolhido em uma amostra (ver clustering.choose_k).
+    Corpora grandes usam o K-means mini-batch em blocos (ver clustering.fit_clusters).
+    """
+    if n_clusters is None:
+        params = {"k_values": list(K_RANGE), "criterion": K_CRITERION}
+        n_clusters = int(cached_array("k_selection", index_version, K_CRITERION, params,
+                                      lambda: choose_k(doc_embeddings, K_RANGE, K_CRITERION)[0]))
+
+    params = {"n_clusters": n_clusters, "random_state": 42}
+
+    def fit():
+        print(f"Agrupando documentos em {n_clusters} clusters...")
+        return predict_labels(fit_clusters(doc_embeddings, n_clusters), doc_embeddings)
+
+    return cached_array("clusters", index_version, "kmeans", params, fit)
+
+
+@metrics.profiled("plot")
+@metrics.timed("plot_seconds", kind="simple")
+def plot_clean_embeddings(doc_embeddings, reduction_method, index_version=None):
     """Reduz a dimensionalidade dos embeddings e plota os clusters
     
     Args:
         doc_names: Lista com os nomes dos documentos
         doc_embeddings: Array com os embeddings dos documentos
         reduction_method: Método de redução de dimensionalidade ("tsne", "umap" ou "pca")
+        index_version: Versão do armazenamento de embeddings; com ela a projeção fica em cache
         
     Returns:
         fig: Figura matplotlib com o gráfico gerado
     """
+    # Imports pesados adiados para o momento do gráfico (não atrasam o início do dashboard)
+    import matplotlib.pyplot as plt
 
     if doc_embeddings is None or len(doc_embeddings) == 0:
         print("Erro: Nenhum embedding disponível para visualização.")
         return None
 
-    print(f"Reduzindo dimensionalidade com {reduction_method.upper()}...")
-
-    if reduction_method == "tsne":
-        reduced_embeddings = TSNE(n_components=2, perplexity=30, random_state=42, n_jobs=1).fit_transform(
-            doc_embeddings)
-
-    elif reduction_method == "umap":
-        reduced_embeddings = umap.UMAP(n_components=2, random_state=42).fit_transform(doc_embeddings)
-    elif reduction_method == "pca":
-        reduced_embeddings = PCA(n_components=2).fit_transform(doc_embeddings)
-    else:
-        print("Método desconhecido. Use 'tsne', 'umap' ou 'pca'.")
+    reduced_embeddings = project_embeddings(doc_embeddings, reduction_method, index_version)
+    if reduced_embeddings is None:
         return None
 
     # Criar o gráfico
     fig, ax = plt.subplots(figsize=(12, 8))
-    scatter = ax.scatter(reduced_embeddings[:, 0], reduced_embeddings[:, 1], alpha=0.7)
-
+    ax.scatter(reduced_embeddings[:, 0], reduced_embeddings[:, 1], alpha=0.7)
 
     plt.title(f"Visualização de Clusters ({reduction_method.upper()})")
     plt.xlabel("Componente 1")
     plt.ylabel("Componente 2")
     plt.tight_layout()
-    
+
     return fig
 
-def plot_grouped_embeddings(doc_names, doc_embeddings, reduction_method, n_clusters=None):
-    """Agrupa os documentos automaticamente por similaridade e plota os clusters
-    
-    Args:
-        doc_names: Lista com os nomes dos documentos
-        doc_embeddings: Array com os embeddings dos documentos
-        reduction_method: Método de redução de dimensionalidade ("tsne", "umap" ou "pca")
-        n_clusters: Número de clusters para agrupar os documentos. Se None, será otimizado
+def read_texts(doc_names, folder=PROCESSED_DOCS_FOLDER):
+    """Conteúdo dos documentos processados (vazio se o arquivo não existir)"""
+    texts = []
+    for name in doc_names:
+        path = os.path.join(folder, name)
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                texts.append(f.read())
+        else:
+            texts.append("")
+    return texts
+
+
+def cluster_keywords(doc_names, cluster_labels, n_clusters, texts=None, top_n=3):
+    """Palavras-chave de cada cluster, contadas de uma vez para todos os clusters
+
+    Sem `texts`, conta as palavras dos nomes dos arquivos com um único np.unique sobre
+    os pares (cluster, palavra); com `texts`, compara o TF-IDF médio do conteúdo de
+    cada cluster com o do corpus (uma multiplicação pela matriz esparsa de pertinência).
 
     Returns:
-        fig: Figura matplotlib com o gráfico gerado
+        Lista com o rótulo de cada cluster ("palavra, palavra, palavra" ou "Cluster i")
     """
-    if doc_embeddings is None or len(doc_embeddings) == 0 or doc_names is None or len(doc_names) == 0:
-        print("Erro: Nenhum embedding disponível para visualização.")
-        return None
-    
-    # Aplicar K-means para determinar os clusters
-    print(f"Agrupando documentos em {n_clusters} clusters...")
-    kmeans = KMeans(n_clusters=n_clusters, random_state=42, n_init=10)
-    cluster_labels = kmeans.fit_predict(doc_embeddings)
-    
-    print(f"Reduzindo dimensionalidade com {reduction_method.upper()}...")
-    
-    # Primeiro passo: redução para dimensionalidade intermediária (10D)
-    # Isso ajuda a preservar mais informações antes da projeção final 2D
-    if doc_embeddings.shape[1] > 10:  # Se a dimensionalidade original for maior que 10
-        pca_embed = PCA(n_components=10).fit_transform(doc_embeddings)
-    else:
-        pca_embed = doc_embeddings.copy()
-    
-    # Reduzir dimensionalidade com o método escolhido, com parâmetros ajustados para maximizar separação
-    if reduction_method == "tsne":
-        # Aumentar perplexity e early_exaggeration ajuda na separação dos clusters
-        reduced_embeddings = TSNE(
-            n_components=2, 
-            perplexity=min(40, len(doc_embeddings)//5), 
-            early_exaggeration=20,
-            random_state=42, 
-            n_jobs=-1
-        ).fit_transform(pca_embed)
-    elif reduction_method == "umap":
-        # Aumentar n_neighbors amplia a visão global e minimal_dist força mais separação
-        reduced_embeddings = umap.UMAP(
-            n_components=2, 
-            n_neighbors=min(30, len(doc_embeddings)//3),
-            min_dist=0.3,
-            random_state=42
-        ).fit_transform(pca_embed)
-    elif reduction_method == "pca":
-        reduced_embeddings = PCA(n_components=2).fit_transform(pca_embed)
+    cluster_labels = np.asarray(cluster_labels, dtype=np.int64)
+
+    if texts is not None:
+        from scipy.sparse import csr_matrix
+        from sklearn.feature_extraction.text import TfidfVectorizer
+
+        vectorizer = TfidfVectorizer(stop_words="english", token_pattern=r"(?u)\b[^\W\d_]\w{2,}\b",
+                                     max_features=KEYWORD_VOCABULARY, max_df=0.5, sublinear_tf=True,
+                                     dtype=np.float32)
+        try:
+            matrix = vectorizer.fit_transform(texts)
+        except ValueError:
+            # Vocabulário vazio (nenhum documento com palavras válidas)
+            return [f"Cluster {i + 1}" for i in range(n_clusters)]
+        membership = csr_matrix((np.ones(len(cluster_labels), dtype=np.float32),
+                                 (cluster_labels, np.arange(len(cluster_labels)))),
+                                shape=(n_clusters, len(cluster_labels)))
+        # TF-IDF médio do cluster menos o do corpus: termos que distinguem o cluster dos demais
+        sizes = np.maximum(np.bincount(cluster_labels, minlength=n_clusters), 1)[:, None]
+        totals = (membership @ matrix).toarray() / sizes - np.asarray(matrix.mean(axis=0))
+        vocabulary = vectorizer.get_feature_names_out()
     else:
-        print("Método desconhecido. Use 'tsne', 'umap' ou 'pca'.")
-        return None
-    
-    # Expandir a visualização para evitar sobreposição
-    # Multiplicamos as coordenadas por um fator para aumentar a separação
-    scale_factor = 1.5
-    reduced_embeddings *= scale_factor
-    
-    # Extrair palavras-chave das principais categorias
-    cluster_keywords = {}
-    for cluster_id in range(n_clusters):
-        docs_in_cluster = [doc_names[i] for i in range(len(doc_names)) if cluster_labels[i] == cluster_id]
-        
-        # Extrair palavras-chave do nome dos documentos
-        all_words = []
-        for doc in docs_in_cluster:
-            # Limpar o nome do arquivo
-            clean_doc = doc.replace('.txt', '').replace('_', ' ')
-            all_words.extend(clean_doc.split())
-        
-        # Encontrar as palavras mais frequentes (excluindo palavras comuns)
-        word_freq = {}
-        stop_words = {"and", "the", "to", "of", "in", "for", "on", "with", "by", "a", 
-                      "an", "is", "it", "are", "this", "that", "there", "their"}
-        for word in all_words:
-            if word.lower() not in stop_words and len(word) > 2:
-                word_freq[word.lower()] = word_freq.get(word.lower(), 0) + 1
-        
-        # Selecionar as 3 palavras mais frequentes para representar o cluster
-        top_words = sorted(word_freq.items(), key=lambda x: x[1], reverse=True)[:3]
-        if top_words:
-            cluster_keywords[cluster_id] = ", ".join(word for word, _ in top_words)
-        else:
-            cluster_keywords[cluster_id] = f"Cluster {cluster_id+1}"
-    
+        # Todos os nomes em uma única string: um split e um dict para o corpus inteiro, com um
+        # separador (não é espaço em branco) marcando o fim de cada documento
+        words = f" {NAME_SEPARATOR} ".join(doc_names).replace(".txt", "").replace("_", " ").lower().split()
+        vocabulary = list(dict.fromkeys(words))  # Ordem da primeira ocorrência
+        index = dict(zip(vocabulary, range(len(vocabulary))))
+        word_ids = np.fromiter(map(index.__getitem__, words), dtype=np.int64, count=len(words))
+        vocabulary = np.array(vocabulary, dtype=object)
+        valid = np.array([word not in STOP_WORDS and len(word) > 2 and word != NAME_SEPARATOR
+                          for word in vocabulary], dtype=bool)
+
+        # Documento de cada palavra = número de separadores antes dela
+        word_labels = cluster_labels[np.cumsum(word_ids == index.get(NAME_SEPARATOR, -1))]
+        keep = valid[word_ids]
+        word_ids, word_labels = word_ids[keep], word_labels[keep]
+
+        # Pares (cluster, palavra) contados de uma vez; empates desfeitos pela primeira ocorrência no cluster
+        size = max(len(vocabulary), 1)
+        pairs = word_labels * size + word_ids
+        unique, first, counts = np.unique(pairs, return_index=True, return_counts=True)
+        clusters = unique // size
+        order = np.lexsort((first, -counts, clusters))
+        bounds = np.searchsorted(clusters[order], np.arange(n_clusters + 1))
+
+        keywords = []
+        for i in range(n_clusters):
+            top = unique[order[bounds[i]:min(bounds[i] + top_n, bounds[i + 1])]] % size
+            keywords.append(", ".join(vocabulary[top]) if len(top) else f"Cluster {i + 1}")
+        return keywords
+
+    keywords = []
+    for i, row in enumerate(totals):
+        top = [j for j in np.argsort(-row, kind="stable")[:top_n] if row[j] > 0]
+        keywords.append(", ".join(vocabulary[top]) if top else f"Cluster {i + 1}")
+    return keywords
+
+
+def cluster_centroids(points, cluster_labels, n_clusters):
+    """Centroide 2D e tamanho de cada cluster (clusters vazios ficam com centroide NaN)"""
+    counts = np.bincount(cluster_labels, minlength=n_clusters)
+    sums = np.stack([np.bincount(cluster_labels, weights=points[:, d], minlength=n_clusters) for d in range(2)],
+                    axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return sums / counts[:, None], counts
+
+
+def shade_points(ax, points, cluster_labels, colors, bins=SHADE_BINS):
+    """Desenha os pontos como uma imagem de densidade (um único artista, em qualquer N)
+
+    Cada pixel recebe a cor do cluster mais frequente nele e opacidade proporcional
+    ao log do número de pontos.
+    """
+    n_clusters = len(colors)
+    low, high = points.min(axis=0), points.max(axis=0)
+    span = np.maximum(high - low, 1e-9)
+    cells = np.minimum(((points - low) / span * bins).astype(np.int64), bins - 1)
+
+    flat = (cluster_labels.astype(np.int64) * bins + cells[:, 1]) * bins + cells[:, 0]
+    counts = np.bincount(flat, minlength=n_clusters * bins * bins).reshape(n_clusters, bins, bins)
+    total = counts.sum(axis=0)
+
+    image = colors[counts.argmax(axis=0)].copy()
+    image[..., 3] = np.where(total > 0, 0.35 + 0.65 * np.log1p(total) / np.log1p(total.max()), 0)
+    ax.imshow(image, origin="lower", extent=(low[0], high[0], low[1], high[1]), aspect="auto",
+              interpolation="nearest", zorder=2)
+
+
+def render_grouped(doc_names, reduced_embeddings, cluster_labels, keywords, reduction_method):
+    """Desenha o gráfico por clusters a partir da projeção 2D, dos rótulos e das palavras-chave
+
+    Returns:
+        fig: Figura matplotlib com o gráfico gerado
+    """
+    import matplotlib.pyplot as plt
+    from scipy.spatial import ConvexHull
+
+    n_clusters = len(keywords)
+
     # Criar figura com tamanho maior para melhor visualização
     fig, ax = plt.subplots(figsize=(18, 14))
-    
+
     # Definir um mapa de cores com cores distintas
     colors = plt.cm.tab20(np.linspace(0, 1, n_clusters))
-    
-    # Calcular centroides de cada cluster para uso posterior
-    centroids = []
-    for i in range(n_clusters):
-        points = reduced_embeddings[cluster_labels == i]
-        if len(points) > 0:
-            centroids.append(np.mean(points, axis=0))
-    
-    # Desenhar polígonos convexos para cada cluster com menor transparência (alpha)
-    # e com margens entre clusters para melhor separação visual
+
+    centroids, counts = cluster_centroids(reduced_embeddings, cluster_labels, n_clusters)
+
+    # Um polígono convexo por cluster (vértices do hull já em ordem), com baixa opacidade
+    order = np.argsort(cluster_labels, kind="stable")
+    bounds = np.concatenate([[0], np.cumsum(counts)])
     for i in range(n_clusters):
-        # Filtrar pontos deste cluster
-        cluster_points = reduced_embeddings[cluster_labels == i]
-        
+        cluster_points = reduced_embeddings[order[bounds[i]:bounds[i + 1]]]
         if len(cluster_points) < 3:  # Precisamos de pelo menos 3 pontos para um polígono
             continue
-        
         try:
-            # Criar o Convex Hull
             hull = ConvexHull(cluster_points)
-            
-            # Reduzir levemente o tamanho do hull para criar espaço entre clusters
-            centroid = np.mean(cluster_points, axis=0)
-            shrink_factor = 1  # Reduz o hull em 5% em direção ao centroide
-            
-            # Desenhar o polígono do hull com contorno mais definido
-            for simplex in hull.simplices:
-                hull_points = cluster_points[simplex]
-                # Encolher o polígono em direção ao centroide para criar espaço entre clusters
-                shrunk_points = centroid + shrink_factor * (hull_points - centroid)
-                
-                plt.fill(
-                    shrunk_points[:, 0], 
-                    shrunk_points[:, 1], 
-                    alpha=0.25,  # Menor opacidade para melhor visibilidade
-                    color=colors[i % len(colors)],
-                    edgecolor=colors[i % len(colors)],
-                    linewidth=2
-                )
-        except:
-            # Se não for possível criar um hull (pontos colineares)
-            pass
-    
-    # Plotar os pontos por cima dos polígonos
-    scatter = ax.scatter(
-        reduced_embeddings[:, 0], 
-        reduced_embeddings[:, 1], 
-        c=[colors[label % len(colors)] for label in cluster_labels], 
-        s=60,  # Tamanho maior para pontos mais visíveis
-        alpha=0.8,
-        edgecolors='black',
-        linewidths=0.5
-    )
-    
+        except (ValueError, RuntimeError):
+            # Não é possível criar um hull (pontos colineares ou repetidos)
+            continue
+        ax.fill(*cluster_points[hull.vertices].T, alpha=0.25, facecolor=colors[i], edgecolor=colors[i],
+                linewidth=2, zorder=1)
+
+    # Plotar os pontos por cima dos polígonos: marcadores até SCATTER_MAX_POINTS, imagem de densidade acima
+    if len(reduced_embeddings) <= SCATTER_MAX_POINTS:
+        large = len(reduced_embeddings) > 5000
+        ax.scatter(
+            reduced_embeddings[:, 0],
+            reduced_embeddings[:, 1],
+            c=colors[cluster_labels],
+            s=8 if large else 60,  # Tamanho maior para pontos mais visíveis em corpora pequenos
+            alpha=0.8,
+            edgecolors="none" if large else "black",
+            linewidths=0.5,
+            rasterized=large,
+            zorder=2
+        )
+    else:
+        shade_points(ax, reduced_embeddings, cluster_labels, colors)
+
     # Adicionar anotações para os clusters em caixas mais destacadas
     for i in range(n_clusters):
-        if i < len(centroids):
-            # Definir tamanho do texto baseado no número de documentos no cluster
-            docs_count = np.sum(cluster_labels == i)
-            font_size = min(14, 8 + (docs_count / len(doc_names)) * 8)
-            
-            ax.annotate(
-                cluster_keywords[i],
-                (centroids[i][0], centroids[i][1]),
-                fontsize=font_size,
-                ha='center',
-                va='center',
-                weight='bold',
-                bbox=dict(
-                    boxstyle="round,pad=0.5",
-                    fc="white",
-                    ec=colors[i % len(colors)],
-                    lw=2,
-                    alpha=0.9
-                )
+        if counts[i] == 0:
+            continue
+        # Definir tamanho do texto baseado no número de documentos no cluster
+        font_size = min(14, 8 + (counts[i] / len(doc_names)) * 8)
+        ax.annotate(
+            keywords[i],
+            (centroids[i][0], centroids[i][1]),
+            fontsize=font_size,
+            ha='center',
+            va='center',
+            weight='bold',
+            zorder=3,
+            bbox=dict(
+                boxstyle="round,pad=0.5",
+                fc="white",
+                ec=colors[i],
+                lw=2,
+                alpha=0.9
             )
-    
+        )
+
     plt.title(f"Visualização de Clusters por Similaridade ({reduction_method.upper()})", fontsize=16)
-    
+
     # Remover eixos para uma visualização mais limpa
     plt.axis('off')
-    
+
     plt.tight_layout()
+
+    return fig
+
+
+def render_grouped_interactive(doc_names, reduced_embeddings, cluster_labels, keywords, reduction_method):
+    """Versão interativa (plotly, WebGL) do gráfico por clusters: zoom e nome do documento ao passar o mouse
+
+    Returns:
+        Figura plotly, ou None se o plotly não estiver instalado
+    """
+    try:
+        import plotly.graph_objects as go
+    except ImportError:
+        print("⚠ plotly não instalado: use o gráfico estático.")
+        return None
+    from scipy.spatial import ConvexHull
+
+    names = np.asarray(doc_names, dtype=object)
+    fig = go.Figure()
+    for i, label in enumerate(keywords):
+        rows = np.flatnonzero(cluster_labels == i)
+        if len(rows) == 0:
+            continue
+        points = reduced_embeddings[rows]
+        if len(points) >= 3:
+            try:
+                vertices = ConvexHull(points).vertices
+                ring = points[np.append(vertices, vertices[0])]
+                fig.add_trace(go.Scatter(x=ring[:, 0], y=ring[:, 1], fill="toself", mode="lines", opacity=0.25,
+                                         legendgroup=str(i), showlegend=False, hoverinfo="skip"))
+            except (ValueError, RuntimeError):
+                pass
+        fig.add_trace(go.Scattergl(x=points[:, 0], y=points[:, 1], mode="markers", name=label,
+                                   legendgroup=str(i), text=names[rows], hoverinfo="text",
+                                   marker=dict(size=4 if len(reduced_embeddings) > 5000 else 8)))
+
+    fig.update_layout(title=f"Visualização de Clusters por Similaridade ({reduction_method.upper()})",
+                      height=800, xaxis_visible=False, yaxis_visible=False)
+    return fig
+
+
+@metrics.profiled("plot")
+@metrics.timed("plot_seconds", kind="grouped")
+def plot_grouped_embeddings(doc_names, doc_embeddings, reduction_method, n_clusters=None, index_version=None,
+                            keywords_from_content=False, interactive=False):
+    """Agrupa os documentos automaticamente por similaridade e plota os clusters
     
+    Args:
+        doc_names: Lista com os nomes dos documentos
+        doc_embeddings: Array com os embeddings dos documentos
+        reduction_method: Método de redução de dimensionalidade ("tsne", "umap" ou "pca")
+        n_clusters: Número de clusters para agrupar os documentos. Se None, será otimizado
+        index_version: Versão do armazenamento de embeddings; com ela a projeção e os
+            rótulos ficam em cache (mudar só n_clusters não recalcula a projeção)
+        keywords_from_content: Rótulos dos clusters pelo TF-IDF do conteúdo (e não pelos nomes)
+        interactive: Retorna uma figura plotly (WebGL) em vez da figura matplotlib
+
+    Returns:
+        fig: Figura matplotlib (ou plotly, se interactive) com o gráfico gerado
+    """
+    if doc_embeddings is None or len(doc_embeddings) == 0 or doc_names is None or len(doc_names) == 0:
+        print("Erro: Nenhum embedding disponível para visualização.")
+        return None
+    
+    # Aplicar K-means para determinar os clusters (k automático se n_clusters for None)
+    cluster_labels = cluster_documents(doc_embeddings, n_clusters, index_version)
+    n_clusters = int(cluster_labels.max()) + 1
+
+    reduced_embeddings = project_embeddings(doc_embeddings, reduction_method, index_version, grouped=True)
+    if reduced_embeddings is None:
+        return None
+    
+    # Expandir a visualização para evitar sobreposição
+    # Multiplicamos as coordenadas por um fator para aumentar a separação
+    # (em uma cópia: a projeção em cache não é alterada)
+    scale_factor = 1.5
+    reduced_embeddings = reduced_embeddings * scale_factor
+
+    texts = read_texts(doc_names) if keywords_from_content else None
+    keywords = cluster_keywords(doc_names, cluster_labels, n_clusters, texts)
+
+    render = render_grouped_interactive if interactive else render_grouped
+    return render(doc_names, reduced_embeddings, cluster_labels, keywords, reduction_method)
+
+
+def load_document_hashes(doc_names):
+    """Hashes de conteúdo dos documentos do armazenamento (None onde não houver)"""
+    hashes = load_store_metadata(EMBEDDINGS_STORE).get("hashes") or []
+    return list(hashes) + [None] * (len(doc_names) - len(hashes))
+
+
+@metrics.profiled("plot")
+@metrics.timed("plot_seconds", kind="map")
+def plot_document_map(doc_names, doc_embeddings, reduction_method="umap", query_embedding=None, query=None,
+                      highlight_docs=None, refit=False):
+    """Plota os documentos no mapa 2D persistido, sem reajustar a projeção
+
+    Documentos inalterados mantêm a posição do ajuste; documentos novos ou alterados
+    e a consulta são projetados com transform (ver reducer.ProjectionReducer). O mapa
+    só é reajustado com refit=True ou quando a deriva passa de reducer.DRIFT_THRESHOLD.
+
+    Args:
+        doc_names: Lista com os nomes dos documentos
+        doc_embeddings: Array com os embeddings dos documentos
+        reduction_method: "umap" ou "pca" (o t-SNE não projeta pontos novos)
+        query_embedding: Embedding da consulta a marcar no mapa (opcional)
+        query: Texto da consulta, usado no rótulo do marcador
+        highlight_docs: Nomes dos documentos a destacar (ex.: resultados da busca)
+        refit: Força o reajuste do mapa
+
+    Returns:
+        fig: Figura matplotlib com o gráfico gerado
+    """
+    import matplotlib.pyplot as plt
+
+    if doc_embeddings is None or len(doc_embeddings) == 0:
+        print("Erro: Nenhum embedding disponível para visualização.")
+        return None
+    if reduction_method not in REDUCER_METHODS:
+        print(f"Método sem projeção incremental. Use um de {REDUCER_METHODS}.")
+        return None
+
+    hashes = load_document_hashes(doc_names)
+    reducer = get_reducer(doc_names, hashes, doc_embeddings, reduction_method, refit=refit)
+    coords, projected = reducer.layout(doc_names, hashes, doc_embeddings)
+
+    fig, ax = plt.subplots(figsize=(12, 8))
+    ax.scatter(coords[~projected, 0], coords[~projected, 1], alpha=0.6, label="Documentos do ajuste")
+    if projected.any():
+        ax.scatter(coords[projected, 0], coords[projected, 1], alpha=0.9, color="tab:orange",
+                   label=f"Novos ou alterados ({int(projected.sum())})")
+
+    if highlight_docs:
+        rows = {name: i for i, name in enumerate(doc_names)}
+        selected = [rows[name] for name in highlight_docs if name in rows]
+        ax.scatter(coords[selected, 0], coords[selected, 1], s=160, facecolors="none", edgecolors="black",
+                   linewidths=1.5, label="Resultados da busca")
+
+    if query_embedding is not None:
+        point = reducer.transform(query_embedding)[0]
+        ax.scatter(point[0], point[1], marker="*", s=400, color="red", edgecolors="black", zorder=5,
+                   label="Consulta")
+        if query:
+            ax.annotate(query, point, xytext=(8, 8), textcoords="offset points", fontsize=11, weight="bold")
+
+    ax.legend(loc="best")
+    plt.title(f"Mapa dos Documentos ({reduction_method.upper()} persistido)")
+    plt.xlabel("Componente 1")
+    plt.ylabel("Componente 2")
+    plt.tight_layout()
+
     return fig
 
+
 if __name__ == "__main__":
     # Carregar embeddings antes de chamar a visualização
     doc_names, doc_embeddings = load_embeddings()
+    index_version = load_store_metadata(EMBEDDINGS_STORE)["version"] if doc_names is not None else None
 
     if doc_names is None or doc_embeddings is None:
         print("⚠ Erro: Não foi possível carregar os embeddings.")
@@ -255,16 +515,21 @@ if __name__ == "__main__":
         print("\nEscolha o tipo de visualização:")
         print("1. Visualização Simples")
         print("2. Visualização por Clusters")
-        viz_choice = input("Digite 1 ou 2: ").strip()
+        print("3. Mapa persistido (novos documentos projetados sem reajuste)")
+        viz_choice = input("Digite 1, 2 ou 3: ").strip()
         
         method = input("\nEscolha o método de redução de dimensionalidade (tsne, umap, pca): ").strip().lower()
         
         if viz_choice == "1":
-            fig = plot_clean_embeddings(doc_embeddings, method)
+            fig = plot_clean_embeddings(doc_embeddings, method, index_version)
+        elif viz_choice == "3":
+            refit = input("\nReajustar o mapa? (s/N): ").strip().lower() == "s"
+            fig = plot_document_map(doc_names, doc_embeddings, method, refit=refit)
         else:
             n_clusters = input("\nNúmero de clusters (deixe em branco para otimização automática): ").strip()
             n_clusters = int(n_clusters) if n_clusters else None
-            fig = plot_grouped_embeddings(doc_names, doc_embeddings, method, n_clusters)
+            fig = plot_grouped_embeddings(doc_names, doc_embeddings, method, n_clusters, index_version)
             
         if fig:
+            import matplotlib.pyplot as plt
             plt.show()
@@ -0,0 +1,95 @@
+import os
+import re
+import html
+import mmap
+from functools import lru_cache
+
+# Tamanho de cada página do visualizador (bytes lidos do arquivo por vez)
+PAGE_SIZE = 6000
+# Termos da consulta com menos letras que isso não são destacados
+MIN_TERM_LENGTH = 3
+
+
+def page_count(path, page_size=PAGE_SIZE):
+    """Número de páginas do documento (pelo tamanho do arquivo, sem lê-lo)"""
+    return max(1, -(-os.path.getsize(path) // page_size))
+
+
+def read_page(path, page, page_size=PAGE_SIZE):
+    """Lê apenas a página pedida (1 = primeira) com seek
+
+    Os textos processados são ASCII, então os offsets em bytes coincidem com os
+    offsets em caracteres dos trechos (passage_offsets).
+
+    Returns:
+        (texto da página, offset do início da página)
+    """
+    offset = (page - 1) * page_size
+    with open(path, "rb") as f:
+        f.seek(offset)
+        return f.read(page_size).decode("utf-8", errors="ignore"), offset
+
+
+@lru_cache(maxsize=128)
+def query_terms(query, min_length=MIN_TERM_LENGTH):
+    """Termos distintos da consulta, dos mais longos aos mais curtos (o regex prefere o mais longo)"""
+    terms = {term.lower() for term in query.split() if len(term) >= min_length}
+    return tuple(sorted(terms, key=lambda term: (-len(term), term)))
+
+
+@lru_cache(maxsize=128)
+def highlight_pattern(query):
+    """Um único regex (sem diferenciar maiúsculas) com todos os termos da consulta, ou None"""
+    terms = query_terms(query)
+    if not terms:
+        return None
+    return re.compile("|".join(re.escape(term) for term in terms), re.IGNORECASE)
+
+
+def first_match(path, query):
+    """Offset da primeira ocorrência de algum termo da consulta, buscando no arquivo mapeado (mmap)"""
+    terms = query_terms(query)
+    if not terms or os.path.getsize(path) == 0:
+        return None
+    pattern = re.compile(b"|".join(re.escape(term.encode("utf-8")) for term in terms), re.IGNORECASE)
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        match = pattern.search(data)
+    return match.start() if match else None
+
+
+def highlight_html(text, pattern):
+    """Escapa o texto para HTML e envolve as ocorrências do padrão em um único passe"""
+    if pattern is None:
+        return html.escape(text)
+
+    parts = []
+    last = 0
+    for match in pattern.finditer(text):
+        parts.append(html.escape(text[last:match.start()]))
+        parts.append(f'<span class="highlight-term">{html.escape(match.group())}</span>')
+        last = match.end()
+    parts.append(html.escape(text[last:]))
+    return "".join(parts)
+
+
+def render_page(text, offset, pattern=None, passage=None):
+    """HTML da página com os termos destacados e o trecho mais relevante marcado
+
+    Args:
+        text: Texto da página (ver read_page)
+        offset: Offset do início da página no documento
+        pattern: Regex dos termos (ver highlight_pattern) ou None
+        passage: (início, fim) do trecho mais relevante no documento, ou None
+    """
+    if passage is None:
+        return highlight_html(text, pattern)
+
+    # Limites do trecho relativos à página (recortados quando ele começa ou termina em outra página)
+    start = min(max(passage[0] - offset, 0), len(text))
+    end = min(max(passage[1] - offset, 0), len(text))
+    if start == end:
+        return highlight_html(text, pattern)
+
+    return (highlight_html(text[:start], pattern)
+            + f'<span class="best-passage">{highlight_html(text[start:end], pattern)}</span>'
+            + highlight_html(text[end:], pattern))
@@ -0,0 +1,61 @@
+import os
+import json
+import hashlib
+import numpy as np
+
+# Projeções 2D e rótulos de cluster já calculados, um .npy por chave
+PROJECTION_CACHE_FOLDER = "embeddings/projections/"
+
+
+def cache_path(kind, index_version, method, params, folder=PROJECTION_CACHE_FOLDER):
+    """Arquivo do cache para (tipo, versão do índice, método, parâmetros)"""
+    digest = hashlib.sha256(json.dumps(params, sort_keys=True).encode("utf-8")).hexdigest()[:12]
+    return os.path.join(folder, f"{index_version}-{kind}-{method}-{digest}.npy")
+
+
+def prune_stale(index_version, folder=PROJECTION_CACHE_FOLDER):
+    """Remove as entradas geradas para outras versões do índice
+
+    Temporários (.tmp) ficam: podem ser de outro processo gravando a versão nova, e
+    outro dashboard pode estar apagando as mesmas entradas ao mesmo tempo.
+    """
+    if not os.path.isdir(folder):
+        return
+    for filename in os.listdir(folder):
+        if filename.startswith(f"{index_version}-") or ".tmp" in filename:
+            continue
+        try:
+            os.remove(os.path.join(folder, filename))
+        except FileNotFoundError:
+            pass
+
+
+def cached_array(kind, index_version, method, params, compute, folder=PROJECTION_CACHE_FOLDER):
+    """Retorna o array em cache ou calcula com compute() e salva no disco
+
+    A chave é (tipo, versão do índice, método, parâmetros): o mesmo índice gera o
+    mesmo resultado entre reexecuções e processos. Sem versão não há cache.
+
+    Args:
+        kind: Tipo do resultado ("projection", "clusters", ...)
+        index_version: Versão do armazenamento de embeddings (load_store_metadata()["version"])
+        method: Método usado ("tsne", "umap", "pca", "kmeans", ...)
+        params: dict JSON com os parâmetros que afetam o resultado
+        compute: Função sem argumentos que calcula o array
+    """
+    if index_version is None:
+        return compute()
+
+    path = cache_path(kind, index_version, method, params, folder)
+    if os.path.exists(path):
+        print(f"♻ {kind} ({method}) reaproveitado do cache")
+        return np.load(path)
+
+    result = np.asarray(compute())
+
+    prune_stale(index_version, folder)
+    os.makedirs(folder, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp.npy"
+    np.save(tmp_path, result)
+    os.replace(tmp_path, path)
+    return result
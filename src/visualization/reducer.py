@@ -0,0 +1,132 @@
+import os
+import time
+import pickle
+import numpy as np
+
+# Redutor persistido (PCA + UMAP/PCA) com as coordenadas 2D dos documentos usados no ajuste,
+# um arquivo por método (alternar entre eles não força reajuste)
+REDUCER_FILE = "embeddings/reducer_{method}.pkl"
+REDUCER_METHODS = ["umap", "pca"]   # O t-SNE não projeta pontos novos (sem transform)
+
+PCA_COMPONENTS = 10
+# Fração de documentos novos, alterados ou removidos desde o ajuste acima da qual o mapa é refeito
+DRIFT_THRESHOLD = 0.2
+
+
+class ProjectionReducer:
+    """Mapa 2D fixo dos documentos: novos vetores são projetados com transform, sem reajuste
+
+    Guarda o PCA intermediário, o redutor final e as coordenadas de cada documento
+    do ajuste, identificado pelo hash do conteúdo (documentos inalterados mantêm
+    a posição; os demais são projetados no mapa existente).
+    """
+
+    def __init__(self, method, pca, reducer, names, hashes, coords):
+        self.method = method
+        self.pca = pca
+        self.reducer = reducer
+        self.names = names
+        self.hashes = hashes
+        self.coords = coords
+
+    @classmethod
+    def fit(cls, names, hashes, embeddings, method="umap", random_state=42):
+        """Ajusta o PCA intermediário e o redutor 2D aos embeddings"""
+        from sklearn.decomposition import PCA
+
+        if method not in REDUCER_METHODS:
+            raise ValueError(f"Método sem projeção incremental. Use um de {REDUCER_METHODS}.")
+
+        start = time.perf_counter()
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        pca = None
+        data = embeddings
+        if embeddings.shape[1] > PCA_COMPONENTS and len(embeddings) > PCA_COMPONENTS:
+            pca = PCA(n_components=PCA_COMPONENTS, random_state=random_state).fit(embeddings)
+            data = pca.transform(embeddings)
+
+        if method == "umap":
+            import umap  # O import do umap (numba) leva alguns segundos
+            reducer = umap.UMAP(n_components=2, n_neighbors=min(30, max(2, len(data) // 3)), min_dist=0.3,
+                                random_state=random_state)
+        else:
+            reducer = PCA(n_components=2, random_state=random_state)
+        coords = reducer.fit_transform(data).astype(np.float32)
+
+        print(f"🗺 Mapa {method.upper()} ajustado em {len(names)} documentos ({time.perf_counter() - start:.1f}s)")
+        return cls(method, pca, reducer, list(names), list(hashes), coords)
+
+    def transform(self, embeddings):
+        """Projeta novos vetores (documentos ou consultas) no mapa existente"""
+        data = np.atleast_2d(np.asarray(embeddings, dtype=np.float32))
+        if self.pca is not None:
+            data = self.pca.transform(data)
+        return self.reducer.transform(data).astype(np.float32)
+
+    def drift(self, names, hashes):
+        """Fração de documentos novos, alterados ou removidos em relação ao ajuste"""
+        fitted = dict(zip(self.names, self.hashes))
+        current = dict(zip(names, hashes))
+        changed = sum(1 for name, digest in current.items() if fitted.get(name, object()) != digest)
+        removed = sum(1 for name in fitted if name not in current)
+        return (changed + removed) / max(len(fitted), 1)
+
+    def layout(self, names, hashes, embeddings):
+        """Coordenadas 2D dos documentos atuais
+
+        Returns:
+            (coordenadas (documentos, 2), máscara dos documentos projetados com transform)
+        """
+        fitted = {name: (digest, i) for i, (name, digest) in enumerate(zip(self.names, self.hashes))}
+        coords = np.empty((len(names), 2), dtype=np.float32)
+        projected = np.zeros(len(names), dtype=bool)
+
+        for row, (name, digest) in enumerate(zip(names, hashes)):
+            known = fitted.get(name)
+            if known is not None and known[0] == digest:
+                coords[row] = self.coords[known[1]]
+            else:
+                projected[row] = True
+
+        if projected.any():
+            coords[projected] = self.transform(np.asarray(embeddings)[projected])
+        return coords, projected
+
+    def save(self, path=REDUCER_FILE):
+        path = path.format(method=self.method)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(self, f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, method="umap", path=REDUCER_FILE):
+        """Carrega o redutor salvo do método, ou None se ele não existir"""
+        path = path.format(method=method)
+        if not os.path.exists(path):
+            return None
+        with open(path, "rb") as f:
+            return pickle.load(f)
+
+
+def get_reducer(names, hashes, embeddings, method="umap", refit=False, drift_threshold=DRIFT_THRESHOLD,
+                path=REDUCER_FILE):
+    """Retorna o redutor salvo, reajustando só se pedido, se o método mudou ou se a deriva passou do limite"""
+    reducer = ProjectionReducer.load(method, path)
+
+    reason = None
+    if refit:
+        reason = "pedido explícito"
+    elif reducer is None:
+        reason = "sem mapa salvo para este método"
+    else:
+        drift = reducer.drift(names, hashes)
+        if drift > drift_threshold:
+            reason = f"{drift:.0%} dos documentos mudaram (limite {drift_threshold:.0%})"
+
+    if reason:
+        print(f"🗺 Ajustando o mapa {method.upper()}: {reason}")
+        reducer = ProjectionReducer.fit(names, hashes, embeddings, method)
+        reducer.save(path)
+    return reducer
@@ -0,0 +1,26 @@
+import os
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.processing.clustering import ClusterModel
+
+
+def test_small_partial_fit_barely_moves_fitted_centroids():
+    rng = np.random.default_rng(0)
+    centers = rng.normal(scale=10.0, size=(4, 8))
+    matrix = np.concatenate([center + rng.normal(size=(500, 8)) for center in centers]).astype(np.float32)
+
+    model = ClusterModel.fit(matrix, n_clusters=4)
+    before = model.model.cluster_centers_.copy()
+    assert model.model._counts.sum() == len(matrix)
+
+    new_documents = (centers[rng.integers(0, 4, 5)] + rng.normal(size=(5, 8))).astype(np.float32)
+    model.partial_fit(new_documents)
+
+    # 5 documentos contra 500 por cluster: cada centroide anda no máximo ~1% da distância ao ponto novo
+    shift = np.linalg.norm(model.model.cluster_centers_ - before, axis=1)
+    assert shift.max() < 0.1
+    assert model.n_seen == len(matrix) + 5
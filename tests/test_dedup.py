@@ -0,0 +1,41 @@
+import os
+import sys
+import random
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.processing.dedup import DocumentDeduplicator, copies_of, minhash, similarity, DOC_THRESHOLD
+
+
+def mutate(words, rng, vocabulary, every, start=0):
+    words = list(words)
+    for i in range(start, len(words), every):
+        words[i] = rng.choice(vocabulary)
+    return words
+
+
+def test_copies_are_directly_similar_to_their_original(tmp_path):
+    # a ≈ b e b ≈ c acima do limiar, mas a e c abaixo: c não pode virar cópia de a
+    rng = random.Random(1)
+    vocabulary = [f"w{i}" for i in range(5000)]
+    a = [rng.choice(vocabulary) for _ in range(400)]
+    b = mutate(a, rng, vocabulary, 60)
+    c = mutate(b, rng, vocabulary, 60, start=30)
+    texts = {"a.txt": " ".join(a), "b.txt": " ".join(b), "c.txt": " ".join(c)}
+
+    signatures = {name: minhash(text) for name, text in texts.items()}
+    assert similarity(signatures["a.txt"], signatures["b.txt"]) >= DOC_THRESHOLD
+    assert similarity(signatures["b.txt"], signatures["c.txt"]) >= DOC_THRESHOLD
+    assert similarity(signatures["a.txt"], signatures["c.txt"]) < DOC_THRESHOLD
+
+    folder = tmp_path / "processed"
+    folder.mkdir()
+    for name, text in texts.items():
+        (folder / name).write_text(text, encoding="utf-8")
+    state_file = str(tmp_path / "duplicates.json")
+
+    duplicates = DocumentDeduplicator(str(folder), state_file=state_file,
+                                      signatures_file=str(tmp_path / "signatures.npz")).run()
+
+    assert duplicates == {"b.txt": "a.txt"}
+    assert [name for name, _ in copies_of("a.txt", state_file)] == ["b.txt"]
@@ -0,0 +1,157 @@
+import os
+import sys
+import json
+import time
+import hashlib
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.scraping.download_docs import create_session, download_documentation, fetch_url
+
+PAGE = b"<html><head><title>Docs</title></head><body><h1>Guia</h1><p>Texto da pagina</p></body></html>"
+ETAG = '"v1"'
+LAST_MODIFIED = "Wed, 01 Jan 2025 00:00:00 GMT"
+
+
+class StandInServer(ThreadingHTTPServer):
+    """Servidor local que imita as páginas: 200 com ETag, 304 no GET condicional e 503 intermitente"""
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), Handler)
+        self.hits = Counter()
+        self.conditional = Counter()
+        self.failures = {}      # caminho -> quantos 503 responder antes do 200
+        self.delay = 0.0
+        self.active = 0
+        self.max_active = 0
+        self.lock = threading.Lock()
+
+    def url(self, path):
+        return f"http://127.0.0.1:{self.server_address[1]}{path}"
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.hits[self.path] += 1
+            server.active += 1
+            server.max_active = max(server.max_active, server.active)
+        try:
+            time.sleep(server.delay)
+            with server.lock:
+                failing = server.failures.get(self.path, 0) > 0
+                if failing:
+                    server.failures[self.path] -= 1
+
+            if failing:
+                self.reply(503)
+            elif self.headers.get("If-None-Match") == ETAG:
+                with server.lock:
+                    server.conditional[self.path] += 1
+                self.reply(304)
+            else:
+                self.reply(200, PAGE, {"ETag": ETAG, "Last-Modified": LAST_MODIFIED,
+                                       "Content-Type": "text/html; charset=utf-8"})
+        finally:
+            with server.lock:
+                server.active -= 1
+
+    def reply(self, status, body=b"", headers=None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = StandInServer()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def write_links(tmp_path, server, paths):
+    links_file = tmp_path / "links.json"
+    links = [{"title": f"Doc {path.strip('/')}", "url": server.url(path)} for path in paths]
+    links_file.write_text(json.dumps(links), encoding="utf-8")
+    return links_file
+
+
+def run_download(tmp_path, links_file, **kwargs):
+    return download_documentation(links_file=str(links_file), output_folder=str(tmp_path / "docs"),
+                                  manifest_file=str(tmp_path / "manifest.json"), **kwargs)
+
+
+def test_fetch_url_retries_temporary_failures(server):
+    server.failures["/flaky"] = 2
+    with create_session() as session:
+        response = fetch_url(session, server.url("/flaky"), retries=3, backoff=0)
+
+    assert response.status_code == 200
+    assert server.hits["/flaky"] == 3
+
+
+def test_fetch_url_gives_up_after_retries(server):
+    server.failures["/down"] = 10
+    with create_session() as session, pytest.raises(requests.HTTPError):
+        fetch_url(session, server.url("/down"), retries=2, backoff=0)
+
+    assert server.hits["/down"] == 3
+
+
+def test_manifest_records_validators_and_refresh_uses_conditional_get(tmp_path, server):
+    links_file = write_links(tmp_path, server, ["/page"])
+    url = server.url("/page")
+
+    stats = run_download(tmp_path, links_file)
+    assert (stats["updated"], stats["errors"]) == (1, 0)
+
+    manifest = json.loads((tmp_path / "manifest.json").read_text(encoding="utf-8"))
+    entry = manifest[url]
+    doc_path = tmp_path / "docs" / entry["file"]
+    assert entry["file"] == "doc_page.txt"
+    assert (entry["etag"], entry["last_modified"]) == (ETAG, LAST_MODIFIED)
+    assert entry["sha256"] == hashlib.sha256(doc_path.read_bytes()).hexdigest()
+    assert "Texto da pagina" in doc_path.read_text(encoding="utf-8")
+
+    mtime = doc_path.stat().st_mtime_ns
+    stats = run_download(tmp_path, links_file)
+    assert (stats["not_modified"], stats["updated"], stats["bytes"]) == (1, 0, 0)
+    assert server.conditional["/page"] == 1
+    assert doc_path.stat().st_mtime_ns == mtime
+
+    manifest = json.loads((tmp_path / "manifest.json").read_text(encoding="utf-8"))
+    assert manifest[url]["etag"] == ETAG
+    assert manifest[url]["sha256"] == entry["sha256"]
+
+
+def test_download_retries_503_and_respects_host_limit(tmp_path, server):
+    paths = [f"/p{i}" for i in range(6)]
+    server.failures["/p0"] = 1
+    server.delay = 0.05
+    links_file = write_links(tmp_path, server, paths)
+
+    stats = run_download(tmp_path, links_file, max_workers=6, max_per_host=2)
+
+    assert (stats["updated"], stats["errors"]) == (6, 0)
+    assert server.hits["/p0"] == 2
+    assert server.max_active <= 2
@@ -0,0 +1,85 @@
+import os
+import sys
+import socket
+
+import numpy as np
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.search.embedding_store import save_store, open_store
+from src.search.semantic_search import rank_documents
+from src.search.sharding import ShardCoordinator, build_shards, shard_of, start_local_shards, stop_shards
+
+N_SHARDS = 3
+
+
+def free_port_range(count):
+    """Porta inicial de `count` portas consecutivas livres em localhost"""
+    for _ in range(50):
+        with socket.socket() as probe:
+            probe.bind(("127.0.0.1", 0))
+            start = probe.getsockname()[1]
+        if start + count > 65535:
+            continue
+        sockets = []
+        try:
+            for port in range(start, start + count):
+                sock = socket.socket()
+                sockets.append(sock)
+                sock.bind(("127.0.0.1", port))
+            return start
+        except OSError:
+            continue
+        finally:
+            for sock in sockets:
+                sock.close()
+    raise RuntimeError("Sem portas livres consecutivas")
+
+
+@pytest.fixture
+def shards(tmp_path, monkeypatch):
+    # Os processos dos shards herdam o diretório atual: caches e arquivos relativos ficam no tmp
+    monkeypatch.chdir(tmp_path)
+    rng = np.random.default_rng(0)
+    source = str(tmp_path / "store" / "documents")
+    names = [f"doc{i:02d}.txt" for i in range(40)]
+    save_store(source, rng.normal(size=(len(names), 16)), ids=names)
+    folder = str(tmp_path / "shards")
+    build_shards(N_SHARDS, source=source, folder=folder)
+
+    processes, endpoints = start_local_shards(N_SHARDS, folder=folder, port=free_port_range(N_SHARDS))
+    yield source, processes, endpoints
+    stop_shards(processes)
+
+
+def test_merged_top_k_matches_unsharded_search(shards):
+    source, _, endpoints = shards
+    matrix, meta = open_store(source)
+    queries = np.random.default_rng(1).normal(size=(4, 16)).astype(np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+
+    coordinator = ShardCoordinator(endpoints, timeout=10)
+    results, missing = coordinator.search_embeddings(queries, top_n=5)
+
+    assert missing == []
+    assert coordinator.partial_batches == 0
+    top_indices, similarities = rank_documents(queries, matrix, 5)
+    for q, result in enumerate(results):
+        assert [doc for doc, _ in result] == [meta["ids"][i] for i in top_indices[q]]
+        np.testing.assert_allclose([score for _, score in result], similarities[q], rtol=1e-5)
+
+
+def test_dead_shard_gives_partial_result(shards):
+    _, processes, endpoints = shards
+    processes[1].kill()
+    processes[1].wait()
+
+    coordinator = ShardCoordinator(endpoints, timeout=5)
+    results, missing = coordinator.search_embeddings(np.ones(16, dtype=np.float32) / 4, top_n=5)
+
+    assert missing == [endpoints[1]]
+    assert coordinator.partial_batches == 1
+    assert len(results) == 1 and 0 < len(results[0]) <= 5
+    # Só documentos dos shards que responderam
+    assert all(shard_of(doc, N_SHARDS) != 1 for doc, _ in results[0])
@@ -0,0 +1,50 @@
+import os
+import re
+import sys
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.processing.text_cleaning import clean_text
+
+
+def reference_clean_text(text):
+    """Limpador original, só com regex (referência para o resultado byte a byte)"""
+    text = re.sub(r"\s+", " ", text)
+    text = re.sub(r"[^\x00-\x7F]+", "", text)
+    text = re.sub(r"Navigation Menu.*?Explore All features", "", text, flags=re.DOTALL)
+    return text.strip()
+
+
+CASES = [
+    # Sequências não ASCII entre espaços (os espaços vizinhos continuam lá)
+    "Olá  mundo — café 🚀 ☕ fim",
+    " ✨ \t ação\n\nçã ✓ ok ",
+    "só ♥♥♥ acentos ééé",
+    # Bloco de menu do GitHub
+    "Skip to content\nNavigation Menu\n  Toggle navigation  Sign in\n Product GitHub Copilot "
+    "Explore All features\nREADME awesome",
+    "antes Navigation Menu 🚀 meio Explore All features depois Navigation Menu x Explore All features fim",
+    # Marcador sem o fim do bloco e texto sem marcador
+    "Navigation Menu sem o final do bloco",
+    "Um texto qualquer\n\n  com  espaços\tvariados e nenhum marcador. ",
+    "",
+    "   \n\t ",
+]
+
+
+@pytest.mark.parametrize("text", CASES)
+def test_clean_text_matches_regex_pipeline(text):
+    assert clean_text(text) == reference_clean_text(text)
+
+
+def test_clean_text_matches_regex_pipeline_on_random_text():
+    import random
+
+    rng = random.Random(0)
+    alphabet = list("abc XYZ\t\n\r") + ["é", "ç", "—", "🚀", " ", " ", "Navigation Menu",
+                                         "Explore All features"]
+    for _ in range(500):
+        text = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 60)))
+        assert clean_text(text) == reference_clean_text(text)